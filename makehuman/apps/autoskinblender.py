@@ -55,9 +55,7 @@ class EthnicSkinBlender(object):
     """
     def __init__(self, human):
         self.human = human
-        self.skinCache = { 'caucasian' : image.Image(getSysDataPath('litspheres/skinmat_caucasian.png')),
-                           'african'   : image.Image(getSysDataPath('litspheres/skinmat_african.png')),
-                           'asian'     : image.Image(getSysDataPath('litspheres/skinmat_asian.png')) }
+        self._skinCache = None
         self._previousEthnicState = [0, 0, 0]
 
         self._litsphereTexture = None
@@ -65,6 +63,19 @@ class EthnicSkinBlender(object):
 
         self.checkUpdate()
 
+    @property
+    def skinCache(self):
+        """
+        Litsphere images of the ethnic skin tones. They are only loaded when
+        a litsphere texture is requested, so that the diffuse color can be
+        used without an image library (eg. when exporting without GUI).
+        """
+        if self._skinCache is None:
+            self._skinCache = { 'caucasian' : image.Image(getSysDataPath('litspheres/skinmat_caucasian.png')),
+                                'african'   : image.Image(getSysDataPath('litspheres/skinmat_african.png')),
+                                'asian'     : image.Image(getSysDataPath('litspheres/skinmat_asian.png')) }
+        return self._skinCache
+
     def checkUpdate(self):
         newEthnicState = self.getEthnicState()
         if self._previousEthnicState != newEthnicState:
@@ -80,6 +91,8 @@ class EthnicSkinBlender(object):
 
     def getLitsphereTexture(self):
         self.checkUpdate()
+        if self._litsphereTexture is None:
+            self._litsphereTexture = self._blendLitsphereTexture()
         return self._litsphereTexture
 
     def getDiffuseColor(self):
@@ -90,15 +103,24 @@ class EthnicSkinBlender(object):
         caucasianWeight = self.human.getCaucasian()
         africanWeight   = self.human.getAfrican()
         asianWeight     = self.human.getAsian()
-        blends = []
 
-        # Set litsphere texture
-        if caucasianWeight > 0:
-            blends.append( ('caucasian', caucasianWeight) )
-        if africanWeight > 0:
-            blends.append( ('african', africanWeight) )
-        if asianWeight > 0:
-            blends.append( ('asian', asianWeight) )
+        # Litsphere texture is blended again when it is requested
+        self._litsphereTexture = None
+
+        # Set diffuse color
+        diffuse = asianWeight     * asianColor   + \
+                  africanWeight   * africanColor + \
+                  caucasianWeight * caucasianColor
+        self._diffuseColor = material.Color(diffuse)
+
+    def _blendLitsphereTexture(self):
+        blends = []
+        if self.human.getCaucasian() > 0:
+            blends.append( ('caucasian', self.human.getCaucasian()) )
+        if self.human.getAfrican() > 0:
+            blends.append( ('african', self.human.getAfrican()) )
+        if self.human.getAsian() > 0:
+            blends.append( ('asian', self.human.getAsian()) )
 
         if len(blends) == 1:
             img = self.skinCache[blends[0][0]]
@@ -110,11 +132,4 @@ class EthnicSkinBlender(object):
 
         # Set parameter so the image can be referenced when material is written to file (and texture can be cached)
         img.sourcePath = getSysDataPath("litspheres/adaptive_skin_tone.png")
-        self._litsphereTexture = img
-
-        # Set diffuse color
-        diffuse = asianWeight     * asianColor   + \
-                  africanWeight   * africanColor + \
-                  caucasianWeight * caucasianColor
-        self._diffuseColor = material.Color(diffuse)
-
+        return img
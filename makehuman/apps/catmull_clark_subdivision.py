@@ -40,12 +40,20 @@ TODO
 
 __docformat__ = 'restructuredtext'
 
+import os
+import hashlib
+from collections import OrderedDict
+
 import numpy as np
 
 from module3d import Object3D
 from progress import Progress
+from getpath import getPath
 import log
 
+STENCIL_VERSION = 1
+STENCIL_CACHE_SIZE = 8      # Number of subdivision stencils kept in memory
+
 class SubdivisionObject(Object3D):
     def __init__(self, object, staticFaceMask=None):
         """
@@ -211,26 +219,10 @@ class SubdivisionObject(Object3D):
         self.evert = np.asarray(vedgelist, dtype = np.uint32)
         self.etexc = np.asarray(tedgelist, dtype = np.uint32)
 
-        # TODO document
-        self.vedge = np.zeros((nverts, self.MAX_FACES), dtype=np.uint32)
-        self.nedges = np.zeros(nverts, dtype=np.uint8)
-
         progress.step()
 
-        map_ = np.argsort(self.evert[:,0,:].flat)
-        vi = self.evert[:,0,:].flat[map_]
-        ei = np.mgrid[:len(self.evert),:2][0].flat[map_].astype(np.uint32)
-        del map_
-        ix, first = np.unique(vi, return_index=True)
-        n = first[1:] - first[:-1]
-        n = np.hstack((n, np.array([len(vi) - first[-1]])))
-        self.nedges[ix] = n.astype(np.uint8)
-        try:
-            for i in range(len(ix)):
-                self.vedge[ix[i],:n[i]] = ei[first[i]:][:n[i]]
-        except ValueError as e:
-            raise RuntimeError("Pole-count too low, try increasing max_pole: %s" % e)
-        del vi, ei, ix, n, first
+        # Linear mapping of parent coordinates to subdivided coordinates
+        self.stencil = getSubdivisionStencil(self)
 
         progress.step()
 
@@ -311,9 +303,9 @@ class SubdivisionObject(Object3D):
         # Map base verts onto themselves
         self._parent_map[:self.cbase, 0] = self.vtx_map[:]
         # Face-center verts are mapped to the 4 base verts connected to the face
-        self._parent_map[self.cbase:self.ebase, :4] = self.vtx_map[parent.fvert[self.face_map]]
+        self._parent_map[self.cbase:self.ebase, :4] = parent.fvert[self.face_map]
         # Edge-center verts are mapped to the 2 base verts that are endpoints of the edge
-        self._parent_map[self.ebase:, :2] = self.evert[:,0,:]
+        self._parent_map[self.ebase:, :2] = self.vtx_map[self.evert[:,0,:]]
 
         self._parent_map_weights = np.zeros(self._parent_map.shape[0], dtype=np.float32)
         self._parent_map_weights[:self.cbase] = 1.0
@@ -394,60 +386,12 @@ class SubdivisionObject(Object3D):
         with vi base verts at interpolated positions (bvert)
         with c newly introduced center verts in the center of each face (cvert)
         with ei newly introduced verts at the centers of the poly edges (evert)
-        """
-        parent = self.parent
-
-        bvert = self.coord[:self.cbase]            # Base verts
-        cvert = self.coord[self.cbase:self.ebase]  # Poly center verts
-        evert = self.coord[self.ebase:]            # Edge verts
-
-        cvert[...] = np.sum(parent.coord[parent.fvert[self.face_map]], axis=1) / 4
-
-        pcoord = parent.coord[self.vtx_map]
-
-        iva = self.evert[:,0,0]  # References to base verts
-        ivb = self.evert[:,0,1]
-        ic1 = self.evert[:,1,0]  # References to center verts
-        ic2 = self.evert[:,1,1]
-
-        va = pcoord[iva]
-        vb = pcoord[ivb]
-        mvert = va + vb
-        del iva, ivb, va, vb
-
-        vc1 = cvert[ic1]
-        vc2 = cvert[ic2]
-        vc = vc1 + vc2
-        del vc1, vc2
-
-        inedge = (ic1 == ic2)
-
-        # Calculate edge vert coordinates: average two e verts when at edge, else average over 4
-        evert[...] = np.where(inedge[:,None], mvert / 2, (mvert + vc) / 4)
-        del ic1, ic2, vc
-
-        nvface = parent.nfaces[self.vtx_map]
-
-        # comment: this code could really do with some comments
-        edgewt = np.arange(self.MAX_FACES)[None,:,None] < self.nedges[:,None,None]
-        edgewt2 = edgewt * inedge[self.vedge][:,:,None]
-        edgewt = edgewt / self.nedges.astype(np.float32)[:,None,None]
-        nvedge = np.sum(edgewt2, axis=1)
-        oevert = np.sum(mvert[self.vedge] * edgewt / 2, axis=1)
-        oevert2 = np.sum(mvert[self.vedge] * edgewt2 / 2, axis=1)
-        facewt = np.arange(self.MAX_FACES)[None,:,None] < nvface[:,None,None]
-        facewt = facewt / nvface.astype(np.float32)[:,None,None]
-        ofvert = np.sum(cvert[self.face_rmap[parent.vface[self.vtx_map]]] * facewt, axis=1)
-        opvert = pcoord
-
-        valid = nvface >= 3
-
-        bvert[...] = np.where(valid[:,None],
-                              np.where((self.nedges == nvface)[:,None],
-                                       (ofvert + 2 * oevert + (nvface[:,None] - 3) * opvert) / nvface[:,None],
-                                       (oevert2 + opvert) / (nvedge + 1)),
-                              (3 * oevert - ofvert) / 2)
 
+        The subdivided coordinates are a fixed linear combination of the parent
+        coordinates, which is precalculated in self.stencil (see
+        buildSubdivisionStencil()).
+        """
+        self.stencil.apply(self.parent.coord, out=self.coord)
         self.markCoords(coor=True)
 
     def update(self):
@@ -496,16 +440,226 @@ class SubdivisionObject(Object3D):
 def _reverse_n_to_m_map(input, output, offset=0):
     # Using same algorithm as module3d._update_faces to construct inverse 
     # mapping with variable number of valid columns
-    map_ = np.argsort(input.flat)
-    vi = input.flat[map_]
-    fi = np.mgrid[:input.shape[0],:input.shape[1]][0].flat[map_].astype(np.uint32)
-    del map_
-    ix, first = np.unique(vi, return_index=True)
-    n = first[1:] - first[:-1]
-    n_last = len(vi) - first[-1]
-    n = np.hstack((n, np.array([n_last])))
-    for i in range(len(ix)):
-        output[ix[i], :n[i]] = offset + fi[first[i]:][:n[i]]
+    vi = input.reshape(-1)
+    order = np.argsort(vi, kind='stable')
+    vi = vi[order]
+    fi = (order // input.shape[1]).astype(np.uint32)
+    del order
+    # column of each reference is its rank within the group of its value
+    column = np.arange(len(vi)) - np.searchsorted(vi, vi)
+    output[vi, column] = offset + fi
+
+
+class SubdivisionStencil(object):
+    """
+    Sparse matrix (in compressed row format) that maps the coordinates of a
+    mesh to the coordinates of its subdivided mesh. Row i contains the weights
+    of the source coordinates that add up to subdivided coordinate i.
+    """
+
+    def __init__(self, indptr, indices, weights, shape):
+        self.indptr = np.asarray(indptr, dtype=np.intp)
+        self.indices = np.asarray(indices, dtype=np.uint32)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.shape = tuple(int(n) for n in shape)
+
+    @classmethod
+    def fromTriplets(cls, rows, cols, weights, shape):
+        """
+        Build a stencil from (row, column, weight) entries, entries with the same
+        row and column are summed.
+        """
+        key = rows.astype(np.int64) * shape[1] + cols
+        key, inverse = np.unique(key, return_inverse=True)
+        weights = np.bincount(inverse, weights=weights, minlength=len(key))
+        rows = key // shape[1]
+        indptr = np.zeros(shape[0]+1, dtype=np.intp)
+        np.cumsum(np.bincount(rows, minlength=shape[0]), out=indptr[1:])
+        return cls(indptr, key % shape[1], weights, shape)
+
+    def rows(self):
+        """
+        Row index of each entry.
+        """
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+    def apply(self, coord, out=None):
+        """
+        Calculate the subdivided coordinates from the specified coordinates.
+        Every row of the stencil should have at least one entry.
+        """
+        values = np.take(coord, self.indices, axis=0)
+        values *= self.weights[:,None]
+        if out is None:
+            out = np.empty((self.shape[0], values.shape[1]), dtype=values.dtype)
+        return np.add.reduceat(values, self.indptr[:-1], axis=0, out=out)
+
+    def compose(self, other):
+        """
+        Stencil that is equivalent to applying other first, then this stencil.
+        Allows multiple levels of subdivision to be calculated at once.
+        """
+        counts = np.diff(other.indptr)[self.indices]
+        rows = np.repeat(self.rows(), counts)
+        # positions of the entries of other that are referenced by each entry
+        first = np.cumsum(counts) - counts
+        pos = np.arange(len(rows)) + np.repeat(other.indptr[self.indices] - first, counts)
+        weights = np.repeat(self.weights, counts).astype(np.float64) * other.weights[pos]
+        return SubdivisionStencil.fromTriplets(rows, other.indices[pos], weights, (self.shape[0], other.shape[1]))
+
+    def save(self, path):
+        # Write to a temporary file that replaces the stencil file when
+        # complete, so that other processes never load a partially written file
+        tmppath = '%s.%d.tmp' % (path, os.getpid())
+        try:
+            with open(tmppath, 'wb') as f:
+                np.savez(f, indptr=self.indptr, indices=self.indices, weights=self.weights,
+                         shape=np.asarray(self.shape), version=STENCIL_VERSION)
+            os.replace(tmppath, path)
+        except:
+            if os.path.isfile(tmppath):
+                os.remove(tmppath)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as npzfile:
+            if int(npzfile['version']) != STENCIL_VERSION:
+                raise RuntimeError('Subdivision stencil %s has an unsupported version' % path)
+            return cls(npzfile['indptr'], npzfile['indices'], npzfile['weights'], npzfile['shape'])
+
+
+def buildSubdivisionStencil(object):
+    """
+    Build the stencil that calculates the coordinates of the subdivision object
+    (SubdivisionObject) from the coordinates of its parent.
+    The weights follow the Catmull-Clark rules:
+      - face center verts are the average of the face verts
+      - edge verts are the average of the edge end points and the adjacent
+        face centers, or the midpoint of the edge at a boundary
+      - base verts are moved to (F + 2E + (n-3)P) / n, with F the average of
+        the adjacent face centers, E the average of the adjacent edge midpoints
+        and n the number of adjacent faces. Boundary verts are moved to the
+        average of their boundary edge midpoints and their original position.
+    """
+    parent = object.parent
+    vtx_map = object.vtx_map
+    nbase = object.cbase
+    ncenter = object.ebase - object.cbase
+    nedge = len(object.evert)
+    rows = []
+    cols = []
+    weights = []
+
+    # Face center verts
+    cverts = parent.fvert[object.face_map]
+    rows.append(np.repeat(np.arange(ncenter) + object.cbase, 4))
+    cols.append(cverts.reshape(-1))
+    weights.append(np.full(4*ncenter, 0.25))
+
+    # Edge verts
+    iva = object.evert[:,0,0]  # References to base verts
+    ivb = object.evert[:,0,1]
+    ic1 = object.evert[:,1,0]  # References to center verts
+    ic2 = object.evert[:,1,1]
+    inedge = (ic1 == ic2)
+    erows = np.arange(nedge) + object.ebase
+    ew = np.where(inedge, 0.5, 0.25)
+    rows.extend([erows, erows])
+    cols.extend([vtx_map[iva], vtx_map[ivb]])
+    weights.extend([ew, ew])
+    interior = np.flatnonzero(~inedge)
+    for ic in (ic1, ic2):
+        rows.append(np.repeat(erows[interior], 4))
+        cols.append(cverts[ic[interior]].reshape(-1))
+        weights.append(np.full(4*len(interior), 1.0/16))
+
+    # Base verts
+    nvface = parent.nfaces[vtx_map].astype(np.float64)
+    vb = np.hstack((iva, ivb))          # Edges attached to each base vert
+    ve = np.hstack((np.arange(nedge), np.arange(nedge)))
+    nedges = np.bincount(vb, minlength=nbase).astype(np.float64)
+    nvedge = np.bincount(vb, weights=inedge[ve], minlength=nbase)
+
+    valid = nvface >= 3
+    regular = valid & (nedges == nvface)
+    boundary = valid & ~regular
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Coefficients of the average face center, average edge midpoint,
+        # average boundary edge midpoint and original position
+        fw = np.select([regular, boundary], [1.0 / nvface, 0.0], -0.5)
+        ew = np.select([regular, boundary], [2.0 / nvface, 0.0], 1.5)
+        bw = np.where(boundary, 1.0 / (nvedge + 1), 0.0)
+        pw = np.select([regular, boundary], [(nvface - 3) / nvface, 1.0 / (nvedge + 1)], 0.0)
+        fw /= nvface * 4
+        ew /= nedges * 2
+
+    # Average edge midpoint over all attached edges, and over boundary edges only
+    bnd = inedge[ve]
+    for ivx in (iva, ivb):
+        rows.extend([vb, vb[bnd]])
+        cols.extend([vtx_map[ivx[ve]], vtx_map[ivx[ve[bnd]]]])
+        weights.extend([ew[vb], bw[vb[bnd]] / 2])
+
+    # Average face center (masked faces are mapped to the last center vert, like face_rmap == -1 does)
+    nf = parent.nfaces[vtx_map]
+    slots = np.arange(parent.MAX_FACES)[None,:] < nf[:,None]
+    fb = np.repeat(np.arange(nbase), nf)
+    fc = object.face_rmap[parent.vface[vtx_map][slots]]
+    fc[fc < 0] += ncenter
+    rows.append(np.repeat(fb, 4))
+    cols.append(cverts[fc].reshape(-1))
+    weights.append(np.repeat(fw[fb], 4))
+
+    # Original position
+    rows.append(np.arange(nbase))
+    cols.append(vtx_map)
+    weights.append(pw)
+
+    return SubdivisionStencil.fromTriplets(np.hstack(rows), np.hstack(cols), np.hstack(weights),
+                                           (object.ebase + nedge, len(parent.coord)))
+
+
+_stencilCache = OrderedDict()
+
+def getSubdivisionStencil(object):
+    """
+    Get the subdivision stencil of the subdivision object. Stencils are cached
+    per topology and static face mask of the parent mesh, in memory and as a
+    file in the mesh cache folder of the user data path.
+    """
+    parent = object.parent
+    key = hashlib.sha1()
+    key.update(np.asarray(parent.fvert.shape).tobytes())
+    key.update(np.ascontiguousarray(parent.fvert).tobytes())
+    key.update(np.ascontiguousarray(object.staticFaceMask).tobytes())
+    key.update(str(STENCIL_VERSION).encode('utf-8'))
+    key = key.hexdigest()
+
+    if key in _stencilCache:
+        _stencilCache.move_to_end(key)
+        return _stencilCache[key]
+
+    stencil = None
+    path = getPath(os.path.join('cache', 'meshes', key + '.subdiv.npz'))
+    if os.path.isfile(path):
+        try:
+            stencil = SubdivisionStencil.load(path)
+        except Exception as e:
+            log.warning('Problem loading subdivision stencil %s: %s', path, e)
+    if stencil is None:
+        stencil = buildSubdivisionStencil(object)
+        try:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            stencil.save(path)
+        except Exception:
+            log.notice('unable to save subdivision stencil: %s', path)
+
+    _stencilCache[key] = stencil
+    if len(_stencilCache) > STENCIL_CACHE_SIZE:
+        _stencilCache.popitem(last=False)
+    return stencil
 
 
 def createSubdivisionObject(object, staticFaceMask=None):
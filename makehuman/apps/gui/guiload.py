@@ -162,6 +162,10 @@ class LoadTaskView(gui3d.TaskView, filecache.MetadataCacher):
         name, _, _ = metadata
         return name
 
+    def getUuidFromMetadata(self, metadata):
+        _, uuid, _ = metadata
+        return uuid
+
     def getSearchPaths(self):
         if self.modelPath:
             return [self.modelPath]
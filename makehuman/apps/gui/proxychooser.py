@@ -178,6 +178,10 @@ class ProxyChooserTaskView(gui3d.TaskView, filecache.MetadataCacher):
         uuid, tags = metadata
         return tags
 
+    def getUuidFromMetadata(self, metadata):
+        uuid, tags = metadata
+        return uuid
+
     def getSearchPaths(self):
         return self.paths
 
@@ -583,7 +587,7 @@ class ProxyChooserTaskView(gui3d.TaskView, filecache.MetadataCacher):
         mtime = metadata[0]
         if mtime < os.path.getmtime(proxyId):
             # Queried file was updated, update stale cache
-            self.updateFileCache(self.getSearchPaths(), self.getFileExtensions(), True)
+            self.refreshFileCache(proxyId)
             self._loadUuidLookup()
             metadata = self._filecache[proxyId]
 
@@ -615,7 +619,7 @@ class ProxyChooserTaskView(gui3d.TaskView, filecache.MetadataCacher):
         return self._proxyFilePerUuid[uuid]
 
     def _loadUuidLookup(self):
-        items = [ (values[1], path) for (path, values) in self._filecache.items() ]
+        items = self._filecache.getUuids()
         self._proxyFilePerUuid = dict()
         for (_uuid, path) in items:
             if _uuid in self._proxyFilePerUuid and self._proxyFilePerUuid[_uuid] != path:
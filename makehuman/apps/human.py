@@ -52,6 +52,26 @@ from mesh_operations import calculateSurface, calculateVolume
 
 from makehuman import getBasemeshVersion, getShortVersion, getVersionStr, getVersion
 
+# Maximum number of threads used for loading targets while loading an MHM file
+LOAD_THREADS = 4
+
+# Fraction of the vertices below which applyAllTargets only updates the
+# coordinates of the vertices that changed, instead of all
+INCREMENTAL_COORDS_RATIO = 0.5
+
+_detailNames = {}
+
+def _canonicalDetailName(name):
+    """
+    Cached canonicalPath() of the target paths used as names in the detail
+    stack, resolving paths is costly compared to setting a detail.
+    """
+    try:
+        return _detailNames[name]
+    except KeyError:
+        result = _detailNames[name] = canonicalPath(name)
+        return result
+
 
 class Human(guicommon.Object, animation.AnimatedMesh):
 
@@ -59,6 +79,7 @@ class Human(guicommon.Object, animation.AnimatedMesh):
         guicommon.Object.__init__(self, mesh)
 
         self.hasWarpTargets = False
+        self._muteEvents = False    # When set to True, events of this human are not emitted
 
         self._name = ''
         self._tags = set()
@@ -79,6 +100,7 @@ class Human(guicommon.Object, animation.AnimatedMesh):
         self._resetProxies()
 
         self.targetsDetailStack = {}  # All details targets applied, with their values
+        self._targetStack = algos3d.TargetStack(self.meshData)  # Cached evaluation of targetsDetailStack
         self.symmetryModeEnabled = False
 
         self.setDefaultValues()
@@ -380,6 +402,17 @@ class Human(guicommon.Object, animation.AnimatedMesh):
             proxies.append(pxy)
         return proxies
 
+    def getProxyFitting(self):
+        """
+        Fitting engine that fits all proxies attached to this human at once.
+        It is rebuilt when the set of attached proxies changes.
+        """
+        import proxy
+        proxies = self.getProxies()
+        if self._proxyFitting is None or self._proxyFitting.proxies != proxies:
+            self._proxyFitting = proxy.ProxyFitting(proxies)
+        return self._proxyFitting
+
     def getTypedSimpleProxies(self, ptype):
         ptype = ptype.capitalize()
         table = {
@@ -913,17 +946,55 @@ class Human(guicommon.Object, animation.AnimatedMesh):
         else:
             return None
 
+    def callEvent(self, eventType, event):
+        if self._muteEvents:
+            return False
+        return super(Human, self).callEvent(eventType, event)
+
     def setDetail(self, name, value):
-        name = canonicalPath(name)
+        name = _canonicalDetailName(name)
         if value:
             self.targetsDetailStack[name] = value
         elif name in self.targetsDetailStack:
             del self.targetsDetailStack[name]
 
     def getDetail(self, name):
-        name = canonicalPath(name)
+        name = _canonicalDetailName(name)
         return self.targetsDetailStack.get(name, 0.0)
 
+    def setModifierValues(self, values):
+        """
+        Set the values of many modifiers at once, values is a dict of values
+        keyed by full modifier name. The macro variables are set first,
+        after which the target weights of all modifiers are resolved with the
+        final macro variables, regardless of the order of the values. Macro
+        modifiers of the same group control the same targets, their weights
+        are resolved only once.
+        Dependent modifiers are not updated, and no events are emitted for the
+        changes of the macro variables.
+        """
+        modifiers = [(self.getModifier(name), value) for name, value in values.items()]
+
+        self._muteEvents = True
+        try:
+            for modifier, value in modifiers:
+                if modifier.isMacro():
+                    getattr(self, modifier.setter)(modifier.clampValue(value), updateModifier=False)
+        finally:
+            self._muteEvents = False
+
+        weights = dict()
+        macroGroups = set()
+        for modifier, value in modifiers:
+            if modifier.isMacro():
+                if modifier.groupName in macroGroups:
+                    continue
+                macroGroups.add(modifier.groupName)
+            weights.update(modifier.resolveTargetWeights(value))
+
+        for tpath, weight in weights.items():
+            self.setDetail(tpath, weight)
+
     def updateMacroModifiers(self):
         """Update the targetsDetailStack for this human
         determined by the macromodifier target combinations."""
@@ -1154,18 +1225,23 @@ class Human(guicommon.Object, animation.AnimatedMesh):
 
         progress(0.0, 0.5)
 
-        # First call progress callback (which often processes events) before resetting mesh
-        # so that mesh is not drawn in its reset state
-        algos3d.resetObj(self.meshData)  # Reset mesh is in rest pose
-
-        # Apply targets to seedmesh coordinates
-        itprog = Progress(len(self.targetsDetailStack))
-        for (targetPath, morphFactor) in self.targetsDetailStack.items():
-            algos3d.loadTranslationTarget(self.meshData, targetPath, morphFactor, None, 0, 0)
-            itprog.step()
+        # First call progress callback (which often processes events) before updating mesh
+        # so that mesh is not drawn in an intermediate state
+
+        # Apply targets to seedmesh coordinates. Only targets whose weight
+        # changed since the last call are evaluated, this replaces a reset of
+        # the mesh followed by applying all targets.
+        changedVerts = self._targetStack.update(self.targetsDetailStack)
+        if not self.isPosed() and len(changedVerts) < INCREMENTAL_COORDS_RATIO * len(self.meshData.coord):
+            # The unposed mesh has the coordinates of the previous call, only
+            # update (and mark for syncing) the vertices that changed
+            self.meshData.changeCoords(self._targetStack.coord[changedVerts], changedVerts)
+        else:
+            changedVerts = None
+            self.meshData.changeCoords(self._targetStack.coord)
 
         # Make sure self.getRestposeCoordinates is up-to-date directly (required for proxy fitting)
-        self._updateOriginalMeshCoords(self.meshData.name, self.meshData.coord)
+        self._updateOriginalMeshCoords(self.meshData.name, self.meshData.coord, changedVerts)
 
         # Update (body) proxy
         self.updateProxyMesh()
@@ -1323,6 +1399,8 @@ class Human(guicommon.Object, animation.AnimatedMesh):
 
         self._clothesProxies = {}
 
+        self._proxyFitting = None
+
     def getMaterial(self):
         return super(Human, self).getMaterial()
 
@@ -1502,9 +1580,14 @@ class Human(guicommon.Object, animation.AnimatedMesh):
 
             lines = f.readlines()
 
+            # All properties are parsed first. The modifiers are set at once,
+            # the other properties are loaded afterwards, in order.
+            modifierValues = dict()
+            properties = []
+
             def _load_property(lineData):
                 try:
-                    _do_load_property(lineData)
+                    _do_parse_property(lineData)
                 except:
                     if strict:
                         e = sys.exc_info()
@@ -1512,39 +1595,54 @@ class Human(guicommon.Object, animation.AnimatedMesh):
                     else:
                         log.warning("Exception while loading MHM property.", exc_info=True)
 
-            def _do_load_property(lineData):
+            def _do_parse_property(lineData):
                 if len(lineData) > 0 and not lineData[0] == '#':
-                    if lineData[0] == 'version':
-                        log.message('Version %s', lineData[1])
-                    elif lineData[0] == 'uuid' and len(lineData) > 1:
-                        self.setUuid(lineData[1])
-                    elif lineData[0] == 'name' and len(lineData) > 1:
-                        self.setName(' '.join(lineData[1:]))
-                        log.debug('Model Name %s' % self.getName())
-                    elif lineData[0] == 'tags' and len(lineData) > 1:
-                        for tag in ' '.join(lineData[1:]).split(';'):
-                            self.addTag(tag)
-                    elif lineData[0] == 'modifier':
-                        try:
-                            self.getModifier(lineData[1]).setValue(float(lineData[2]), skipDependencies=True)
-                        except KeyError:
+                    if lineData[0] == 'modifier':
+                        value = float(lineData[2])
+                        if lineData[1] in self._modifiers:
+                            modifierValues[lineData[1]] = value
+                        else:
                             log.warning('Unknown modifier specified in MHM file: %s', lineData[1])
-                    elif lineData[0] == 'camera':
-                        rot = list(map(float, lineData[1:3])) + [0.0]
-                        trans = list(map(float, lineData[3:6]))
-                        zoom = float(lineData[6])
-                        G.app.modelCamera.setRotation(rot)
-                        G.app.modelCamera.translation[:3] = trans[:3]
-                        G.app.modelCamera.setZoomFactor(zoom)
-                    elif lineData[0] == 'subdivide':
-                        G.app.selectedHuman._mhm_do_subdivide = lineData[1].lower() in ['true', 'yes']
-                    elif lineData[0] in G.app.loadHandlers:
-                        G.app.loadHandlers[lineData[0]](self, lineData, strict)
                     else:
-                        if strict:
-                            raise RuntimeError('Unknown property in MHM file: %s' % (lineData, ))
-                        else:
-                            log.warning('Unknown property in MHM file: %s', lineData)
+                        properties.append(lineData)
+
+            def _apply_property(lineData):
+                try:
+                    _do_apply_property(lineData)
+                except:
+                    if strict:
+                        e = sys.exc_info()
+                        raise e[0](e[1]).with_traceback(e[2])
+                    else:
+                        log.warning("Exception while loading MHM property.", exc_info=True)
+
+            def _do_apply_property(lineData):
+                if lineData[0] == 'version':
+                    log.message('Version %s', lineData[1])
+                elif lineData[0] == 'uuid' and len(lineData) > 1:
+                    self.setUuid(lineData[1])
+                elif lineData[0] == 'name' and len(lineData) > 1:
+                    self.setName(' '.join(lineData[1:]))
+                    log.debug('Model Name %s' % self.getName())
+                elif lineData[0] == 'tags' and len(lineData) > 1:
+                    for tag in ' '.join(lineData[1:]).split(';'):
+                        self.addTag(tag)
+                elif lineData[0] == 'camera':
+                    rot = list(map(float, lineData[1:3])) + [0.0]
+                    trans = list(map(float, lineData[3:6]))
+                    zoom = float(lineData[6])
+                    G.app.modelCamera.setRotation(rot)
+                    G.app.modelCamera.translation[:3] = trans[:3]
+                    G.app.modelCamera.setZoomFactor(zoom)
+                elif lineData[0] == 'subdivide':
+                    G.app.selectedHuman._mhm_do_subdivide = lineData[1].lower() in ['true', 'yes']
+                elif lineData[0] in G.app.loadHandlers:
+                    G.app.loadHandlers[lineData[0]](self, lineData, strict)
+                else:
+                    if strict:
+                        raise RuntimeError('Unknown property in MHM file: %s' % (lineData, ))
+                    else:
+                        log.warning('Unknown property in MHM file: %s', lineData)
 
             version = _get_version(lines)
             if not _compare_versions(version, getShortVersion(noSub=True)):
@@ -1552,11 +1650,25 @@ class Human(guicommon.Object, animation.AnimatedMesh):
                 import compat
                 compat.loadMHM(version, lines, _load_property, strict)
             else:
-                fprog = Progress(len(lines))
                 for data in lines:
-                    lineData = data.strip().split()
-                    _load_property(lineData)
+                    _load_property(data.strip().split())
+
+            self.setModifierValues(modifierValues)
+
+            # Load the targets of the modifiers in the background, while the
+            # load handlers load proxies, materials and skeleton
+            from concurrent.futures import ThreadPoolExecutor
+            targetLoader = ThreadPoolExecutor(LOAD_THREADS)
+            for targetPath in self.targetsDetailStack:
+                targetLoader.submit(algos3d.getTarget, self.meshData, targetPath)
+
+            try:
+                fprog = Progress(len(properties))
+                for lineData in properties:
+                    _apply_property(lineData)
                     fprog.step()
+            finally:
+                targetLoader.shutdown(wait=True)
 
             log.debug("Finalizing MHM loading.")
             for lh in set(G.app.loadHandlers.values()):
@@ -194,10 +194,7 @@ class Modifier(object):
         return 1.0
 
     def setValue(self, value, skipDependencies=False):
-        value = self.clampValue(value)
-        factors = self.getFactors(value)
-
-        tWeights = getTargetWeights(self.targets, factors, value)
+        tWeights = self.resolveTargetWeights(value)
         for tpath, tWeight in tWeights.items():
             self.human.setDetail(tpath, tWeight)
 
@@ -230,6 +227,15 @@ class Modifier(object):
             else:
                 m.setValue(m.getValue(), skipDependencies = True)
 
+    def resolveTargetWeights(self, value):
+        """
+        The weights of the targets of this modifier when set to the specified
+        value, given the current macro variables of the human. Does not change
+        the human.
+        """
+        value = self.clampValue(value)
+        return getTargetWeights(self.targets, self.getFactors(value), value)
+
     def clampValue(self, value):
         raise NotImplementedError()
 
@@ -458,19 +464,9 @@ class ManagedTargetModifier(Modifier):
             value = max( 0.0, value)
         return value
 
-    def setValue(self, value, skipDependencies=False):
+    def resolveTargetWeights(self, value):
         value = self.clampValue(value)
-        factors = self.getFactors(value)
-
-        tWeights = getTargetWeights(self.targets, factors)
-        for tpath, tWeight in tWeights.items():
-            self.human.setDetail(tpath, tWeight)
-
-        if skipDependencies:
-            return
-
-        # Update dependent modifiers
-        self.propagateUpdate(realtime = False)
+        return getTargetWeights(self.targets, self.getFactors(value))
 
     def getValue(self):
         right = sum([self.human.getDetail(target[0]) for target in self.r_targets])
@@ -33,16 +33,18 @@
 Abstract
 --------
 
-Standalone script to compile all obj mesh files into binary npz files for faster
-loading.
+Standalone script to compile all obj mesh files into binary npz files, and
+all vertex weights files into binary mhwb files, for faster loading.
 """
 
 import sys
 sys.path = ["./core", "./lib", "./shared"] + sys.path
 import os
 import fnmatch
+import json
 import module3d
 import files3d
+import animation
 from getpath import isSubPath
 
 def getAllFiles(rootPath, filterStrArr):
@@ -86,6 +88,33 @@ def compileMesh(path):
         
     return True
 
+def compileWeights(path, vertexCount=None, rootBone="root"):
+    try:
+        weights = animation.VertexBoneWeights.fromJsonFile(path, vertexCount, rootBone)
+        weights.toBinaryFile(animation.getBinaryWeightsPath(path))
+    except:
+        print('Unable to save compiled vertex weights for file %s' % path)
+        return False
+
+    return True
+
+def compileSkeletonWeights(path, vertexCount):
+    """
+    Compile the weights file referenced by a skeleton, for the root bone of
+    the skeleton and the vertex count of the basemesh, as used when loading
+    the skeleton.
+    """
+    skelData = json.load(open(path, 'r', encoding='utf-8'))
+    if not skelData.get("weights_file"):
+        return None
+    weightsPath = os.path.join(os.path.dirname(path), skelData["weights_file"])
+    bones = skelData.get("bones", {})
+    roots = [name for name in bones if not bones[name].get("parent")]
+    if not roots:
+        return None
+    compileWeights(weightsPath, vertexCount, roots[0])
+    return weightsPath
+
 
 if __name__ == '__main__':
     allFiles = getAllFiles('data', ['*.obj'])
@@ -94,4 +123,14 @@ if __name__ == '__main__':
         compileMesh(path)
         print("[%.0f%% done] converted mesh %s" % (100*(float(i)/float(len(allOBJs))), path))
 
+    basemesh = files3d.loadMesh('data/3dobjs/base.obj')
+    allSkeletons, allProxyWeights = getAllFiles('data', ['*.mhskel', '*.jsonw'])
+    for (i, path) in enumerate(allSkeletons):
+        weightsPath = compileSkeletonWeights(path, basemesh.getVertexCount())
+        if weightsPath:
+            print("[%.0f%% done] converted vertex weights %s" % (100*(float(i)/float(len(allSkeletons))), weightsPath))
+    for (i, path) in enumerate(allProxyWeights):
+        compileWeights(path)
+        print("[%.0f%% done] converted vertex weights %s" % (100*(float(i)/float(len(allProxyWeights))), path))
+
     print("All done.")
@@ -40,9 +40,8 @@ import sys
 sys.path = [".", "./core", "./lib"] + sys.path
 import makehuman
 import algos3d
-import numpy as np
+import targetarchive
 import os
-import zipfile
 import fnmatch
 
 def getAllFiles(rootPath, filterStrArr):
@@ -64,33 +63,34 @@ def getFiles(root, filenames, filterStr):
 if __name__ == '__main__':
     obj = algos3d.Target(None, None)
     allFiles = getAllFiles('data', ['*.target', '*.png'])
-    npzPath = 'data/targets.npz'
-    with zipfile.ZipFile(npzPath, mode='w', compression=zipfile.ZIP_DEFLATED) as zip:
-        npzdir = os.path.dirname(npzPath)
+    archivePath = os.path.join('data', targetarchive.TARGETS_ARCHIVE_NAME)
+    with targetarchive.TargetArchiveWriter(archivePath) as archive:
+        archiveDir = os.path.dirname(archivePath)
         allTargets = allFiles[0]
 
         # License for all official MH targets
-        lpath = 'data/targets/targets.license.npy'
-        np.save(lpath, makehuman.getAssetLicense().toNumpyString())
-        zip.write(lpath, os.path.relpath(lpath, npzdir))
-        os.remove(lpath)
+        archive.setDefaultLicense(makehuman.getAssetLicense().toNumpyString())
 
         for (i, path) in enumerate(allTargets):
             try:
                 obj._load_text(path)
-                iname, vname, lname = obj._save_binary(path)
-                zip.write(iname, os.path.relpath(iname, npzdir))
-                zip.write(vname, os.path.relpath(vname, npzdir))
-                if lname:
-                    zip.write(lname, os.path.relpath(lname, npzdir))
-                    os.remove(lname)
-                os.remove(iname)
-                os.remove(vname)
+                index, vector = obj._compile()
+                if hasattr(obj, '_license'):
+                    license = obj._license.toNumpyString()
+                    del obj._license
+                else:
+                    license = None
+                archive.addTarget(os.path.relpath(path, archiveDir), index, vector, license)
                 print("[%.0f%% done] converted target %s" % (100*(float(i)/float(len(allTargets))), path))
             except None as e:
                 raise e
                 print('error converting target %s' % path)
 
+    # Remove archive in the old format, so that it cannot be picked up as
+    # fallback with outdated target data
+    if os.path.isfile('data/targets.npz'):
+        os.remove('data/targets.npz')
+
     print("Writing images list")
     with open('data/images.list', 'w', encoding="utf-8") as f:
         allImages = allFiles[1]
@@ -60,6 +60,7 @@ import os
 import numpy as np
 import log
 from getpath import getSysDataPath, canonicalPath
+from targetarchive import TargetArchive, TARGETS_ARCHIVE_NAME, VECTOR_SCALE
 
 _targetBuffer = {}
 
@@ -70,10 +71,14 @@ class Target(object):
     """
 
     dtype = [('index','u4'),('vector','(3,)f4')]
+    archive = None
     npzfile = None
     npztime = None
     npzdir = None
 
+    # Scale factor of fixed-point target data, None if data is stored as float
+    _dataScale = None
+
     def __init__(self, obj, name):
         """
         This method initializes an instance of the Target class.
@@ -110,10 +115,29 @@ class Target(object):
     def __repr__(self):
         return ( "<Target %s>" % (os.path.basename(self.name)) )
 
+    @property
+    def data(self):
+        """
+        The translation vectors of this target, as float array.
+        Compiled targets keep their data as memory-mapped fixed-point values,
+        for those a scaled copy is returned. Use apply() to apply a target
+        without this conversion.
+        """
+        if self._dataScale is None:
+            return self._data
+        return self._data * self._dataScale
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+        self._dataScale = None
+
     @property
     def license(self):
         if hasattr(self, '_license'):
             return self._license
+        elif Target.archive and Target.archive.getDefaultLicense() is not None:
+            return defaultTargetLicense().fromNumpyString(Target.archive.getDefaultLicense())
         elif Target.npzfile is not None and 'targets/targets.license' in Target.npzfile:
             license = defaultTargetLicense()
             return license.fromNumpyString(Target.npzfile['targets/targets.license'])
@@ -165,11 +189,33 @@ class Target(object):
             log.message('compiled file missing: %s', vname)
             raise RuntimeError('compiled file missing: %s' % vname)
         self.verts = Target.npzfile[iname]
-        self.data = Target.npzfile[vname] * 1e-3
+        self._data = Target.npzfile[vname]
+        self._dataScale = VECTOR_SCALE
         if lname in Target.npzfile:
             import makehuman
             self._license = defaultTargetLicense().fromNumpyString(Target.npzfile[lname])
 
+    def _load_binary_mapped(self, name):
+        """
+        Load target from memory-mapped targets archive. The index and vector
+        arrays of the target are views into the mapped file.
+        """
+        name = name.replace('\\', '/')
+        archive = Target.archive
+        if os.path.isfile(name) and archive.mtime < os.path.getmtime(name):
+            log.message('compiled file newer than archive: %s', name)
+            raise RuntimeError('compiled file newer than archive: %s' % name)
+        if name not in archive:
+            log.message('compiled file missing: %s', name)
+            raise RuntimeError('compiled file missing: %s' % name)
+        self.verts = archive.getIndex(name)
+        self._data = archive.getVector(name)
+        self._dataScale = VECTOR_SCALE
+        license = archive.getLicense(name)
+        if license is not None:
+            import makehuman
+            self._license = defaultTargetLicense().fromNumpyString(license)
+
     def _load_binary_files(self, name):
         """
         Load target from individual .bin file
@@ -194,6 +240,18 @@ class Target(object):
         self.data = np.load(vname) * 1e-3
 
     def _load_binary(self, name):
+        if Target.archive is None:
+            try:
+                Target.archive = TargetArchive(getSysDataPath(TARGETS_ARCHIVE_NAME))
+            except:
+                log.message('no memory-mapped targets found')
+                Target.archive = False
+        if Target.archive:
+            # Load target from memory-mapped archive
+            name = os.path.relpath(name, Target.archive.dataPath)
+            self._load_binary_mapped(name)
+            return
+
         if Target.npzfile is None:
             try:
                 npzname = getSysDataPath('targets.npz')     # TODO duplicate path literal
@@ -211,14 +269,22 @@ class Target(object):
             name = os.path.relpath(name, Target.npzdir)
             self._load_binary_archive(name)
 
+    def _compile(self):
+        """
+        Returns the vertex indices and fixed-point translation vectors of this
+        target in the format in which they are stored in compiled archives.
+        """
+        index = np.ascontiguousarray(self.verts, dtype=np.uint16)
+        vector = np.ascontiguousarray(np.round(self.data / VECTOR_SCALE), dtype=np.int16)
+        return index, vector
+
     def _save_binary(self, name):
         log.message('compiling %s', name)
         try:
             bname, ext = os.path.splitext(name)
             iname = '%s.index.npy' % bname
             vname = '%s.vector.npy' % bname
-            index = np.ascontiguousarray(self.verts, dtype=np.uint16)
-            vector = np.ascontiguousarray(np.round(self.data * 1e3), dtype=np.int16)
+            index, vector = self._compile()
             np.save(iname, index)
             np.save(vname, vector)
             if hasattr(self, '_license'):
@@ -266,6 +332,9 @@ class Target(object):
                 # Adding the translation vector
 
                 scale = np.array(scale) * morphFactor
+                if self._dataScale is not None:
+                    # Decode fixed-point data as part of the scaling
+                    scale *= self._dataScale
                 if animatedMesh is not None:
                     # Pose the direction in which the target is applied, for fast
                     # approximate modeling of a posed model
@@ -278,10 +347,10 @@ class Target(object):
                         animationTrack.bake(animatedMesh.getBaseSkeleton())
                     poseData = animatedMesh.getPoseState()
                     obj.coord[dstVerts] += animation.skinMesh( \
-                                  self.data[srcVerts] * scale[None,:], 
+                                  self._data[srcVerts] * scale[None,:], 
                                   vertBoneMapping.compiled(4)[dstVerts], poseData )
                 else:
-                    obj.coord[dstVerts] += self.data[srcVerts] * scale[None,:]
+                    obj.coord[dstVerts] += self._data[srcVerts] * scale[None,:]
                 obj.markCoords(dstVerts, coor=True)
 
             if calcNormals:
@@ -324,6 +393,12 @@ def getTarget(obj, targetPath):
         *string*. The file system path to the file containing the morphing targets.
         The precise format of this string will be operating system dependant.
     """
+    # Paths of detail stacks are canonical already, avoid resolving them again
+    try:
+        return _targetBuffer[targetPath]
+    except KeyError:
+        pass
+
     targetPath = canonicalPath(targetPath)
 
     try:
@@ -409,6 +484,170 @@ def loadTranslationTarget(obj, targetPath, morphFactor, faceGroupToUpdateName=No
 
     target.apply(obj, morphFactor, update, calcNorm, faceGroupToUpdateName, scale, animatedMesh)
 
+def _accumulateTargets(nVerts, targetFactors):
+    """
+    Sum the translation vectors of a list of (target, morphFactor) tuples into
+    an array of shape (nVerts, 3). Returns the offsets and the indices of the
+    affected vertices.
+    """
+    targets = []
+    factors = []
+    for target, morphFactor in targetFactors:
+        if not morphFactor or not len(target.verts):
+            continue
+        targets.append(target)
+        if target._dataScale is not None:
+            # Decode fixed-point data as part of the weighting
+            morphFactor *= target._dataScale
+        factors.append(morphFactor)
+
+    offsets = np.zeros((nVerts, 3), dtype=np.float64)
+    if not targets:
+        return offsets, np.zeros(0, dtype=np.intp)
+
+    verts = np.concatenate([t.verts for t in targets])
+    data = np.concatenate([t._data for t in targets])
+    weights = np.repeat(np.asarray(factors, dtype=np.float64),
+                        [len(t.verts) for t in targets])
+
+    for axis in range(3):
+        offsets[:,axis] = np.bincount(verts, data[:,axis] * weights, minlength=nVerts)
+    affected = np.flatnonzero(np.bincount(verts, minlength=nVerts))
+
+    return offsets, affected
+
+def getTargetsOffsets(obj, targetWeights):
+    """
+    This function sums the translation vectors of a set of weighted morph
+    targets into a single array of per-vertex offsets, in one vectorized pass.
+    The index and vector arrays of all targets with a non-zero weight are
+    concatenated and accumulated per vertex, which avoids the per-target
+    Python overhead of applying targets one by one with loadTranslationTarget.
+
+    Returns a tuple with the offsets, an array of shape (nVerts, 3) with an
+    offset for every vertex of obj, and the indices of the vertices that are
+    affected by at least one of the targets.
+
+    Parameters
+    ----------
+
+    obj:
+        *3d object*. The object to which the targets apply.
+
+    targetWeights:
+        *dict*. Morph factors keyed by target file path, like
+        Human.targetsDetailStack.
+    """
+    targetFactors = [(getTarget(obj, targetPath), morphFactor)
+                     for targetPath, morphFactor in targetWeights.items()
+                     if morphFactor]
+    return _accumulateTargets(obj.getVertexCount(), targetFactors)
+
+def loadTranslationTargets(obj, targetWeights, update=1, calcNorm=1):
+    """
+    This function applies a set of weighted morph targets to the mesh object
+    at once. It has the same effect as calling loadTranslationTarget for each
+    target, but accumulates the translations of all targets in one
+    vectorized pass (see getTargetsOffsets) and marks the modified coordinates
+    only once.
+
+    Parameters
+    ----------
+
+    obj:
+        *3d object*. The target object to which the translations are to be applied.
+        This object is read and updated by this function.
+
+    targetWeights:
+        *dict*. Morph factors keyed by target file path, like
+        Human.targetsDetailStack.
+
+    update:
+        *int flag*. A flag to indicate whether the update method on the object should be called.
+
+    calcNorm:
+        *int flag*. A flag to indicate whether the normals are to be recalculated (1/true)
+        or not (0/false).
+    """
+    offsets, verts = getTargetsOffsets(obj, targetWeights)
+
+    if len(verts):
+        obj.coord[verts] += offsets[verts]
+        obj.markCoords(verts, coor=True)
+
+        if calcNorm:
+            obj.calcNormals(1, 1, verts, obj.getFacesForVertices(verts))
+    if update:
+        obj.update()
+
+class TargetStack(object):
+    """
+    Incrementally evaluated sum of weighted morph targets on top of the
+    original coordinates of a mesh object.
+
+    The targets form the columns of a sparse blendshape matrix (each target
+    holds the vertex indices and translation vectors of its column), the
+    weights are the morph factors of a detail stack. The resulting
+    coordinates are cached, and when the weights change only the columns
+    whose weight changed are evaluated and added to the cache, instead of
+    resetting the mesh and replaying all targets.
+    """
+
+    def __init__(self, obj):
+        self.obj = obj
+        self.coord = None
+        self._applied = {}  # (target, morphFactor) per target path
+
+    def invalidate(self):
+        """
+        Drop the cached coordinates, the next update will evaluate all targets.
+        """
+        self.coord = None
+        self._applied = {}
+
+    def update(self, targetWeights):
+        """
+        Bring the cached coordinates up to date with targetWeights, a dict of
+        morph factors keyed by target path, like Human.targetsDetailStack.
+        Targets that were reloaded since the previous update (eg. with
+        refreshCachedTarget) are re-evaluated as well.
+
+        Returns the indices of the vertices whose coordinates changed.
+        """
+        nVerts = self.obj.getVertexCount()
+        if self.coord is not None and len(self.coord) != nVerts:
+            self.invalidate()
+
+        weights = dict((targetPath, (getTarget(self.obj, targetPath), morphFactor))
+                       for targetPath, morphFactor in targetWeights.items()
+                       if morphFactor)
+
+        changed = []
+        for targetPath, (target, morphFactor) in weights.items():
+            old = self._applied.get(targetPath)
+            if old is None:
+                changed.append( (target, morphFactor) )
+            elif old[0] is not target:
+                changed.append( (old[0], -old[1]) )
+                changed.append( (target, morphFactor) )
+            elif old[1] != morphFactor:
+                changed.append( (target, morphFactor - old[1]) )
+        for targetPath, (target, morphFactor) in self._applied.items():
+            if targetPath not in weights:
+                changed.append( (target, -morphFactor) )
+
+        if self.coord is None or len(changed) >= len(weights):
+            # Cheaper (and without accumulated rounding errors) to evaluate all
+            offsets, _ = _accumulateTargets(nVerts, weights.values())
+            self.coord = self.obj.orig_coord + offsets
+            changedVerts = np.arange(nVerts)
+        else:
+            offsets, changedVerts = _accumulateTargets(nVerts, changed)
+            self.coord[changedVerts] += offsets[changedVerts]
+
+        self._applied = weights
+        return changedVerts
+
 def saveTranslationTarget(obj, targetPath, groupToSave=None, epsilon=0.001):
     """
     This function analyses an object to determine the differences between the current
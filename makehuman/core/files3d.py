@@ -65,11 +65,12 @@ is visible to the user through the GUI.
 """
 
 import os.path
+import zipfile
 import module3d
 import numpy as np
 import log
 import wavefront
-from getpath import isSubPath, getPath
+from getpath import isSubPath, getPath, canonicalPath
 
 
 def packStringList(strings):
@@ -113,7 +114,17 @@ def saveBinaryMesh(obj, path):
     if obj.has_uv:
         vars_['fuvs']  = obj.fuvs
 
-    np.savez_compressed(path, **vars_)
+    # Write to a temporary file that replaces the compiled file when complete,
+    # so that other processes never load a partially written file
+    tmppath = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        with open(tmppath, 'wb') as f:
+            np.savez_compressed(f, **vars_)
+        os.replace(tmppath, path)
+    except:
+        if os.path.isfile(tmppath):
+            os.remove(tmppath)
+        raise
     os.utime(path, None)  # Ensure modification time is updated
 
 def loadBinaryMesh(obj, path):
@@ -167,6 +178,25 @@ def loadTextMesh(obj, path):
     wavefront.loadObjFile(path, obj)
     #log.debug('loadTextMesh: end')
 
+def isCompiledUpToDate(npzpath, path):
+    """
+    Whether compiled file npzpath exists and is not older than the file path
+    it was compiled from.
+    """
+    if not os.path.isfile(npzpath):
+        return False
+    return not (os.path.isfile(path) and os.path.getmtime(path) > os.path.getmtime(npzpath))
+
+def getCachedMeshPath(path):
+    """
+    Path of the compiled version of an OBJ file in the mesh cache, located in
+    the user data path. Used for OBJ files that are located outside of the
+    user data path, in which case the compiled file is not written next to it.
+    """
+    import hashlib
+    key = hashlib.sha1(canonicalPath(path).encode('utf-8')).hexdigest()
+    return getPath(os.path.join('cache', 'meshes', key + '.npz'))
+
 def loadMesh(path, loadColors=1, maxFaces=None, obj=None):
     """
     This function loads the specified mesh object into internal MakeHuman data 
@@ -194,6 +224,10 @@ def loadMesh(path, loadColors=1, maxFaces=None, obj=None):
 
     try:
         npzpath = os.path.splitext(path)[0] + '.npz'
+        if not isSubPath(npzpath, getPath('')) and not isCompiledUpToDate(npzpath, path):
+            # Compiled meshes are not written to system paths, a compiled copy
+            # of the file is kept in the user data path instead
+            npzpath = getCachedMeshPath(path)
         try:
             if not os.path.isfile(npzpath):
                 log.message('compiled file missing: %s', npzpath)
@@ -203,12 +237,15 @@ def loadMesh(path, loadColors=1, maxFaces=None, obj=None):
                 raise RuntimeError('compiled file out of date: %s', npzpath)
             loadBinaryMesh(obj, npzpath)
         except Exception as e:
-            showTrace = not isinstance(e, RuntimeError)
+            # A damaged compiled file is simply compiled again
+            showTrace = not isinstance(e, (RuntimeError, zipfile.BadZipFile, EOFError))
             log.warning("Problem loading binary mesh: %s", e, exc_info=showTrace)
             loadTextMesh(obj, path)
             if isSubPath(npzpath, getPath('')):
                 # Only write compiled binary meshes to user data path
                 try:
+                    if not os.path.isdir(os.path.dirname(npzpath)):
+                        os.makedirs(os.path.dirname(npzpath))
                     saveBinaryMesh(obj, npzpath)
                 except Exception:
                     log.notice('unable to save compiled mesh: %s', npzpath)
@@ -0,0 +1,928 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehumancommunity.org/
+
+**Github Code Home Page:**    https://github.com/makehumancommunity/
+
+**Authors:**           Jonas Hauquier
+
+**Copyright(c):**      MakeHuman Team 2001-2020
+
+**Licensing:**         AGPL3
+
+    This file is part of MakeHuman Community (www.makehumancommunity.org).
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+Abstract
+--------
+
+Headless MakeHuman engine.
+
+HeadlessApplication sets up the human, its modifiers and the asset libraries
+(proxies, materials, skeleton, pose and expression) without Qt or an OpenGL
+context. It takes the place of MHApplication as G.app, and implements the part
+of its interface that the non-GUI modules use: MHM load handlers, settings,
+progress reporting and the model camera state.
+The libraries in this module mirror the loading logic of the library plugins,
+without their file chooser widgets.
+
+    import headless
+    app = headless.HeadlessApplication()
+    app.loadMHM('models/example.mhm')
+    app.export('models/example.fbx')
+
+See makehuman_headless.py for the command line interface.
+"""
+
+import os
+import sys
+import importlib
+import importlib.util
+
+import numpy as np
+
+from core import G
+import events3d
+import getpath
+import filecache
+import log
+
+# Unit scales of exported files, relative to the internal decimeter units
+EXPORT_SCALES = {
+    "decimeter": 1.0,
+    "meter": 0.1,
+    "inch": 1.0/0.254,
+    "centimeter": 10.0
+    }
+
+# Export formats: file extension -> (exporter plugin, config class, export
+# module and function within the plugin package). MHM files are written by the
+# human itself.
+EXPORT_FORMATS = {
+    'mhm': (None, None, None, None),
+    'obj': ('9_export_obj', 'ObjConfig', 'mh2obj', 'exportObj'),
+    'fbx': ('9_export_fbx', 'FbxConfig', 'mh2fbx', 'exportFbx'),
+    'dae': ('9_export_collada', 'DaeConfig', 'mh2collada', 'exportCollada'),
+    'bvh': ('9_export_bvh', 'BvhConfig', None, None)
+    }
+
+DEFAULT_EYES = 'eyes/high-poly/high-poly.mhclo'
+
+# Bone used to scale poses to the size of the human (see 3_libraries_pose)
+POSE_COMPARE_BONE = "upperleg02.L"
+
+
+class HeadlessCamera(events3d.EventHandler):
+    """
+    Holds the model camera properties that are stored in MHM files.
+    """
+
+    def __init__(self):
+        super(HeadlessCamera, self).__init__()
+        self.rotation = [0.0, 0.0, 0.0]
+        self.translation = [0.0, 0.0, 0.0]
+        self.zoomFactor = 1.0
+
+    def getRotation(self):
+        return self.rotation
+
+    def setRotation(self, rot):
+        self.rotation = list(rot)
+
+    def setZoomFactor(self, zoomFactor):
+        self.zoomFactor = zoomFactor
+
+
+class ProxyLibrary(filecache.MetadataCacher):
+    """
+    Library of proxies of one type, the headless counterpart of
+    ProxyChooserTaskView.
+    """
+
+    def __init__(self, human, proxyName, multiProxy = False):
+        self.human = human
+        self.proxyName = proxyName
+        self.multiProxy = multiProxy
+        filecache.MetadataCacher.__init__(self, self.getFileExtension(), self.proxyName + '_filecache.mhc')
+
+        self.paths = [getpath.getPath(os.path.join('data', proxyName)), getpath.getSysDataPath(proxyName)]
+        self.paths = [p for p in self.paths if os.path.isdir(p)]
+
+        self._proxyFilePerUuid = None
+        self.selectedProxies = []
+
+    def getSearchPaths(self):
+        return self.paths
+
+    def getSaveName(self):
+        return self.proxyName
+
+    def getFileExtension(self):
+        return ['mhpxy', 'mhclo']
+
+    def getProxyType(self):
+        return self.proxyName.capitalize()
+
+    def getMetadataImpl(self, filename):
+        import proxy
+        return proxy.peekMetadata(filename, self.getProxyType())
+
+    def getTagsFromMetadata(self, metadata):
+        uuid, tags = metadata
+        return tags
+
+    def getUuidFromMetadata(self, metadata):
+        uuid, tags = metadata
+        return uuid
+
+    def getSelection(self):
+        return self.selectedProxies
+
+    def getObjects(self):
+        return [pxy.object for pxy in self.getSelection()]
+
+    def isProxySelected(self):
+        return len(self.getSelection()) > 0
+
+    def proxySelected(self, pxy):
+        setattr(self.human, self.proxyName + 'Proxy', pxy)
+
+    def proxyDeselected(self, pxy):
+        setattr(self.human, self.proxyName + 'Proxy', None)
+
+    def selectProxy(self, mhclofile):
+        import proxy
+        if not mhclofile:
+            if not self.multiProxy:
+                self.deselectProxy(None)
+            return
+
+        log.message('Selecting proxy file "%s" from %s library.', mhclofile, self.proxyName)
+        pxy = proxy.loadProxy(self.human, mhclofile, type=self.getProxyType())
+
+        if pxy.uuid in [p.uuid for p in self.getSelection() if p is not None]:
+            log.debug("Proxy with UUID %s (%s) already loaded in %s library. Skipping.", pxy.uuid, pxy.file, self.proxyName)
+            return
+
+        if not self.multiProxy and self.isProxySelected():
+            self.deselectProxy(None)
+
+        mesh, obj = pxy.loadMeshAndObject(self.human)
+        if not mesh:
+            return
+
+        self.adaptProxyToHuman(pxy, obj)
+        obj.setSubdivided(self.human.isSubdivided())
+
+        self.selectedProxies.append(pxy)
+        self.proxySelected(pxy)
+
+    def deselectProxy(self, mhclofile):
+        if self.multiProxy:
+            idx = self._getProxyIndex(mhclofile)
+            if idx is None:
+                return
+        elif self.isProxySelected():
+            idx = 0
+        else:
+            return
+
+        pxy = self.selectedProxies.pop(idx)
+        self.proxyDeselected(pxy)
+        pxy.object = None
+
+    def resetSelection(self):
+        for pxy in list(self.getSelection()):
+            self.deselectProxy(pxy.file)
+
+    def _getProxyIndex(self, mhcloFile):
+        mhcloFile = getpath.canonicalPath(mhcloFile)
+        for pIdx, p in enumerate(self.getSelection()):
+            if getpath.canonicalPath(p.file) == mhcloFile:
+                return pIdx
+        return None
+
+    def adaptProxyToHuman(self, pxy, obj):
+        mesh = obj.getSeedMesh()
+        pxy.update(mesh)
+        mesh.update()
+        if obj.isSubdivided():
+            obj.getSubdivisionMesh()
+
+    def adaptAllProxies(self):
+        for pxy, obj in zip(self.getSelection(), self.getObjects()):
+            self.adaptProxyToHuman(pxy, obj)
+
+    def findProxyByUuid(self, uuid):
+        if self._filecache is None:
+            self.loadCache()
+            self.updateFileCache(self.getSearchPaths(), self.getFileExtensions(), True)
+
+        if self._proxyFilePerUuid is None:
+            self._loadUuidLookup()
+
+        if uuid not in self._proxyFilePerUuid:
+            self.updateFileCache(self.getSearchPaths(), self.getFileExtensions(), True)
+            self._loadUuidLookup()
+            if uuid not in self._proxyFilePerUuid:
+                log.warning('Could not find a proxy with UUID %s. Does not exist in %s library.', uuid, self.proxyName)
+                return None
+
+        return self._proxyFilePerUuid[uuid]
+
+    def _loadUuidLookup(self):
+        self._proxyFilePerUuid = dict(self._filecache.getUuids())
+
+    def onHumanChanging(self, event):
+        pass
+
+    def onHumanChanged(self, event):
+        if event.change == 'reset':
+            self.resetSelection()
+        if event.change in ['targets', 'modifier']:
+            self.adaptAllProxies()
+
+    def loadHandler(self, human, values, strict):
+        if values[0] == 'status':
+            return
+
+        if values[0] == self.getSaveName():
+            if len(values) >= 3:
+                name = values[1]
+                uuid = values[2]
+                proxyFile = self.findProxyByUuid(uuid)
+                if not proxyFile:
+                    if strict:
+                        raise RuntimeError("%s library could not load %s proxy with UUID %s, file not found." % (self.proxyName, name, uuid))
+                    log.warning("%s library could not load %s proxy with UUID %s, file not found.", self.proxyName, name, uuid)
+                    return
+                self.selectProxy(proxyFile)
+            else:
+                log.error("Not loading %s %s. Loading proxies from filename is no longer supported, they need to be referenced by UUID.", self.proxyName, values[1])
+
+    def saveHandler(self, human, file):
+        for pxy in self.getSelection():
+            file.write('%s %s %s\n' % (self.getSaveName(), pxy.name, pxy.getUuid()))
+
+
+class EyesLibrary(ProxyLibrary):
+
+    def onHumanChanged(self, event):
+        super(EyesLibrary, self).onHumanChanged(event)
+        if event.change == 'reset':
+            self.selectProxy(getpath.getSysDataPath(DEFAULT_EYES))
+
+
+class TopologyLibrary(ProxyLibrary):
+    """
+    Library of proxy meshes that replace the topology of the human.
+    """
+
+    def __init__(self, human):
+        super(TopologyLibrary, self).__init__(human, 'proxymeshes')
+
+    def getSaveName(self):
+        return 'proxy'
+
+    def getFileExtension(self):
+        return ['mhpxy', 'proxy']
+
+    def getSelection(self):
+        if self.human.isProxied():
+            return [self.human.proxy]
+        return []
+
+    def selectProxy(self, mhclofile):
+        import proxy
+        if self.isProxySelected():
+            self.deselectProxy(None)
+        if not mhclofile:
+            return
+
+        pxy = proxy.loadProxy(self.human, mhclofile, type=self.getProxyType())
+        pxy.z_depth = self.human.getSeedMesh().priority
+        pxy.loadMeshAndObject(self.human)
+        self.human.setProxy(pxy)
+
+    def deselectProxy(self, mhclofile):
+        if self.isProxySelected():
+            self.human.setProxy(None)
+
+    def adaptAllProxies(self):
+        # Fitting of the human proxy is done by the human itself
+        pass
+
+
+class ClothesLibrary(ProxyLibrary):
+
+    def __init__(self, human):
+        super(ClothesLibrary, self).__init__(human, 'clothes', multiProxy = True)
+        self.faceHiding = True
+        self.blockFaceMasking = False
+
+    def proxySelected(self, pxy):
+        self.human.addClothesProxy(pxy)
+        self.updateFaceMasks()
+
+    def proxyDeselected(self, pxy):
+        self.human.removeClothesProxy(pxy.uuid)
+        self.updateFaceMasks()
+
+    def updateFaceMasks(self):
+        """
+        Apply the faces deleted by clothes to the body and the clothes below
+        them, like the clothes library does.
+        """
+        import proxy
+        if self.blockFaceMasking:
+            return
+
+        human = self.human
+        if not self.faceHiding:
+            human.changeVertexMask(None)
+            for obj in self.getObjects():
+                obj.changeVertexMask(None)
+            return
+
+        vertsMask = np.ones(human.meshData.getVertexCount(), dtype=bool)
+        stackedProxies = sorted(self.getSelection(), key=lambda pxy: pxy.z_depth, reverse=True)
+        for pxy in stackedProxies:
+            pxy.object.changeVertexMask(proxy.transferVertexMaskToProxy(vertsMask, pxy))
+            if pxy.deleteVerts is not None and len(pxy.deleteVerts > 0):
+                vertsMask[np.argwhere(pxy.deleteVerts)[...,0]] = False
+        human.changeVertexMask(vertsMask)
+
+    def onHumanChanged(self, event):
+        super(ClothesLibrary, self).onHumanChanged(event)
+        if event.change == 'reset':
+            self.faceHiding = True
+        elif event.change == 'proxyChange' and event.proxy == 'human':
+            self.updateFaceMasks()
+
+    def loadHandler(self, human, values, strict):
+        if values[0] == 'status':
+            if values[1] == 'started':
+                self.blockFaceMasking = True
+            elif values[1] == 'finished':
+                self.blockFaceMasking = False
+                self.updateFaceMasks()
+            return
+
+        if values[0] == 'clothesHideFaces':
+            self.faceHiding = values[1].lower() in ['true', 'yes']
+            return
+
+        super(ClothesLibrary, self).loadHandler(human, values, strict)
+
+    def saveHandler(self, human, file):
+        super(ClothesLibrary, self).saveHandler(human, file)
+        file.write('clothesHideFaces %s\n' % str(self.faceHiding))
+
+
+class MaterialLibrary(object):
+    """
+    Loads skin and proxy materials referenced from MHM files.
+    """
+
+    def __init__(self, human):
+        self.human = human
+
+    def getMaterialPath(self, relPath, objFile = None):
+        if objFile:
+            objFile = os.path.abspath(objFile)
+            if os.path.isfile(objFile):
+                objFile = os.path.dirname(objFile)
+            searchPaths = [ objFile ]
+        else:
+            searchPaths = []
+
+        return getpath.thoroughFindFile(relPath, searchPaths)
+
+    def getRelativeMaterialPath(self, filepath, objFile = None):
+        """
+        Produce a portable path for writing to file.
+        """
+        if filepath:
+            if objFile:
+                objFile = getpath.canonicalPath(objFile)
+                if os.path.isfile(objFile):
+                    objFile = os.path.dirname(objFile)
+                searchPaths = [ objFile ]
+            else:
+                searchPaths = []
+
+            return getpath.getJailedPath(filepath, searchPaths)
+        else:
+            return ''
+
+    def onHumanChanging(self, event):
+        pass
+
+    def onHumanChanged(self, event):
+        pass
+
+    def loadHandler(self, human, values, strict):
+        import material
+        if values[0] == 'status':
+            return
+
+        if values[0] == 'skinMaterial':
+            path = values[1]
+            if not os.path.isfile(path):
+                path = getpath.thoroughFindFile(path)
+            if not os.path.isfile(path):
+                if strict:
+                    raise RuntimeError('Could not find material %s for skinMaterial parameter.' % values[1])
+                log.warning('Could not find material %s for skinMaterial parameter.', values[1])
+                return
+            human.material = material.fromFile(path)
+
+        elif values[0] == 'material':
+            if len(values) == 3:
+                name = ""
+                uuid, filepath = values[1:3]
+            else:
+                name, uuid, filepath = values[1:4]
+
+            pxy = human.clothesProxies.get(uuid, None)
+            if pxy is None:
+                for p in human.getProxies(includeHumanProxy=False):
+                    if p.getUuid() == uuid:
+                        pxy = p
+                        break
+            if pxy is None:
+                if strict:
+                    raise RuntimeError("Could not load material for proxy with uuid %s (%s)! No such proxy." % (uuid, name))
+                log.error("Could not load material for proxy with uuid %s (%s)! No such proxy.", uuid, name)
+                return
+            pxy.object.material = material.fromFile(self.getMaterialPath(filepath, pxy.file))
+
+    def saveHandler(self, human, file):
+        file.write('skinMaterial %s\n' % self.getRelativeMaterialPath(human.material.filename))
+        for pxy in human.getProxies(includeHumanProxy=False):
+            obj = pxy.object
+            if not obj:
+                continue
+            if pxy.type == 'Clothes' and obj.material.filename == pxy.material.filename:
+                # Clothes only store a material that differs from their default
+                continue
+            materialPath = self.getRelativeMaterialPath(obj.material.filename, pxy.file)
+            file.write('material %s %s %s\n' % (pxy.name, pxy.getUuid(), materialPath))
+
+
+class SkeletonLibrary(object):
+
+    def __init__(self, human):
+        self.human = human
+        self.paths = [getpath.getDataPath('rigs'), getpath.getSysDataPath('rigs')]
+        self.selectedRig = None
+
+    def chooseSkeleton(self, filename):
+        import skeleton
+        self.selectedRig = filename
+        if not filename:
+            if self.human.skeleton:
+                self.human.setSkeleton(None)
+            return
+
+        log.debug("Loading skeleton from %s", filename)
+        referenceRig = self.human.getBaseSkeleton()
+        if getpath.isSamePath(filename, getpath.getSysDataPath('rigs/default.mhskel')):
+            skel = referenceRig.createFromPose()
+        else:
+            skel = skeleton.load(filename, self.human.meshData)
+            skel.autoBuildWeightReferences(referenceRig)
+            skel.getVertexWeights(referenceRig.getVertexWeights(), force_remap=False)
+            skel.addReferencePlanes(referenceRig)
+        self.human.setSkeleton(skel)
+
+    def onHumanChanging(self, event):
+        if event.change == 'reset':
+            self.chooseSkeleton(None)
+
+    def onHumanChanged(self, event):
+        pass
+
+    def loadHandler(self, human, values, strict):
+        if values[0] == 'skeleton':
+            skelFile = getpath.thoroughFindFile(values[1], self.paths)
+            if not os.path.isfile(skelFile):
+                if strict:
+                    raise RuntimeError("Could not load rig %s, file does not exist." % skelFile)
+                log.warning("Could not load rig %s, file does not exist.", skelFile)
+            else:
+                self.chooseSkeleton(skelFile)
+
+    def saveHandler(self, human, file):
+        if human.getSkeleton() and self.selectedRig:
+            rigFile = getpath.getRelativePath(self.selectedRig, self.paths)
+            file.write('skeleton %s\n' % rigFile)
+
+
+class PoseLibrary(object):
+
+    def __init__(self, human):
+        self.human = human
+        self.paths = [getpath.getDataPath('poses'), getpath.getSysDataPath('poses')]
+        self.currentPose = None
+        self.bvh_bone_length = None
+        self.bvh_root_translation = None
+
+    def loadPose(self, filepath, apply_pose=True):
+        import animation
+        self.currentPose = filepath
+
+        if not filepath:
+            self.human.resetToRestPose()
+            self.bvh_bone_length = None
+            self.bvh_root_translation = None
+            return
+
+        ext = os.path.splitext(filepath)[1].lower()
+        if ext == '.mhp':
+            anim = animation.loadPoseFromMhpFile(filepath, self.human.getBaseSkeleton())
+        elif ext == '.bvh':
+            anim = self.loadBvh(filepath)
+            if not anim:
+                log.error('Cannot load animation from %s' % filepath)
+                return
+        else:
+            log.error("Cannot load pose file %s: File type unknown." % filepath)
+            return
+
+        self.human.addAnimation(anim)
+        self.human.setActiveAnimation(anim.name)
+        self.human.setToFrame(0, update=False)
+        if apply_pose:
+            self.human.setPosed(True)
+
+    def loadBvh(self, filepath):
+        import bvh
+        import numpy.linalg as la
+        bvh_file = bvh.load(filepath, convertFromZUp="auto")
+        if POSE_COMPARE_BONE not in bvh_file.joints:
+            log.error('Pose file %s does not use the default rig.' % filepath)
+            return None
+        anim = bvh_file.createAnimationTrack(self.human.getBaseSkeleton())
+        if "root" in bvh_file.joints:
+            posedata = anim.getAtFramePos(0, noBake=True)
+            self.bvh_root_translation = posedata[0, :3, 3].copy()
+        else:
+            self.bvh_root_translation = np.asarray(3*[0.0], dtype=np.float32)
+        joint = bvh_file.joints[POSE_COMPARE_BONE]
+        self.bvh_bone_length = la.norm(joint.children[0].position - joint.position)
+        self.autoScaleAnim(anim)
+        return anim
+
+    def autoScaleAnim(self, anim):
+        """
+        Scale the root translation of the pose to the leg length of the human.
+        """
+        if self.bvh_bone_length is None:
+            return
+        bone = self.human.getBaseSkeleton().getBone(POSE_COMPARE_BONE)
+        scale_factor = float(bone.length) / self.bvh_bone_length
+        posedata = anim.getAtFramePos(0, noBake=True)
+        posedata[0, :3, 3] = scale_factor * self.bvh_root_translation
+        anim.resetBaked()
+
+    def onHumanChanging(self, event):
+        if event.change == 'reset':
+            self.currentPose = None
+
+    def onHumanChanged(self, event):
+        if event.change == 'skeleton':
+            if self.currentPose:
+                self.loadPose(self.currentPose, apply_pose=False)
+        elif event.change in ['modifier', 'targets']:
+            anim = self.human.getActiveAnimation()
+            if anim:
+                self.autoScaleAnim(anim)
+
+    def loadHandler(self, human, values, strict):
+        if values[0] == 'pose':
+            poseFile = getpath.thoroughFindFile(values[1], self.paths)
+            if not os.path.isfile(poseFile):
+                if strict:
+                    raise RuntimeError("Could not load pose %s, file does not exist." % poseFile)
+                log.warning("Could not load pose %s, file does not exist.", poseFile)
+            else:
+                self.loadPose(poseFile)
+
+    def saveHandler(self, human, file):
+        if self.currentPose:
+            poseFile = getpath.getRelativePath(self.currentPose, self.paths)
+            file.write('pose %s\n' % poseFile)
+
+
+class ExpressionLibrary(object):
+
+    def __init__(self, human):
+        self.human = human
+        self.paths = [getpath.getDataPath('expressions'), getpath.getSysDataPath('expressions')]
+        self.base_anim = None
+        self.face_bone_idxs = None
+        self.selectedPose = None
+        self.selectedFile = None
+
+    def _load_pose_units(self):
+        import json
+        import bvh
+        import animation
+        from collections import OrderedDict
+        base_bvh = bvh.load(getpath.getSysDataPath('poseunits/face-poseunits.bvh'), allowTranslation="none")
+        base_anim = base_bvh.createAnimationTrack(self.human.getBaseSkeleton(), name="Expression-Face-PoseUnits")
+        with open(getpath.getSysDataPath('poseunits/face-poseunits.json'), 'r', encoding='utf-8') as f:
+            poseunit_names = json.load(f, object_pairs_hook=OrderedDict)['framemapping']
+        if len(poseunit_names) != base_bvh.frameCount:
+            raise RuntimeError("Face units BVH has wrong number of frames (%s) while face-poseunits.json defines %s poses, they should be equal." % (base_bvh.frameCount, len(poseunit_names)))
+        self.base_anim = animation.PoseUnit(base_anim.name, base_anim._data, poseunit_names)
+        self.face_bone_idxs = sorted(set([bIdx for l in self.base_anim.getAffectedBones() for bIdx in l]))
+
+    def chooseExpression(self, filename):
+        import animation
+        if self.base_anim is None:
+            self._load_pose_units()
+
+        log.debug("Loading expression from %s", filename)
+        self.selectedFile = filename
+        self.selectedPose = animation.poseFromUnitPose('expr-lib-pose', filename, self.base_anim)
+
+        pose = self.human.getActiveAnimation()
+        if pose is None:
+            pose_ = self.selectedPose
+            pose_.pose_backref = None
+        else:
+            org_pose = getattr(pose, 'pose_backref', None) or pose
+            pose_ = animation.mixPoses(org_pose, self.selectedPose, self.face_bone_idxs)
+            pose_.pose_backref = org_pose
+
+        pose_.name = 'expr-lib-pose'
+        self.human.addAnimation(pose_)
+        self.human.setActiveAnimation('expr-lib-pose')
+        self.human.setPosed(True)
+        self.human.refreshPose()
+
+    def onHumanChanging(self, event):
+        if event.change == 'reset':
+            self.selectedPose = None
+            self.selectedFile = None
+
+    def onHumanChanged(self, event):
+        pass
+
+    def loadHandler(self, human, values, strict):
+        if values[0] == 'expression' and len(values) > 1:
+            poseFile = getpath.thoroughFindFile(values[1], self.paths)
+            if not os.path.isfile(poseFile):
+                if strict:
+                    raise RuntimeError("Could not load expression pose %s, file does not exist." % poseFile)
+                log.warning("Could not load expression pose %s, file does not exist.", poseFile)
+            else:
+                self.chooseExpression(poseFile)
+
+    def saveHandler(self, human, file):
+        if self.selectedFile:
+            poseFile = getpath.getRelativePath(self.selectedFile, self.paths)
+            file.write('expression %s\n' % poseFile)
+
+
+class HeadlessApplication(events3d.EventHandler):
+    """
+    Application without GUI, for loading and exporting humans from scripts.
+    Only one application can exist per process, as it registers itself as
+    G.app.
+    """
+
+    def __init__(self, preloadTargets = False):
+        super(HeadlessApplication, self).__init__()
+        if G.app is not None:
+            raise RuntimeError('An application is already running in this process')
+        G.app = self
+
+        # Attributes of MHApplication that are tested by the non-GUI modules
+        self.splash = None
+        self.statusBar = None
+        self.log_window = None
+
+        self._settings = {
+            'parallelSkinning': False,
+            'units': 'metric',
+            'makehumanTags': ['makehuman™']
+        }
+
+        self.loadHandlers = {}
+        self.saveHandlers = []
+        self.libraries = []
+        self.modelCamera = HeadlessCamera()
+        self.selectedHuman = None
+
+        self.loadHuman()
+        self.loadModifiers()
+        self.loadLibraries()
+        if preloadTargets:
+            self.loadMacroTargets()
+        self.loadFinish()
+
+    def getSetting(self, setting_name):
+        return self._settings[setting_name]
+
+    def setSetting(self, setting_name, value):
+        self._settings[setting_name] = value
+
+    def addLoadHandler(self, keyword, handler):
+        self.loadHandlers[keyword] = handler
+
+    def redraw(self):
+        pass
+
+    def progress(self, value, text=None, *args):
+        if text:
+            log.debug(text, *args)
+
+    def loadHuman(self):
+        import human
+        import files3d
+        import skeleton
+
+        self.selectedHuman = human.Human(files3d.loadMesh(getpath.getSysDataPath("3dobjs/base.obj"), maxFaces = 5))
+        self.selectedHuman.parallelSkinning = self.getSetting('parallelSkinning')
+
+        base_skel = skeleton.load(getpath.getSysDataPath('rigs/default.mhskel'), self.selectedHuman.meshData)
+        self.selectedHuman.setBaseSkeleton(base_skel)
+
+        @self.selectedHuman.mhEvent
+        def onChanging(event):
+            for library in self.libraries:
+                library.onHumanChanging(event)
+
+        @self.selectedHuman.mhEvent
+        def onChanged(event):
+            for library in self.libraries:
+                library.onHumanChanged(event)
+
+    def loadModifiers(self):
+        import humanmodifier
+        for filename in ['modeling_modifiers.json', 'bodyshapes_modifiers.json', 'measurement_modifiers.json']:
+            humanmodifier.loadModifiers(getpath.getSysDataPath('modifiers/' + filename), self.selectedHuman)
+
+    def loadLibraries(self):
+        """
+        Create the asset libraries and register their MHM load handlers.
+        """
+        human = self.selectedHuman
+        self.proxyLibraries = [TopologyLibrary(human),
+                               ClothesLibrary(human),
+                               ProxyLibrary(human, 'hair'),
+                               EyesLibrary(human, 'eyes'),
+                               ProxyLibrary(human, 'eyebrows'),
+                               ProxyLibrary(human, 'eyelashes'),
+                               ProxyLibrary(human, 'teeth'),
+                               ProxyLibrary(human, 'tongue')]
+        self.materialLibrary = MaterialLibrary(human)
+        self.skeletonLibrary = SkeletonLibrary(human)
+        self.poseLibrary = PoseLibrary(human)
+        self.expressionLibrary = ExpressionLibrary(human)
+
+        for library in self.proxyLibraries:
+            self.addLoadHandler(library.getSaveName(), library.loadHandler)
+        self.addLoadHandler('clothesHideFaces', self.proxyLibraries[1].loadHandler)
+        self.addLoadHandler('material', self.materialLibrary.loadHandler)
+        self.addLoadHandler('skinMaterial', self.materialLibrary.loadHandler)
+        self.addLoadHandler('skeleton', self.skeletonLibrary.loadHandler)
+        self.addLoadHandler('pose', self.poseLibrary.loadHandler)
+        self.addLoadHandler('expression', self.expressionLibrary.loadHandler)
+
+        self.saveHandlers = [library.saveHandler for library in self.proxyLibraries] + \
+                            [self.materialLibrary.saveHandler, self.skeletonLibrary.saveHandler,
+                             self.poseLibrary.saveHandler, self.expressionLibrary.saveHandler]
+
+        # Order of event handling matches the order of the library plugins
+        self.libraries = [self.expressionLibrary] + self.proxyLibraries + \
+                         [self.materialLibrary, self.skeletonLibrary, self.poseLibrary]
+
+    def getProxyLibrary(self, proxyName):
+        for library in self.proxyLibraries:
+            if library.proxyName == proxyName:
+                return library
+        raise KeyError('No proxy library for %s' % proxyName)
+
+    def loadMacroTargets(self):
+        """
+        Preload all target files belonging to group macrodetails and its child
+        groups.
+        """
+        import targets
+        import algos3d
+        for target in targets.getTargets().findTargets('macrodetails'):
+            algos3d.getTarget(self.selectedHuman.meshData, target.path)
+
+    def loadFinish(self):
+        self.resetHuman()
+
+    def resetHuman(self):
+        """
+        Reset the human to the default model, with the default eyes.
+        """
+        self.selectedHuman.resetMeshValues()
+        self.selectedHuman.applyAllTargets()
+
+    def loadMHM(self, filename, strict = False):
+        self.selectedHuman.load(filename, True, strict)
+
+    def getExporterPlugin(self, name):
+        """
+        Import the package of an exporter plugin, the same way the plugin
+        loader of MHApplication does, without calling its load() function.
+        """
+        if name in sys.modules:
+            return sys.modules[name]
+        location = os.path.join(getpath.getSysPath('plugins'), name, '__init__.py')
+        spec = importlib.util.spec_from_file_location(name=name, location=location)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        try:
+            spec.loader.exec_module(module)
+        except:
+            del sys.modules[name]
+            raise
+        return module
+
+    def getExportConfig(self, fileExtension, scale = "decimeter", feetOnGround = False, hiddenGeom = False, **configOptions):
+        """
+        Export config for the exporter of the specified format, with the same
+        defaults as the options in the export tab. Other options of the config
+        of the format (for example useNormals for OBJ) can be specified as
+        keyword arguments.
+        """
+        if not EXPORT_FORMATS.get(fileExtension, [None])[0]:
+            raise ValueError('Unsupported export format: %s' % fileExtension)
+        if scale not in EXPORT_SCALES:
+            raise ValueError('Unknown export unit: %s' % scale)
+
+        pluginName, configName = EXPORT_FORMATS[fileExtension][:2]
+        cfg = getattr(self.getExporterPlugin(pluginName), configName)()
+        cfg.feetOnGround = feetOnGround
+        cfg.scale, cfg.unit = EXPORT_SCALES[scale], scale
+        cfg.hiddenGeom = hiddenGeom
+        for name, value in configOptions.items():
+            if name in ['scale', 'unit', 'human'] or not hasattr(cfg, name):
+                raise ValueError('Unknown %s export option: %s' % (fileExtension, name))
+            setattr(cfg, name, value)
+        if fileExtension == 'fbx':
+            cfg.scale *= 10
+        cfg.setHuman(self.selectedHuman)
+        return cfg
+
+    def export(self, filename, **options):
+        """
+        Export the human to filename, in the format that matches the file
+        extension (mhm, obj, fbx, dae or bvh). Options are passed to
+        getExportConfig(), they do not apply to MHM files.
+        """
+        import bvh
+        fileExtension = os.path.splitext(filename)[1][1:].lower()
+        if fileExtension == 'mhm':
+            log.message("Saving file %s.", filename)
+            self.selectedHuman.save(filename)
+            return
+        cfg = self.getExportConfig(fileExtension, **options)
+        pluginName, _, moduleName, funcName = EXPORT_FORMATS[fileExtension]
+        human = self.selectedHuman
+
+        log.message("Exporting file %s.", filename)
+        if moduleName:
+            self.getExporterPlugin(pluginName)
+            module = importlib.import_module('.' + moduleName, pluginName)
+            getattr(module, funcName)(filename, cfg)
+        else:
+            # BVH export, see ExporterBVH.export()
+            skel = human.getSkeleton()
+            if not skel:
+                raise RuntimeError('Cannot export BVH, the human has no skeleton.')
+            if human.isPosed():
+                bvhData = bvh.createFromSkeleton(skel, human.getActiveAnimation())
+            else:
+                bvhData = bvh.createFromSkeleton(skel)
+            if cfg.scale != 1:
+                bvhData.scale(cfg.scale)
+            if cfg.feetOnGround:
+                bvhData.offset(cfg.offset)
+            bvhData.writeToFile(filename)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehumancommunity.org/
+
+**Github Code Home Page:**    https://github.com/makehumancommunity/
+
+**Authors:**           Jonas Hauquier
+
+**Copyright(c):**      MakeHuman Team 2001-2020
+
+**Licensing:**         AGPL3
+
+    This file is part of MakeHuman Community (www.makehumancommunity.org).
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+Abstract
+--------
+
+Multi-process backend for mass producing characters.
+
+Characters are described by specs: plain dicts with the complete state that
+differs between the characters of a batch (modifier values, skin material,
+hair, eyebrows, eyelashes and clothes) and the file to export them to. The
+specs are distributed over a pool of worker processes. Each worker runs its
+own HeadlessApplication, with the base model loaded once, and produces a
+character by resetting the human to the base model, applying the spec and
+exporting it. As a spec describes the complete character, the result does not
+depend on which worker produces it, or in which order.
+
+    producer = massproducer.MassProducer('base.mhm', processes=4)
+    for result in producer.produce(specs):
+        if not result.succeeded:
+            log.error("Failed to produce %s: %s", result.path, result.error)
+
+The massproduce plugin builds specs from seeded HumanStates, see
+HumanState.getSpec().
+"""
+
+import os
+import time
+import multiprocessing
+import traceback
+
+import log
+import getpath
+
+# Proxy types of which a spec selects exactly one (or none)
+SINGLE_PROXY_TYPES = ['hair', 'eyebrows', 'eyelashes']
+
+
+class ProductionResult(object):
+    """
+    Outcome of producing one character, reported through the results channel
+    of MassProducer.produce().
+    """
+
+    def __init__(self, index, path, error = None, duration = 0.0):
+        self.index = index
+        self.path = path
+        self.error = error
+        self.duration = duration
+
+    @property
+    def succeeded(self):
+        return self.error is None
+
+
+class ProductionWorker(object):
+    """
+    Produces characters from specs, using a headless application that has the
+    base model loaded. There can only be one worker per process.
+    """
+
+    def __init__(self, baseModel = None, exportOptions = None):
+        import headless
+        self.app = headless.HeadlessApplication()
+        self.human = self.app.selectedHuman
+        if baseModel:
+            self.app.loadMHM(baseModel)
+        self.exportOptions = exportOptions or {}
+
+        self.baseTargets = dict(self.human.targetsDetailStack)
+
+    def applySpec(self, spec):
+        """
+        Reset the human to the base model and apply the state described by
+        the spec to it.
+        """
+        import material
+        human = self.human
+
+        human.targetsDetailStack = dict(self.baseTargets)
+        modifiers = spec['modifiers']
+        # Macro modifiers first, other modifiers can depend on them
+        for name in sorted(modifiers, key=lambda n: not human.getModifier(n).isMacro()):
+            human.getModifier(name).setValue(modifiers[name])
+
+        skinMaterial = spec.get('skinMaterial')
+        if skinMaterial and skinMaterial != human.material.filename:
+            human.material = material.fromFile(skinMaterial)
+
+        for proxyType in SINGLE_PROXY_TYPES:
+            library = self.app.getProxyLibrary(proxyType)
+            mhclofile = spec.get(proxyType)
+            selected = [getpath.canonicalPath(pxy.file) for pxy in library.getSelection()]
+            if selected != ([getpath.canonicalPath(mhclofile)] if mhclofile else []):
+                library.selectProxy(mhclofile)
+
+        library = self.app.getProxyLibrary('clothes')
+        clothes = [getpath.canonicalPath(mhclofile) for mhclofile in spec.get('clothes', [])]
+        for pxy in list(library.getSelection()):
+            if getpath.canonicalPath(pxy.file) not in clothes:
+                library.deselectProxy(pxy.file)
+        selected = [getpath.canonicalPath(pxy.file) for pxy in library.getSelection()]
+        for mhclofile in clothes:
+            if mhclofile not in selected:
+                library.selectProxy(mhclofile)
+
+        human.applyAllTargets()
+
+    def produce(self, spec):
+        """
+        Apply a spec and export the resulting character to spec['path'].
+        Errors are reported in the returned ProductionResult.
+        """
+        startTime = time.time()
+        try:
+            self.applySpec(spec)
+            self.app.export(spec['path'], **self.exportOptions)
+            error = None
+        except Exception:
+            error = traceback.format_exc()
+        return ProductionResult(spec.get('index'), spec['path'], error, time.time() - startTime)
+
+
+# Worker of the current pool process
+_worker = None
+_workerError = None
+
+def _initWorker(baseModel, exportOptions):
+    global _worker, _workerError
+    import numpy
+    numpy.seterr(all = 'ignore')
+    try:
+        _worker = ProductionWorker(baseModel, exportOptions)
+    except Exception:
+        # Raising here would make the pool restart the process indefinitely,
+        # report the error for every character instead
+        _workerError = traceback.format_exc()
+
+def _produce(spec):
+    if _worker is None:
+        return ProductionResult(spec.get('index'), spec['path'], _workerError)
+    return _worker.produce(spec)
+
+
+class MassProducer(object):
+    """
+    Produces batches of characters in parallel, in a pool of worker processes
+    that each load the base model once.
+    Worker processes are started with the spawn method, so that they do not
+    inherit the state (and G.app) of the calling application.
+    """
+
+    def __init__(self, baseModel = None, processes = None, exportOptions = None):
+        self.baseModel = os.path.abspath(baseModel) if baseModel else None
+        self.processes = processes or multiprocessing.cpu_count()
+        self.exportOptions = exportOptions or {}
+
+    def produce(self, specs, callback = None):
+        """
+        Produce the characters described by the list of specs. Returns a
+        generator of ProductionResults, which are yielded in order of
+        completion as soon as a worker finishes a character. If specified,
+        callback(result, completedCount, totalCount) is called for every
+        result as well.
+        """
+        specs = list(specs)
+        for index, spec in enumerate(specs):
+            spec.setdefault('index', index)
+        if not specs:
+            return
+
+        processes = min(self.processes, len(specs))
+        log.message("Producing %s characters in %s processes", len(specs), processes)
+        context = multiprocessing.get_context('spawn')
+        pool = context.Pool(processes, _initWorker, (self.baseModel, self.exportOptions))
+        try:
+            for completed, result in enumerate(pool.imap_unordered(_produce, specs), 1):
+                if result.succeeded:
+                    log.debug("Produced %s in %.2f seconds", result.path, result.duration)
+                else:
+                    log.error("Failed to produce %s:\n%s", result.path, result.error)
+                if callback:
+                    callback(result, completed, len(specs))
+                yield result
+        finally:
+            pool.terminate()
+            pool.join()
@@ -241,7 +241,8 @@ class MHApplication(gui3d.Application, mh.Application):
                 'useNameTags': False,
                 'tagCount': 5,
                 'makehumanTags': ['makehuman™'],
-                'keepCustomValues': False
+                'keepCustomValues': False,
+                'parallelSkinning': False
             }
         else:
 
@@ -278,6 +279,7 @@ class MHApplication(gui3d.Application, mh.Application):
                 'tagCount': 5,
                 'makehumanTags': ['makehuman™'],
                 'keepCustomValues': False,
+                'parallelSkinning': False,
                 '_versionSentinel': 'B26472743DC5DCE1721ADB5A91AAECAA' # GM Time was: Thu, Jun 25 2020 22:30:01 +0000
             }
 
@@ -412,6 +414,7 @@ class MHApplication(gui3d.Application, mh.Application):
         # Set a lower than default MAX_FACES value because we know the human has a good topology (will make it a little faster)
         # (we do not lower the global limit because that would limit the selection of meshes that MH would accept too much)
         self.selectedHuman = self.addObject(human.Human(files3d.loadMesh(mh.getSysDataPath("3dobjs/base.obj"), maxFaces = 5)))
+        self.selectedHuman.parallelSkinning = self.getSetting('parallelSkinning')
 
         # Set the base skeleton
         base_skel = skeleton.load(mh.getSysDataPath('rigs/default.mhskel'), self.selectedHuman.meshData)
@@ -371,82 +371,60 @@ class Object3D(object):
     def calcVertexTangents(self, ix = None):
         """
         Calculate vertex tangents using Lengyel’s Method.
+        Like face normals, the tangent directions of the faces are calculated
+        from their first 3 verts. Requires vertex normals to be calculated first.
         """
         if not self.has_uv:
             return
         self.markCoords(ix, norm=True)
         if ix is None:
             ix = np.s_[:]
-            xLen = self.getVertexCount()
-            f_ix = np.s_[:]
-        else:
-            xLen = len(ix)
-            f_ix = np.unique(self.vface[ix])
 
         # This implementation is based on
         # http://www.terathon.com/code/tangent.html
 
-        tan = np.zeros((xLen, 2, 3), dtype=np.float32)
-
-        fvert = self.coord[self.fvert[f_ix]]
-        v1 = fvert[:,0,:]
-        v2 = fvert[:,1,:]
-        v3 = fvert[:,2,:]
-
-        x1 = v2[:,0] - v1[:,0]
-        x2 = v3[:,0] - v1[:,0]
-        y1 = v2[:,1] - v1[:,1]
-        y2 = v3[:,1] - v1[:,1]
-        z1 = v2[:,2] - v1[:,2]
-        z2 = v3[:,2] - v1[:,2]
-
-        fuv = self.texco[self.fuvs[f_ix]]
-        w1 = fuv[:,0,:]
-        w2 = fuv[:,1,:]
-        w3 = fuv[:,2,:]
-
-        s1 = w2[:,0] - w1[:,0]
-        s2 = w3[:,0] - w1[:,0]
-        t1 = w2[:,1] - w1[:,1]
-        t2 = w3[:,1] = w1[:,1]
-
-        # Prevent NANs because of borked up UV coordinates  # TODO perhaps remove this
-        s1[np.argwhere(np.equal(s1, 0.0))] = 0.0000001
-        s2[np.argwhere(np.equal(s2, 0.0))] = 0.0000001
-        t1[np.argwhere(np.equal(t1, 0.0))] = 0.0000001
-        t2[np.argwhere(np.equal(t2, 0.0))] = 0.0000001
-
-        r = np.repeat(1.0, len(s1)) / ( (s1 * t2) - (s2 * t1) )
-        sdir = np.zeros((self.getFaceCount(),3), dtype=np.float32)
-        tdir = np.zeros((self.getFaceCount(),3), dtype=np.float32)
-        sdir[f_ix] = np.column_stack( [ ( (t2 * x1) - (t1 * x2) ) * r,
-                                        ( (t2 * y1) - (t1 * y2) ) * r,
-                                        ( (t2 * z1) - (t1 * z2) ) * r  ] )
-        tdir[f_ix] = np.column_stack( [ ( (s1 * x2) - (s2 * x1) ) * r,
-                                        ( (s1 * y2) - (s2 * y1) ) * r,
-                                        ( (s1 * z2) - (s2 * z1) ) * r  ] )
-
-        tan[:,0] = np.sum(sdir[self.vface[ix]])
-        tan[:,1] = np.sum(tdir[self.vface[ix]])
-
-        # Gramm-Schmidt orthogonalize
-        dotP = dot_v3(self.vnorm[ix], tan[:,0] )
-        # Duplicate dot product value in 3 columns because scalar * (n x 3)
-        # does not work
-        dotP = np.tile(dotP, (3,1)).transpose().reshape(len(tan),3)
-        self.vtang[ix,:3] = tan[:,0] - dotP * self.vnorm[ix]
+        # Mask that filters out unused slots for faces connected to a vert
+        valid = np.arange(self.MAX_FACES)[None,:] < self.nfaces[ix][:,None]
+        vface = self.vface[ix]
+        if isinstance(ix, slice):
+            f_ix = np.s_[:]
+        else:
+            # Only calculate the faces connected to the verts, and index them locally
+            f_ix = np.unique(vface[valid])
+            vface = np.searchsorted(f_ix, vface)
+            vface[~valid] = 0
+
+        fvert = self.coord[self.fvert[f_ix,:3]]
+        fuv = self.texco[self.fuvs[f_ix,:3]]
+        dv1 = fvert[:,1] - fvert[:,0]
+        dv2 = fvert[:,2] - fvert[:,0]
+        duv1 = fuv[:,1] - fuv[:,0]
+        duv2 = fuv[:,2] - fuv[:,0]
+        del fvert, fuv
+
+        # Faces with degenerate UVs do not contribute to the tangents
+        r = (duv1[:,0] * duv2[:,1]) - (duv2[:,0] * duv1[:,1])
+        nonzero = r != 0
+        r[nonzero] = 1.0 / r[nonzero]
+        fdir = np.empty((len(r), 6), dtype=np.float32)
+        fdir[:,:3] = ((dv1 * duv2[:,1,None]) - (dv2 * duv1[:,1,None])) * r[:,None]  # sdir
+        fdir[:,3:] = ((dv2 * duv1[:,0,None]) - (dv1 * duv2[:,0,None])) * r[:,None]  # tdir
+
+        # Sum the face directions per vertex
+        vdir = np.einsum('ij,ijk->ik', valid.astype(np.float32), np.take(fdir, vface, axis=0))
+        tan = vdir[:,:3]
+        bitan = vdir[:,3:]
+        del fdir, valid
+
+        # Gram-Schmidt orthogonalize
+        norms = self.vnorm[ix]
+        tan -= dot_v3(norms, tan)[:,None] * norms
         # Normalize
-        self.vtang[ix,:3] /= np.sqrt(np.sum(self.vtang[ix,:3] ** 2, axis=-1))[:,None]
+        tan /= np.sqrt(np.sum(tan ** 2, axis=-1))[:,None]
+        self.vtang[ix,:3] = tan
 
         # Determine Handedness as w parameter
-        self.vtang[ix, 3] = 1.0
-        indx = np.argwhere(np.less(dot_v3( \
-                                     np.cross( \
-                                           self.vnorm[ix], \
-                                           tan[:,0]), \
-                                     tan[:,1]), \
-                                   0.0))
-        self.vtang[ix,3][indx] = -1.0
+        self.vtang[ix,3] = np.where(dot_v3(np.cross(norms, tan), bitan) < 0.0, -1.0, 1.0)
 
     def getObject(self):
         if self.__object:
@@ -512,6 +490,8 @@ class Object3D(object):
 
         self._inverse_vmap = None   # Cached inverse of vmap: maps original welded vert idx (coord) to one or multiple unwelded vert idxs (r_coord)
 
+        self._normalsCoord = None   # Copy of coord at the last normals calculation, used to find the normals that need updating
+
         # Unwelded vertex buffers used by OpenGL
         if hasattr(self, 'r_coord'): del self.r_coord
         if hasattr(self, 'r_texco'): del self.r_texco
@@ -530,6 +510,7 @@ class Object3D(object):
         self.nfaces = np.zeros(nverts, dtype=np.uint8)
 
         self.orig_coord = self.coord.copy() # Keep a copy of the original coordinates
+        self._normalsCoord = None
 
         self.ucoor = True
         self.unorm = True
@@ -598,6 +579,7 @@ class Object3D(object):
     def setUVs(self, uvs):
         self.texco = np.asarray(uvs, dtype=np.float32)
         self.utexc = True
+        self.invalidateNormals()  # Tangents depend on UVs
 
     def getUVCount(self):
         return len(self.texco)
@@ -612,6 +594,7 @@ class Object3D(object):
             indices = indices[0]
 
         ntexco = len(self.texco)
+        self.invalidateNormals()  # Tangents depend on UVs
 
         if indices is None:
             self.utexc = True
@@ -645,6 +628,7 @@ class Object3D(object):
                 self.group[...] = groups
 
         self.has_uv = uvs is not None
+        self.invalidateNormals()
 
         if not skipUpdate:
             self._update_faces(resize=True)
@@ -683,17 +667,36 @@ class Object3D(object):
         The inverse of vmap: a mapping of original welded (relating to UVs) 
         vertex (coord indices) to a set of unwelded vertices that represent the 
         same coordinate (r_coord indices).
+        Stored as a tuple (offsets, indices): the unwelded vertices of original
+        vertex i are indices[offsets[i]:offsets[i+1]], in ascending order.
+        Use getUnweldedVerts() to look up multiple vertices at once.
         """
         if self._inverse_vmap is None:
-            # TODO this loop is quite slow and could benefit from numpy optimization
-            originalToUnweldedMap = {}
-            for unweldedIdx, originalIdx in enumerate(self.vmap):
-                if originalIdx not in originalToUnweldedMap:
-                    originalToUnweldedMap[originalIdx] = []
-                originalToUnweldedMap[originalIdx].append(unweldedIdx)
-            self._inverse_vmap = originalToUnweldedMap
+            nverts = len(self.coord)
+            counts = np.bincount(self.vmap, minlength=nverts)
+            offsets = np.zeros(nverts+1, dtype=np.intp)
+            np.cumsum(counts, out=offsets[1:])
+            indices = np.argsort(self.vmap, kind='stable').astype(np.uint32)
+            self._inverse_vmap = (offsets, indices)
         return self._inverse_vmap
 
+    def getUnweldedVerts(self, verts):
+        """
+        Gather the unwelded vertices (r_coord indices) of all specified original
+        vertices (coord indices) at once.
+        Returns a tuple (indices, counts), where counts contains the number of
+        unwelded vertices for each of the specified vertices. Per-vertex values
+        are mapped to the returned indices with np.repeat(values, counts).
+        """
+        offsets, indices = self.inverse_vmap
+        verts = np.asarray(verts, dtype=np.intp)
+        start = offsets[verts]
+        counts = offsets[verts+1] - start
+        # position of each result in indices: start of its vertex plus its rank
+        first = np.cumsum(counts) - counts
+        pos = np.arange(first[-1] + counts[-1] if len(counts) else 0) + np.repeat(start - first, counts)
+        return indices[pos], counts
+
     def _update_faces(self, resize = False):
         # 
         # this procedure is only called, when geometry is not taken from npz-file
@@ -704,19 +707,27 @@ class Object3D(object):
         # use self.nfaces as counter for the inner array, it is needed afterwards
 
         nverts = len(self.coord)
-        self.nfaces = np.zeros(nverts, dtype=np.uint8) # reset the counters to zero
-
-        for idx, vert in enumerate(self.fvert):                             # contains faces with vertex number
-            for i in range (0, min(len(vert), self.vertsPerFaceForExport)): # use minimum of attached vertices, works for less than 3 also
-                vn = vert[i]                                                 # vertex.number
-                if self.nfaces[vn] >= self.MAX_FACES:
-                    log.error("Failed to index faces of mesh %s, you are probably loading a mesh with mixed nb of verts per face (do not mix tris and quads). Or your mesh has too many faces attached to one vertex (the maximum is %s-poles). In the second case, either increase MAX_FACES for this mesh, or improve the mesh topology.", self.name, self.MAX_FACES)
-                    raise RuntimeError('Incompatible mesh topology.')
-                    return
-                self.vface[vn,self.nfaces[vn]] = idx        # add the index of the face to the array, row given by vn, column by counter nfaces[vn]
-                self.nfaces[vn] +=1                         # now increment the counter
-
-        imax = i+1    # just needed later not to be recalculated.
+        self.invalidateNormals()
+        imax = min(self.fvert.shape[1], self.vertsPerFaceForExport)   # use minimum of attached vertices, works for less than 3 also
+
+        # flatten the (face, vertex) references and sort them by vertex, a stable sort
+        # keeps the faces of each vertex in ascending order
+        verts = self.fvert[:,:imax].ravel()
+        order = np.argsort(verts, kind='stable')
+        verts = verts[order]
+        faces = (order // imax).astype(np.uint32)
+        del order
+
+        counts = np.bincount(verts, minlength=nverts)
+        if len(counts) and counts.max() > self.MAX_FACES:
+            log.error("Failed to index faces of mesh %s, you are probably loading a mesh with mixed nb of verts per face (do not mix tris and quads). Or your mesh has too many faces attached to one vertex (the maximum is %s-poles). In the second case, either increase MAX_FACES for this mesh, or improve the mesh topology.", self.name, self.MAX_FACES)
+            raise RuntimeError('Incompatible mesh topology.')
+
+        # column of each reference is its rank within the group of its vertex
+        first = np.cumsum(counts) - counts
+        column = np.arange(len(verts)) - np.repeat(first, counts)
+        self.vface[verts, column] = faces           # row given by vertex number, column by counter
+        self.nfaces = counts.astype(np.uint8)
 
         # in case this function is not called from catmull-clark function resize the self.vface to a minimum
         if resize is True:
@@ -728,31 +739,22 @@ class Object3D(object):
             # unfortunately catmull-clark expects maxpoles and not maxfaces, so we need 
             # also to calculate max-poles
             # 
-            # for each vertex we have to check all attached faces, these faces are already collected in self.vface
-            #       when we check all the faces we will collect the neighbors using a modulo function, the vertices are
-            #       entered clockwise ... modulo allows us to use neighbor of 1 and 3 when index is 0
-            #       if not already existent, the neighbors are added to an array and the maximum size of this array will be maxpole
-            #
-            maxpole = 0
-            for vn, row in enumerate(self.vface):
-                noticed = np.zeros(self.MAX_FACES * 4, dtype = int)
-                m = 0
-                for j in range (0, self.nfaces[vn]):
-                    # collect neighbors
-                    face = row[j]
-                    for ix,v2 in enumerate(self.fvert[face]):
-                        if (v2 == vn):
-                            ln = self.fvert[face][(ix-1) %imax]
-                            rn = self.fvert[face][(ix+1) %imax]
-                            if ln not in noticed:
-                                noticed[m] = ln
-                                m += 1
-                            if rn not in noticed:
-                                noticed[m] = rn
-                                m += 1
-                            break
-                if m > maxpole:
-                    maxpole = m
+            # the vertices of a face are entered clockwise, so the neighbors of a vertex in a face
+            #       are the previous and the next vertex (modulo allows us to use neighbor of 1 and 3 when index is 0).
+            #       The number of distinct neighbors over all attached faces is the pole count of the vertex.
+            #       As the faces are visited in one go, only use the first occurrence of a vertex in each face.
+            fvert = self.fvert[:,:imax].astype(np.int64)
+            firstOccurrence = np.ones(fvert.shape, dtype=bool)
+            for ix in range(1, imax):
+                firstOccurrence[:,ix] = np.all(fvert[:,:ix] != fvert[:,ix:ix+1], axis=1)
+            verts = fvert[firstOccurrence]
+            ln = np.roll(fvert, 1, axis=1)[firstOccurrence]
+            rn = np.roll(fvert, -1, axis=1)[firstOccurrence]
+            del fvert, firstOccurrence
+
+            edges = np.unique(np.hstack((verts * nverts + ln, verts * nverts + rn)))
+            poles = np.bincount(edges // nverts)
+            maxpole = np.max(poles) if len(poles) else 0
 
             if maxpole > 2:                  # Avoid the information when function calculates internal objects not to confuse users
                 log.debug ("Calculated maximum number of poles for one vertex: %d", maxpole)
@@ -1201,7 +1203,15 @@ class Object3D(object):
         :type verticesToUpdate: list of :py:class:`module3d.Vert`
         :param facesToUpdate: The list of faces to be updated, if None all faces are updated.
         :type facesToUpdate: list of :py:class:`module3d.Face`
+
+        If neither vertices nor faces are specified, only the normals of the
+        faces and vertices affected by coordinates that changed since the last
+        such call are updated.
         """
+        if recalcFaceNormals and recalcVertexNormals and verticesToUpdate is None and facesToUpdate is None:
+            verticesToUpdate, facesToUpdate = self._getNormalsUpdateRegion()
+            if verticesToUpdate is not None and len(verticesToUpdate) == 0:
+                return
 
         if recalcFaceNormals:
             self.calcFaceNormals(facesToUpdate)
@@ -1212,6 +1222,38 @@ class Object3D(object):
         if recalcFaceNormals or recalcVertexNormals and self.calculateTangents:
             self.calcVertexTangents(verticesToUpdate)
                 
+    def _getNormalsUpdateRegion(self):
+        """
+        Determine the vertices and faces whose normals are affected by the
+        coordinates that changed since normals were last calculated with
+        calcNormals() for the whole mesh.
+        Returns (vertices, faces), or (None, None) if all normals need to be
+        recalculated.
+        """
+        coord = self._normalsCoord
+        if coord is None or coord.shape != self.coord.shape:
+            self._normalsCoord = self.coord.copy()
+            return None, None
+
+        changed = np.flatnonzero(np.any(coord != self.coord, axis=1))
+        if len(changed) > len(coord) // 2:
+            # Updating a large part of the mesh is faster without indexing
+            coord[...] = self.coord
+            return None, None
+        coord[changed] = self.coord[changed]
+
+        faces = self.getFacesForVertices(changed)
+        verts = np.unique(self.fvert[faces])
+        return verts, faces
+
+    def invalidateNormals(self):
+        """
+        Make the next calcNormals() call recalculate the normals of the whole
+        mesh. Call this after modifying the normals, faces or UVs of this mesh
+        directly.
+        """
+        self._normalsCoord = None
+
     def calcBBox(self, ix=None, onlyVisible = True, fixedFaceMask = None):
         """
         Calculates the axis aligned bounding box of this object in the object's coordinate system. 
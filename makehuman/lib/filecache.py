@@ -35,39 +35,267 @@ File properties cache
 Abstract
 --------
 
-A generic cache for storing metadata for files
+A generic cache for storing metadata for files.
+
+The metadata of all caches is stored in one persistent asset index, an SQLite
+database in the cache folder. Besides the metadata itself, the index stores
+the name, uuid and tags of every file, so that libraries can query them, and
+the modification time of every scanned folder. Updating a cache only lists
+the folders that were modified since they were last scanned, as adding,
+removing or renaming a file changes the modification time of its folder.
+Files that are modified in place are picked up when their metadata is
+retrieved.
 """
 
 import os
+import time
+import json
+import sqlite3
+import threading
+import contextlib
 import getpath
 import log
 import pickle as pickle
 
 CACHE_FORMAT_VERSION = 1  # You can use any type, strings or ints, only equality test is done on these
 
+INDEX_FORMAT_VERSION = 2
+INDEX_FILE = 'assetindex.db'
+
+# Folders modified less than this amount of seconds before they were scanned
+# are scanned again next time, changes within the resolution of the file system
+# timestamps would otherwise go unnoticed
+FOLDER_MTIME_MARGIN = 2.0
+
+_INDEX_SCHEMA = [
+    "DROP TABLE IF EXISTS caches",
+    "DROP TABLE IF EXISTS folders",
+    "DROP TABLE IF EXISTS files",
+    "DROP TABLE IF EXISTS tags",
+    "CREATE TABLE caches (cache TEXT PRIMARY KEY, version TEXT)",
+    "CREATE TABLE folders (cache TEXT, path TEXT, mtime REAL, subfolders TEXT, PRIMARY KEY (cache, path))",
+    "CREATE TABLE files (cache TEXT, path TEXT, folder TEXT, mtime REAL, name TEXT, uuid TEXT, metadata BLOB, PRIMARY KEY (cache, path))",
+    "CREATE TABLE tags (cache TEXT, path TEXT, tag TEXT)",
+    "CREATE INDEX tags_by_file ON tags (cache, path)",
+    "CREATE INDEX tags_by_tag ON tags (cache, tag)",
+    "CREATE INDEX files_by_uuid ON files (cache, uuid)"
+]
+
+
+class AssetIndex(object):
+    """
+    Persistent index of asset file metadata, shared by all file caches (and
+    by all MakeHuman processes, for example the worker processes of mass
+    produce). Entries are stored per cache, keyed by canonical path.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._connection = None
+        self._lock = threading.RLock()
+
+    def _connect(self):
+        if self._connection is not None:
+            return self._connection
+        try:
+            folder = os.path.dirname(self.filepath)
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            self._connection = self._open(self.filepath)
+        except (sqlite3.Error, OSError):
+            log.warning("Failed to open asset index %s, metadata will not be stored.", self.filepath, exc_info=True)
+            self._connection = self._open(':memory:')
+        return self._connection
+
+    def _open(self, filepath):
+        connection = sqlite3.connect(filepath, timeout=30, isolation_level=None, check_same_thread=False)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.Error:
+            pass
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if connection.execute("PRAGMA user_version").fetchone()[0] != INDEX_FORMAT_VERSION:
+                log.debug("Creating new asset index %s", filepath)
+                for statement in _INDEX_SCHEMA:
+                    connection.execute(statement)
+                connection.execute("PRAGMA user_version = %d" % INDEX_FORMAT_VERSION)
+        except:
+            connection.execute("ROLLBACK")
+            connection.close()
+            raise
+        connection.execute("COMMIT")
+        return connection
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def load(self, cache, version):
+        """
+        Load the entries of a cache. Returns a dict with per canonical path
+        (folder, mtime, metadata) of the indexed files, and a dict with per
+        folder (mtime, subfolders). Entries stored with a different version
+        are dropped.
+        """
+        version = repr(version)
+        files = dict()
+        folders = dict()
+        with self._transaction() as db:
+            row = db.execute("SELECT version FROM caches WHERE cache = ?", (cache,)).fetchone()
+            if row is None or row[0] != version:
+                if row is not None:
+                    log.message("File cache %s has a different version (%s) than expected (%s), dropping it.", cache, row[0], version)
+                for table in ['files', 'tags', 'folders']:
+                    db.execute("DELETE FROM %s WHERE cache = ?" % table, (cache,))
+                db.execute("INSERT OR REPLACE INTO caches VALUES (?, ?)", (cache, version))
+                return files, folders
+
+            for path, folder, mtime, metadata in db.execute("SELECT path, folder, mtime, metadata FROM files WHERE cache = ?", (cache,)):
+                try:
+                    files[path] = (folder, mtime, pickle.loads(metadata))
+                except Exception:
+                    log.debug("Failed to load metadata of %s from asset index", path, exc_info=True)
+            for path, mtime, subfolders in db.execute("SELECT path, mtime, subfolders FROM folders WHERE cache = ?", (cache,)):
+                folders[path] = (mtime, json.loads(subfolders))
+        return files, folders
+
+    def store(self, cache, files, removedFiles, folders, removedFolders):
+        """
+        Store changes to the entries of a cache. files is a list of
+        (path, folder, mtime, name, uuid, tags, metadata) and folders a list of
+        (path, mtime, subfolders) tuples.
+        """
+        with self._transaction() as db:
+            paths = [(cache, path) for path in removedFiles] + [(cache, f[0]) for f in files]
+            db.executemany("DELETE FROM tags WHERE cache = ? AND path = ?", paths)
+            db.executemany("DELETE FROM files WHERE cache = ? AND path = ?", [(cache, path) for path in removedFiles])
+            db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           [(cache, path, folder, mtime, name, uuid, sqlite3.Binary(pickle.dumps(metadata, protocol=2)))
+                            for (path, folder, mtime, name, uuid, tags, metadata) in files])
+            db.executemany("INSERT INTO tags VALUES (?, ?, ?)",
+                           [(cache, f[0], tag) for f in files for tag in f[5]])
+            db.executemany("DELETE FROM folders WHERE cache = ? AND path = ?", [(cache, path) for path in removedFolders])
+            db.executemany("INSERT OR REPLACE INTO folders VALUES (?, ?, ?, ?)",
+                           [(cache, path, mtime, json.dumps(subfolders)) for (path, mtime, subfolders) in folders])
+
+    def getAllTags(self, cache):
+        with self._lock:
+            return set(row[0] for row in self._connect().execute("SELECT DISTINCT tag FROM tags WHERE cache = ?", (cache,)))
+
+    def getUuids(self, cache):
+        with self._lock:
+            return self._connect().execute("SELECT uuid, path FROM files WHERE cache = ? AND uuid IS NOT NULL ORDER BY path", (cache,)).fetchall()
+
+
+_assetIndex = None
+
+def getAssetIndex():
+    """The asset index shared by all file caches of this process."""
+    global _assetIndex
+    if _assetIndex is None:
+        _assetIndex = AssetIndex(getpath.getPath(os.path.join('cache', INDEX_FILE)))
+    return _assetIndex
+
 
 class FileCache(object):
-    def __init__(self, filepath, version=None):
-        """Create an empty filecache
+    def __init__(self, filepath, version=None, index=None):
+        """Create a filecache, with the entries stored in the asset index.
+        The entries are stored under the name of the specified cache file.
         """
         if version is None:
             self.version = CACHE_FORMAT_VERSION
         else:
             self.version = version
         self.filepath = filepath
+        self.name = os.path.splitext(os.path.basename(filepath))[0]
+        self.index = getAssetIndex() if index is None else index
 
         self._cache = dict()
+        self._fileFolders = dict()  # Per canonical filename the folder in which it was found
+        self._folderFiles = dict()  # Per folder the set of canonical filenames found in it
+        self._folders = dict()      # Per folder the (mtime, subfolders) with which it was last scanned
+
+        # Entries that were changed since they were last stored in the index
+        self._changedFiles = set()
+        self._changedFolders = set()
 
         self.get_metadata_filename = None
+        self.describe_metadata = None
 
-    def __getstate__(self):
-        """Return state values to be pickled."""
-        return {'version': self.version, '_cache': self._cache}
+        try:
+            files, self._folders = self.index.load(self.name, self.version)
+        except sqlite3.Error:
+            log.warning("Failed to load file cache %s from asset index", self.name, exc_info=True)
+            files = dict()
+        for fileId, (folder, mtime, metadata) in files.items():
+            self._setEntry(fileId, folder, (mtime,) + metadata)
+        self._changedFiles.clear()
 
     def save(self):
-        """Save filecache to file"""
-        with open(self.filepath, "wb") as f:
-            pickle.dump(self, f, protocol=2)
+        """Store changed entries in the asset index"""
+        if not self._changedFiles and not self._changedFolders:
+            return
+
+        files = []
+        removedFiles = []
+        for fileId in self._changedFiles:
+            if fileId in self._cache:
+                files.append(self._describeEntry(fileId))
+            else:
+                removedFiles.append(fileId)
+        folders = []
+        removedFolders = []
+        for folder in self._changedFolders:
+            if folder in self._folders:
+                mtime, subfolders = self._folders[folder]
+                folders.append((folder, mtime, subfolders))
+            else:
+                removedFolders.append(folder)
+
+        try:
+            self.index.store(self.name, files, removedFiles, folders, removedFolders)
+        except sqlite3.Error as e:
+            log.warning("Failed to store file cache %s in asset index: %s", self.name, e)
+            return
+        self._changedFiles.clear()
+        self._changedFolders.clear()
+
+    def _describeEntry(self, fileId):
+        values = self._cache[fileId]
+        name, uuid, tags = None, None, None
+        if self.describe_metadata is not None and len(values) > 1:
+            name, uuid, tags = self.describe_metadata(values[1:])
+        return (fileId, self._fileFolders[fileId], values[0],
+                None if name is None else str(name),
+                None if uuid is None else str(uuid),
+                set(tags or []), values[1:])
+
+    def _setEntry(self, fileId, folder, values):
+        previousFolder = self._fileFolders.get(fileId)
+        if previousFolder is not None and previousFolder != folder:
+            self._folderFiles[previousFolder].discard(fileId)
+        self._cache[fileId] = values
+        self._fileFolders[fileId] = folder
+        self._folderFiles.setdefault(folder, set()).add(fileId)
+        self._changedFiles.add(fileId)
+
+    def _removeEntry(self, fileId):
+        del self._cache[fileId]
+        self._folderFiles[self._fileFolders.pop(fileId)].discard(fileId)
+        self._changedFiles.add(fileId)
+
+    def _removeFolder(self, folder):
+        del self._folders[folder]
+        self._changedFolders.add(folder)
 
     def getMetadata(self, filename):
         """Retrieve a metadata entry from this cache"""
@@ -76,14 +304,23 @@ class FileCache(object):
 
     def cleanup(self):
         """
-        Remove non-existing entries from this cache
+        Remove non-existing entries from this cache.
+        Only folders that were modified since they were last scanned can have
+        lost files.
         """
-        for fileId in self._cache.keys():
-            if not os.path.exists(fileId):
-                try:
-                    del self._cache[fileId]
-                except:
-                    pass
+        for folder, (mtime, _) in list(self._folders.items()):
+            try:
+                if os.path.getmtime(folder) == mtime:
+                    continue
+            except OSError:
+                self._removeFolder(folder)
+            for fileId in list(self._folderFiles.get(folder, [])):
+                if not os.path.exists(fileId):
+                    self._removeEntry(fileId)
+        for fileId in list(self._cache.keys()):
+            if self._fileFolders[fileId] not in self._folders and not os.path.exists(fileId):
+                self._removeEntry(fileId)
+        self.save()
 
     def getMetadataFile(self, filename):
         if self.get_metadata_filename is None:
@@ -91,77 +328,219 @@ class FileCache(object):
         else:
             return self.get_metadata_filename(filename)
 
+    def _getOverridingFile(self, filepath, fileExts, mtime=None):
+        """
+        Overriding happens if a file with lesser precedence has a more recent
+        modification time. fileExts are expected to be passed in reverse order
+        """
+        if mtime is None:
+            mtime = os.path.getmtime(self.getMetadataFile(filepath))
+
+        fileExt = os.path.splitext(filepath)[1][1:].lower()
+        i = fileExts.index(fileExt)
+        if i != 0:
+            for altExt in fileExts[:i]:
+                overridepath = os.path.splitext(filepath)[0] + "." + altExt
+                if os.path.isfile(overridepath):
+                    mtime_ = os.path.getmtime(self.getMetadataFile(overridepath))
+                    if mtime_ > mtime:
+                        return (overridepath, mtime_)
+        return None
+
+    def _scanFolder(self, folder, fileExts, getMetadata, scanTime):
+        """
+        List a folder and update the entries of the files in it. Returns the
+        subfolders and the canonical filenames of the files found.
+        Of files with the same name, but a different extension, only the one
+        whose extension occurs first in fileExts is kept.
+        """
+        mtime = os.path.getmtime(folder)
+        subfolders = []
+        discovered = dict()
+        for entry in os.scandir(folder):
+            try:
+                isdir = entry.is_dir()
+            except OSError:
+                isdir = False
+            if isdir:
+                if not entry.is_symlink():
+                    subfolders.append(getpath.formatPath(entry.path))
+                continue
+            basep, ext = os.path.splitext(entry.name)
+            ext = ext[1:].lower()
+            if ext in fileExts:
+                i = fileExts.index(ext)
+                if basep not in discovered or i < discovered[basep][0]:
+                    discovered[basep] = (i, entry)
+
+        found = set()
+        reversedExts = list(reversed(fileExts))
+        for (_, entry) in discovered.values():
+            filepath = getpath.pathToUnicode(entry.path)
+            # The folder is canonical, so are the paths of files that are not links
+            if entry.is_symlink():
+                fileId = getpath.canonicalPath(filepath)
+            else:
+                fileId = getpath.formatPath(filepath)
+            try:
+                mtime_ = os.path.getmtime(self.getMetadataFile(filepath))
+                overridepath = self._getOverridingFile(filepath, reversedExts, mtime_)
+            except OSError:
+                continue
+            if overridepath is not None:
+                filepath, mtime_ = overridepath
+
+            found.add(fileId)
+            if fileId in self._cache and self._fileFolders[fileId] == folder:
+                cached_mtime = self._cache[fileId][0]
+                if not (mtime_ > cached_mtime):
+                    continue
+
+            try:
+                metadata = getMetadata(filepath)
+            except Exception as e:
+                # Keep listing the file, with empty metadata, it is parsed
+                # again once it is modified
+                log.error('Failed to parse metadata for file %s: %s', filepath, e)
+                metadata = ()
+            self._setEntry(fileId, folder, (mtime_,) + metadata)
+
+        for fileId in list(self._folderFiles.get(folder, [])):
+            if fileId not in found:
+                self._removeEntry(fileId)
+
+        if mtime > scanTime - FOLDER_MTIME_MARGIN:
+            mtime = None
+        self._folders[folder] = (mtime, subfolders)
+        self._changedFolders.add(folder)
+        return subfolders, found
+
     def update(self, paths, fileExts, getMetadata, removeOldEntries=True):
         """
         Update this cache of files in the specified paths.
         This cache contains per canonical filename (key) metadata of that file.
         The contents of this metadata, and how it is parsed from file is completely 
         customizable.
-        Cache entries are invalidated if their modification time has changed, or no
-        longer exist on disk.
+        Only folders that were modified since they were last scanned are
+        listed, entries are invalidated if their modification time has changed,
+        or no longer exist on disk.
         Requires passing a method getMetadata(filename) that retrieves metadata to
         be stored in the cache from specified file, that should return a tuple.
         """
-
-        def _getOverridingFile(filepath, fileExts, mtime=None):
-            """
-            Overriding happens if a file with lesser precedence has a more recent
-            modification time. fileExts are expected to be passed in reverse order
-            """
-            if mtime is None:
-                mtime = os.path.getmtime(self.getMetadataFile(filepath))
-
-            fileExt = os.path.splitext(filepath)[1][1:].lower()
-            i = fileExts.index(fileExt)
-            if i != 0:
-                for altExt in fileExts[:i]:
-                    overridepath = os.path.splitext(filepath)[0] + "." + altExt
-                    if os.path.isfile(overridepath):
-                        mtime_ = os.path.getmtime(self.getMetadataFile(overridepath))
-                        if mtime_ > mtime:
-                            return (overridepath, mtime_)
-            return None
-
         if not isinstance(paths, list):
             paths = [ paths ]
         if not isinstance(fileExts, list):
             fileExts = [ fileExts ]
         fileExts = [f[1:].lower() if f.startswith('.') else f.lower() for f in fileExts]
 
-        files = []
-        oldEntries = dict((key, True) for key in list(self._cache.keys())) # lookup dict for old entries in cache
-        for folder in paths:
-            files.extend(getpath.search(folder, fileExts, recursive=True, mutexExtensions=True))
-        for filepath in files:
-            fileId = getpath.canonicalPath(filepath)
-            mtime = os.path.getmtime(self.getMetadataFile(filepath))
-
-            overridepath = _getOverridingFile(filepath, list(reversed(fileExts)), mtime)
-            if overridepath is not None:
-                filepath, mtime = overridepath
-
-            if fileId in self._cache:
-                try: # Guard against doubles
-                    del oldEntries[fileId]    # Mark that old cache entry is still valid
-                except:
-                    pass
-                cached_mtime = self[fileId][0]
-                if not (mtime > cached_mtime):
-                    continue
+        scanTime = time.time()
+        foundFiles = set()
+        foundFolders = set()
+        folders = [getpath.canonicalPath(p) for p in reversed(paths) if os.path.isdir(p)]
+        while folders:
+            folder = folders.pop()
+            if folder in foundFolders:
+                continue
+            foundFolders.add(folder)
 
             try:
-                self._cache[fileId] = (mtime,) + getMetadata(filepath)
-            except Exception as e:
-                log.error('Error while parsing metadata for file ', str(e))
-                log.error('Failed to parse metadata for file ', filepath)
+                mtime = os.path.getmtime(folder)
+            except OSError:
+                continue
+            if folder in self._folders and self._folders[folder][0] == mtime:
+                subfolders = self._folders[folder][1]
+                files = self._folderFiles.get(folder, [])
+            else:
+                try:
+                    subfolders, files = self._scanFolder(folder, fileExts, getMetadata, scanTime)
+                except OSError:
+                    continue
+            foundFiles.update(files)
+            folders.extend(reversed(subfolders))
 
         if removeOldEntries:
             """Remove entries from cache that no longer exist"""
-            for key in list(oldEntries.keys()):
-                try:
-                    del self._cache[key]
-                except:
-                    pass
+            for fileId in list(self._cache.keys()):
+                if fileId not in foundFiles:
+                    self._removeEntry(fileId)
+            for folder in list(self._folders.keys()):
+                if folder not in foundFolders:
+                    self._removeFolder(folder)
+
+        self.save()
+
+    def refresh(self, filename, fileExts, getMetadata):
+        """
+        Update the entries of the files in the folder of the specified file,
+        also if the folder was not modified since it was last scanned.
+        """
+        if not isinstance(fileExts, list):
+            fileExts = [ fileExts ]
+        fileExts = [f[1:].lower() if f.startswith('.') else f.lower() for f in fileExts]
+        try:
+            self._scanFolder(os.path.dirname(getpath.canonicalPath(filename)), fileExts, getMetadata, time.time())
+        except OSError:
+            pass
+        self.save()
+
+    def getFiles(self, path):
+        """
+        Filenames of the cached files in the specified folder or its
+        subfolders, found by walking the scanned folders in the cache.
+        Filenames are joined to path like getpath.search() does, only files
+        that are links are returned by their canonical filename.
+        """
+        root = getpath.canonicalPath(path)
+        prefix = root.rstrip('/') + '/'
+        result = []
+        visited = set()
+        folders = [root]
+        while folders:
+            folder = folders.pop()
+            if folder in visited or folder not in self._folders:
+                continue
+            visited.add(folder)
+            for fileId in self._folderFiles.get(folder, []):
+                if fileId.startswith(prefix):
+                    relpath = fileId[len(prefix):].replace('/', os.sep)
+                    result.append(getpath.pathToUnicode(os.path.join(path, relpath)))
+                else:
+                    result.append(fileId)
+            folders.extend(self._folders[folder][1])
+        return result
+
+    def _queryIndex(self, method, *args):
+        """
+        Query the asset index, if it is in sync with this cache. Returns None
+        if the index cannot be queried.
+        """
+        if self._changedFiles or self._changedFolders:
+            self.save()
+        if self._changedFiles:
+            return None
+        try:
+            return method(self.name, *args)
+        except sqlite3.Error:
+            log.debug("Failed to query asset index", exc_info=True)
+            return None
+
+    def getAllTags(self):
+        """All tags of the files in this cache"""
+        result = self._queryIndex(self.index.getAllTags)
+        if result is None:
+            result = set()
+            for fileId in self._cache:
+                result.update(self._describeEntry(fileId)[5])
+        return result
+
+    def getUuids(self):
+        """List of (uuid, canonical filename) of the files in this cache that
+        have an uuid.
+        """
+        result = self._queryIndex(self.index.getUuids)
+        if result is None:
+            result = [(entry[4], entry[0]) for entry in map(self._describeEntry, sorted(self._cache.keys())) if entry[4] is not None]
+        return result
 
     def __getitem__(self, key):
         return self._cache[key]
@@ -193,6 +572,17 @@ class MetadataCacher(object):
     def _get_metadata_callback(self, filename):
         return self.getMetadataImpl(self.getMetadataFile(filename))
 
+    def _describe_metadata_callback(self, metadata):
+        """Name, uuid and tags of a metadata entry, as stored in the asset index.
+        """
+        result = []
+        for getter in [self.getNameFromMetadata, self.getUuidFromMetadata, self.getTagsFromMetadata]:
+            try:
+                result.append(getter(metadata))
+            except Exception:
+                result.append(None)
+        return tuple(result)
+
     def getMetadataFile(self, filename):
         """For a specified asset file, return the file that should be read for
         metadata. By default returns the same filename. Change this if the
@@ -223,6 +613,10 @@ class MetadataCacher(object):
         name, tags = metadata
         return name
 
+    def getUuidFromMetadata(self, metadata):
+        """Override this if the metadata contains an uuid."""
+        return None
+
     def getSearchPaths(self):
         """This method should be implemented by the library to return the paths
         that should be searched for updating the cache.
@@ -241,7 +635,7 @@ class MetadataCacher(object):
         fileId = getpath.canonicalPath(filename)
         if fileId not in self._filecache._cache:
             # Lazily update cache
-            self.updateFileCache(self.getSearchPaths() + [os.path.dirname(fileId)], self.getFileExtensions(), False)
+            self.refreshFileCache(fileId)
 
         if fileId in self._filecache:
             metadata = self._filecache[fileId]
@@ -251,11 +645,14 @@ class MetadataCacher(object):
 
                 if mtime < os.path.getmtime(self.getMetadataFile(fileId)):
                     # Queried file was updated, update stale cache
-                    self.updateFileCache(self.getSearchPaths() + [os.path.dirname(fileId)], self.getFileExtensions(), False)
+                    self.refreshFileCache(fileId)
                     metadata = self._filecache[fileId]
                     mtime = metadata[0]
                     metadata = metadata[1:]
 
+                if not metadata:
+                    # Parsing the metadata of this file failed
+                    return None
                 return metadata
         else:
             log.warning('Could not get metadata for file %s. Does not exist in cache.', filename)
@@ -279,10 +676,24 @@ class MetadataCacher(object):
             return ''
 
     def getAllTags(self):
-        result = set()
-        for (path, metadata) in list(self._filecache.items()):
-            tags = self.getTagsFromMetadata(metadata[1:])
-            result = result.union(tags)
+        return self._filecache.getAllTags()
+
+    def getFiles(self, paths=None):
+        """Return the files of this library in the specified folders (and their
+        subfolders), by default in the search paths, as getpath.search() would
+        find them, without walking the folders that did not change.
+        Updates the cache if needed.
+        """
+        if self._filecache is None:
+            self.loadCache()
+        if paths is None:
+            paths = self.getSearchPaths() or []
+        elif not isinstance(paths, list):
+            paths = [ paths ]
+        self.updateFileCache(paths, self.getFileExtensions(), False)
+        result = []
+        for path in paths:
+            result.extend(self._filecache.getFiles(path))
         return result
 
     def getFileExtensions(self):
@@ -302,6 +713,14 @@ class MetadataCacher(object):
             file_extensions=self.getFileExtensions()
         self._filecache.update(search_paths, file_extensions, self._get_metadata_callback, remove_old_entries)
 
+    def refreshFileCache(self, filename):
+        """
+        Update the cached metadata of the files in the folder of the specified
+        file. Use this when a file was modified or added after the cache was
+        last updated.
+        """
+        self._filecache.refresh(filename, self.getFileExtensions(), self._get_metadata_callback)
+
     def onUnload(self):
         """
         Called when this library taskview is being unloaded (usually when MH
@@ -315,38 +734,22 @@ class MetadataCacher(object):
             return
 
         self._filecache.cleanup()
-
-        cachedir = getpath.getPath('cache')
-        if not os.path.isdir(cachedir):
-            os.makedirs(cachedir)
         saveCache(self._filecache)
 
     def loadCache(self):
         filename = getpath.getPath(os.path.join('cache', self.cache_file))
         self._filecache = loadCache(filename, self.cache_format_version)
         self._filecache.get_metadata_filename = self.getMetadataFile
+        self._filecache.describe_metadata = self._describe_metadata_callback
 
 
 def saveCache(cache):
     cache.save()
 
 def loadCache(filepath, expected_version=None):
+    """Load the file cache with the name of the specified cache file from the
+    asset index.
+    """
     if expected_version is None:
         expected_version = CACHE_FORMAT_VERSION
-
-    try:
-        if os.path.isfile(filepath):
-            with open(filepath, "rb") as f:
-                result = pickle.load(f)
-            if result.version != expected_version:
-                log.message("File cache %s has a different version (%s) than expected (%s), dropping it." % (filepath, result.version, expected_version))
-                del result
-            else:
-                result.filepath = filepath
-                return result
-    except:
-        log.debug("Failed to load stored cache %s" % filepath, exc_info=True)
-    # Create new filecache
-    log.debug("Creating new file metadata cache %s" % filepath)
     return FileCache(filepath, expected_version)
-
@@ -45,6 +45,7 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 import qtgui as gui
 import mh
 import getpath
+import filecache
 import log
 from sorter import Sorter
 
@@ -563,10 +564,34 @@ class FileChooserBase(QtWidgets.QWidget, gui.Widget):
         return False
 
     def search(self):
+        library = self.getIndexedLibrary()
+        if library:
+            return library.getFiles(self.paths)
         return getpath.search(self.paths, self.extensions, 
                               recursive = not self.doNotRecurse, 
                               mutexExtensions = self.mutexExtensions)
 
+    def getIndexedLibrary(self):
+        """
+        The library of the load handler, if the files of this chooser can be
+        listed from its file metadata cache instead of searching the file system.
+        This requires the library to cache the same file extensions, which it
+        does recursively and mutually exclusive.
+        """
+        library = getattr(self.loadHandler, 'library', None)
+        if not isinstance(library, filecache.MetadataCacher) or self.doNotRecurse:
+            return None
+        libraryExtensions = library.getFileExtensions()
+        if not isinstance(libraryExtensions, list):
+            libraryExtensions = [ libraryExtensions ]
+        extensions = [e[1:].lower() if e.startswith('.') else e.lower() for e in self.extensions]
+        libraryExtensions = [e[1:].lower() if e.startswith('.') else e.lower() for e in libraryExtensions]
+        if extensions != libraryExtensions:
+            return None
+        if len(self.extensions) > 1 and not self.mutexExtensions:
+            return None
+        return library
+
     def clearList(self):
         for i in range(self.children.count()):
             child = self.children.itemAt(0)
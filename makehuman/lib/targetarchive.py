@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Memory-mapped compiled target archive.
+
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehumancommunity.org/
+
+**Github Code Home Page:**    https://github.com/makehumancommunity/
+
+**Authors:**           Glynn Clements, Jonas Hauquier
+
+**Copyright(c):**      MakeHuman Team 2001-2020
+
+**Licensing:**         AGPL3
+
+    This file is part of MakeHuman Community (www.makehumancommunity.org).
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+Abstract
+--------
+
+Reading and writing of the compiled targets archive (data/targets.bin).
+
+The archive is a single uncompressed file that is opened with np.memmap, so
+that loading a target costs no decompression and no copying: the index and
+vector arrays of a target are views into the mapped file. Vectors are stored
+as fixed-point int16 values (in units of 1e-3), the conversion to float is
+left to the user of the data (see algos3d.Target.apply).
+
+File layout (all values little-endian, all arrays aligned to ALIGNMENT bytes):
+
+  - header (HEADER_DTYPE)
+  - per target: uint16 vertex indices, int16 (n, 3) vectors, optional license
+  - target table (ENTRY_DTYPE), one record per target
+  - UTF-8 encoded target names, separated by newlines
+"""
+
+import os
+import numpy as np
+
+TARGETS_ARCHIVE_NAME = 'targets.bin'
+
+MAGIC = b'MHTA'
+VERSION = 1
+ALIGNMENT = 64
+
+# Fixed point scale of the stored vectors
+VECTOR_SCALE = 1e-3
+
+HEADER_DTYPE = np.dtype([('magic', 'S4'), ('version', '<u4'),
+                         ('count', '<u4'), ('reserved', '<u4'),
+                         ('table_offset', '<u8'),
+                         ('names_offset', '<u8'), ('names_size', '<u8'),
+                         ('lic_text_offset', '<u8'), ('lic_text_size', '<u8'),
+                         ('lic_index_offset', '<u8'), ('lic_index_count', '<u8')])
+
+ENTRY_DTYPE = np.dtype([('count', '<u8'),
+                        ('index_offset', '<u8'), ('vector_offset', '<u8'),
+                        ('lic_text_offset', '<u8'), ('lic_text_size', '<u8'),
+                        ('lic_index_offset', '<u8'), ('lic_index_count', '<u8')])
+
+INDEX_DTYPE = np.dtype('<u2')
+VECTOR_DTYPE = np.dtype('<i2')
+
+
+class TargetArchive(object):
+    """
+    Read-only, memory-mapped view on a compiled targets archive.
+    Targets are referenced by their path relative to the data folder, using
+    forward slashes (eg. 'targets/armslegs/r-foot-scale-incr.target').
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.dataPath = os.path.dirname(path)
+        self.mtime = os.path.getmtime(path)
+        self._map = np.memmap(path, dtype=np.uint8, mode='r')
+
+        header = self._map[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)[0]
+        if header['magic'] != MAGIC:
+            raise RuntimeError('Not a compiled targets archive: %s' % path)
+        if int(header['version']) != VERSION:
+            raise RuntimeError('Unsupported targets archive version %s: %s' % (header['version'], path))
+        self._header = header
+
+        count = int(header['count'])
+        offset = int(header['table_offset'])
+        self._table = self._map[offset:offset + count * ENTRY_DTYPE.itemsize].view(ENTRY_DTYPE)
+
+        offset = int(header['names_offset'])
+        names = bytes(self._map[offset:offset + int(header['names_size'])]).decode('utf-8')
+        names = names.split('\n') if count else []
+        self._entries = dict((name, i) for i, name in enumerate(names))
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def names(self):
+        return list(self._entries.keys())
+
+    def _entry(self, name):
+        return self._table[self._entries[name]]
+
+    def _array(self, offset, count, dtype):
+        offset = int(offset)
+        return self._map[offset:offset + int(count) * dtype.itemsize].view(dtype)
+
+    def getIndex(self, name):
+        """
+        Vertex indices of the named target, as a read-only view into the
+        mapped file.
+        """
+        entry = self._entry(name)
+        return self._array(entry['index_offset'], entry['count'], INDEX_DTYPE)
+
+    def getVector(self, name):
+        """
+        Fixed-point (int16) translation vectors of the named target, as a
+        read-only (n, 3) view into the mapped file. Multiply with
+        VECTOR_SCALE to obtain the actual offsets.
+        """
+        entry = self._entry(name)
+        return self._array(entry['vector_offset'], 3 * entry['count'], VECTOR_DTYPE).reshape((-1, 3))
+
+    def _license(self, record):
+        if not record['lic_text_size']:
+            return None
+        text = self._array(record['lic_text_offset'], record['lic_text_size'], np.dtype('S1'))
+        index = self._array(record['lic_index_offset'], record['lic_index_count'], np.dtype('<u4'))
+        return (text, index)
+
+    def getLicense(self, name):
+        """
+        Custom license of the named target, packed as (text, index) like
+        License.toNumpyString() does, or None if the target uses the default
+        license.
+        """
+        return self._license(self._entry(name))
+
+    def getDefaultLicense(self):
+        """
+        Packed license that applies to all targets in this archive that do not
+        have a custom license, or None if it was not stored.
+        """
+        return self._license(self._header)
+
+
+class TargetArchiveWriter(object):
+    """
+    Writes a compiled targets archive. Target data is streamed to disk as
+    targets are added, the table of contents is written by close().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._header = np.zeros(1, dtype=HEADER_DTYPE)
+        self._header['magic'] = MAGIC
+        self._header['version'] = VERSION
+        self._entries = []
+        self._names = []
+        self._file.write(self._header.tobytes())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+    def _write(self, data):
+        """
+        Append an array at the next aligned position, return its offset.
+        """
+        pos = self._file.tell()
+        pad = (-pos) % ALIGNMENT
+        if pad:
+            self._file.write(b'\0' * pad)
+        self._file.write(np.ascontiguousarray(data).tobytes())
+        return pos + pad
+
+    def _writeLicense(self, record, license):
+        """
+        Store a license packed with License.toNumpyString()
+        """
+        if license is None:
+            return
+        text, index = license
+        text = np.asarray(text, dtype='S1')
+        index = np.asarray(index, dtype='<u4')
+        record['lic_text_offset'] = self._write(text)
+        record['lic_text_size'] = len(text)
+        record['lic_index_offset'] = self._write(index)
+        record['lic_index_count'] = len(index)
+
+    def setDefaultLicense(self, license):
+        self._writeLicense(self._header[0], license)
+
+    def addTarget(self, name, index, vector, license=None):
+        """
+        Add a target with vertex indices (uint16) and fixed-point vectors
+        (int16, shape (n, 3)) to the archive.
+        """
+        name = name.replace('\\', '/')
+        if '\n' in name:
+            raise ValueError('Invalid target name: %r' % name)
+        index = np.asarray(index, dtype=INDEX_DTYPE)
+        vector = np.asarray(vector, dtype=VECTOR_DTYPE).reshape((-1, 3))
+        if len(index) != len(vector):
+            raise ValueError('Index and vector length of target %s differ' % name)
+
+        record = np.zeros(1, dtype=ENTRY_DTYPE)[0]
+        record['count'] = len(index)
+        record['index_offset'] = self._write(index)
+        record['vector_offset'] = self._write(vector)
+        self._writeLicense(record, license)
+
+        self._entries.append(record)
+        self._names.append(name)
+
+    def close(self):
+        table = np.array(self._entries, dtype=ENTRY_DTYPE)
+        names = '\n'.join(self._names).encode('utf-8')
+
+        header = self._header[0]
+        header['count'] = len(self._entries)
+        header['table_offset'] = self._write(table)
+        header['names_offset'] = self._write(np.frombuffer(names, dtype=np.uint8))
+        header['names_size'] = len(names)
+
+        self._file.seek(0)
+        self._file.write(self._header.tobytes())
+        self._file.close()
@@ -39,10 +39,11 @@ TODO
 import os
 import zipfile
 from getpath import getSysDataPath, canonicalPath
+from targetarchive import TargetArchive, TARGETS_ARCHIVE_NAME
 import log
 
-# TODO share with algos3d
 TARGETS_NPZ_PATH = getSysDataPath('targets.npz')
+TARGETS_ARCHIVE_PATH = getSysDataPath(TARGETS_ARCHIVE_NAME)
 
 # Defines reserved value keywords and which category they map to
 # Used for specifying dependencies between targets using their filename
@@ -301,11 +302,11 @@ class ZippedTargetsCrawler(TargetsCrawler):
 
     def buildTree(self):
         """
-        Build file tree of .target files from targets.npz and image file from
+        Build file tree of .target files from the targets archive and image file from
         the data file path.
-        Targets in NPZ archive are referenced as regular target files relative
+        Archived targets are referenced as regular target files relative
         to sys path (paths like data/targets/...).
-        This method will throw an exception if npz is not found or faulty.
+        This method will throw an exception if the archive is not found or faulty.
         """
         self._files = {}
 
@@ -318,15 +319,10 @@ class ZippedTargetsCrawler(TargetsCrawler):
                     dir[head] = {}
                 add_file(dir[head], tail)
 
-        # Add targets in npz archive to file list
-        with zipfile.ZipFile(self.npzPath, 'r') as npzfile:
-            for file_ in npzfile.infolist():
-                name = file_.filename
-                if not name.endswith('.index.npy'):
-                    continue
-                name = name[:-len('.index.npy')] + '.target'
-                path = name.split('/')
-                add_file(self._files, path)
+        # Add targets in archive to file list
+        for name in self.listArchivedTargets():
+            path = name.split('/')
+            add_file(self._files, path)
 
         # Walk file path (not .npz archive) to find images to add to file list
         import io
@@ -348,6 +344,28 @@ class ZippedTargetsCrawler(TargetsCrawler):
         #_debug_print(self._files)
 
 
+    def listArchivedTargets(self):
+        """
+        Paths of all targets in the archive, relative to the data path.
+        """
+        result = []
+        with zipfile.ZipFile(self.npzPath, 'r') as npzfile:
+            for file_ in npzfile.infolist():
+                name = file_.filename
+                if not name.endswith('.index.npy'):
+                    continue
+                result.append(name[:-len('.index.npy')] + '.target')
+        return result
+
+
+class MappedTargetsCrawler(ZippedTargetsCrawler):
+    """
+    Finds targets packed in a memory-mapped binary archive.
+    """
+    def listArchivedTargets(self):
+        return TargetArchive(self.npzPath).names()
+
+
 class Targets(object):
     def __init__(self, dataPath):
         self.targets = []       # List of target files
@@ -401,15 +419,23 @@ class Targets(object):
         return result
 
     def walk(self, dataPath):
-        try:
-            # Load cached targets from .npz file
-            log.debug("Attempting to load targets from NPZ file.")
-            targetFinder = ZippedTargetsCrawler(dataPath, 'targets.npz')
-            targetFinder.findTargets()
-            log.debug("%s targets loaded from NPZ file succesfully.", len(targetFinder.targets))
-        except Exception as e:
+        targetFinder = None
+        for crawlerClass, archiveName in [(MappedTargetsCrawler, TARGETS_ARCHIVE_NAME),
+                                          (ZippedTargetsCrawler, 'targets.npz')]:
+            try:
+                # Load cached targets from compiled archive
+                log.debug("Attempting to load targets from %s.", archiveName)
+                targetFinder = crawlerClass(dataPath, archiveName)
+                targetFinder.findTargets()
+                log.debug("%s targets loaded from %s succesfully.", len(targetFinder.targets), archiveName)
+                break
+            except Exception as e:
+                log.debug("Could not load targets from %s (Error message: %s)", archiveName, e, exc_info=False)
+                targetFinder = None
+
+        if targetFinder is None:
             # Load targets from .target files
-            log.debug("Could not load targets from NPZ, loading individual files from %s (Error message: %s)", dataPath, e, exc_info=False)
+            log.debug("Loading individual target files from %s", dataPath)
 
             targetFinder = FilesTargetsCrawler(dataPath)
             targetFinder.findTargets()
@@ -618,4 +618,7 @@ def main():
     close_standard_streams()
 
 if __name__ == '__main__':
+    # Lets frozen builds start worker processes (see massproducer)
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehumancommunity.org/
+
+**Github Code Home Page:**    https://github.com/makehumancommunity/
+
+**Authors:**           Jonas Hauquier
+
+**Copyright(c):**      MakeHuman Team 2001-2020
+
+**Licensing:**         AGPL3
+
+    This file is part of MakeHuman Community (www.makehumancommunity.org).
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+Abstract
+--------
+
+Command line interface to the headless MakeHuman engine. Loads an MHM file
+(or the default human) and exports it, without starting the GUI. Does not
+require PyQt or PyOpenGL.
+
+    python3 makehuman_headless.py model.mhm -o model.fbx -o model.bvh --unit meter
+"""
+
+import sys
+import os
+
+
+def parse_arguments(args=None):
+    import argparse
+    import headless
+
+    parser = argparse.ArgumentParser(description="Export MakeHuman models without GUI.")
+    parser.add_argument("mhmFile", default=None, nargs='?', help=".mhm file to load (default human if omitted)")
+    parser.add_argument("-o", "--output", action="append", required=True, help="file to export to, the format is determined by the file extension (%s). Can be specified multiple times" % ", ".join(sorted(headless.EXPORT_FORMATS.keys())))
+    parser.add_argument("--unit", default="decimeter", choices=sorted(headless.EXPORT_SCALES.keys()), help="unit of exported files")
+    parser.add_argument("--feetonground", action="store_true", help="move the exported model so that its feet are on the ground")
+    parser.add_argument("--hiddengeom", action="store_true", help="export helper geometry")
+    parser.add_argument("--strict", action="store_true", help="fail on any error while loading the MHM file")
+    parser.add_argument("--debugnumpy", action="store_true", help="enable numpy runtime error messages")
+    argOptions = vars(parser.parse_args(args))
+
+    for filename in argOptions['output']:
+        if os.path.splitext(filename)[1][1:].lower() not in headless.EXPORT_FORMATS:
+            parser.error("unsupported export format: %s" % filename)
+
+    return argOptions
+
+def main():
+    import makehuman
+    # set_sys_path() changes the working directory, resolve paths first
+    cwd = os.getcwd()
+    makehuman.set_sys_path()
+    makehuman.make_user_dir()
+    os.environ['MH_VERSION'] = makehuman.getVersionStr()
+    os.environ['MH_SHORT_VERSION'] = makehuman.getShortVersion()
+    os.environ['MH_MESH_VERSION'] = makehuman.getBasemeshVersion()
+    args = parse_arguments()
+    if args['mhmFile']:
+        args['mhmFile'] = os.path.join(cwd, args['mhmFile'])
+    args['output'] = [os.path.join(cwd, path) for path in args['output']]
+    makehuman.init_logging()
+
+    from core import G
+    G.args = args
+
+    if not args.get('debugnumpy', False):
+        import numpy
+        numpy.seterr(all = 'ignore')
+
+    import headless
+    import log
+    app = headless.HeadlessApplication()
+    if args['mhmFile']:
+        app.loadMHM(args['mhmFile'], strict=args['strict'])
+
+    failed = False
+    for filename in args['output']:
+        try:
+            folder = os.path.dirname(filename)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            app.export(filename,
+                       scale = args['unit'],
+                       feetOnGround = args['feetonground'],
+                       hiddenGeom = args['hiddengeom'])
+        except Exception as e:
+            log.error("Failed to export %s: %s", filename, e, exc_info=True)
+            failed = True
+            continue
+        log.message("Exported %s", filename)
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,7 @@ import glob
 import fnmatch
 import proxy
 import gui3d
+import filecache
 
 from core import G
 
@@ -474,14 +475,34 @@ class Assets(NameSpace):
 
         return output
 
+    def _findIndexedFiles(self, category, task, path):
+        """Get the files in path from the asset index of the library task view,
+        instead of walking the file system. Returns None if there is no such library."""
+        try:
+            library = self.api.ui.getTaskView(category, task)
+        except (KeyError, AttributeError):
+            return None
+        if not isinstance(library, filecache.MetadataCacher):
+            return None
+        return library.getFiles(path)
+
     def _findMaterials(self,path):
+        matches = self._findIndexedFiles("Materials", "Material", path)
+        if matches is not None:
+            return matches
+
         matches = []
         for root, dirnames, filenames in os.walk(path):
             for filename in fnmatch.filter(filenames, '*.mhmat'):
                 matches.append(os.path.join(root, filename))
         return matches
 
-    def _findProxies(self,path):
+    def _findProxies(self,path,task=None):
+
+        if task:
+            matches = self._findIndexedFiles("Geometries", task, path)
+            if matches is not None:
+                return matches
 
         basenames = []
         matches = []
@@ -511,42 +532,42 @@ class Assets(NameSpace):
     def getAvailableSystemHair(self):
         """Get a list with full paths to all system hair (the MHCLO files)"""
         path = getpath.getSysDataPath("hair")
-        return self._findProxies(path)
+        return self._findProxies(path, "Hair")
 
     def getAvailableUserHair(self):
         """Get a list with full paths to all user hair (the MHCLO files)"""
         path = getpath.getDataPath("hair")
-        return self._findProxies(path)
+        return self._findProxies(path, "Hair")
 
     def getAvailableSystemEyebrows(self):
         """Get a list with full paths to all system eyebrows (the MHCLO files)"""
         path = getpath.getSysDataPath("eyebrows")
-        return self._findProxies(path)
+        return self._findProxies(path, "Eyebrows")
 
     def getAvailableUserEyebrows(self):
         """Get a list with full paths to all user eyebrows (the MHCLO files)"""
         path = getpath.getDataPath("eyebrows")
-        return self._findProxies(path)
+        return self._findProxies(path, "Eyebrows")
 
     def getAvailableSystemEyelashes(self):
         """Get a list with full paths to all system eyelashes (the MHCLO files)"""
         path = getpath.getSysDataPath("eyelashes")
-        return self._findProxies(path)
+        return self._findProxies(path, "Eyelashes")
 
     def getAvailableUserEyelashes(self):
         """Get a list with full paths to all user eyelashes (the MHCLO files)"""
         path = getpath.getDataPath("eyelashes")
-        return self._findProxies(path)
+        return self._findProxies(path, "Eyelashes")
 
     def getAvailableSystemClothes(self):
         """Get a list with full paths to all system clothes (the MHCLO files)"""
         path = getpath.getSysDataPath("clothes")
-        return self._findProxies(path)
+        return self._findProxies(path, "Clothes")
 
     def getAvailableUserClothes(self):
         """Get a list with full paths to all user clothes (the MHCLO files)"""
         path = getpath.getDataPath("clothes")
-        return self._findProxies(path)
+        return self._findProxies(path, "Clothes")
 
     def _equipProxy(self, category, tab, filename):
         tv = self.api.ui.getTaskView(category, tab)
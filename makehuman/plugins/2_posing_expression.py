@@ -217,6 +217,10 @@ class ExpressionTaskView(gui3d.TaskView, filecache.MetadataCacher):
         tags = metadata[0]
         return tags
 
+    def getNameFromMetadata(self, metadata):
+        name = metadata[1]
+        return name
+
     def getSearchPaths(self):
         return self.paths
 
@@ -126,7 +126,7 @@ class AnimationLibrary(gui3d.TaskView):
         @self.playbackSlider.mhEvent
         def onChanging(value):
             self.currentframe = int(value)
-            self.updateFrame()
+            self.updateFrame(realtime=True)
 
     def toggleEnable(self, enable, reason):
         for button in [self.playbackSlider, self.btn1, self.btn2, self.btn3, self.btn4]:
@@ -136,9 +136,12 @@ class AnimationLibrary(gui3d.TaskView):
             self.playbackSlider.setValue(0)
             self.frameLbl.setTextFormat(["Frame",": %s"], self.currentframe)
 
-    def updateFrame(self):
-        self.human.setToFrame(self.currentframe)
+    def updateFrame(self, realtime=False):
+        # while scrubbing, skin straight into the render buffers (skinned normals, no tangents unless the shader needs them)
+        self.human.realtimeSkinning = realtime
+        self.human.setToFrame(self.currentframe, update=False)
         self.human.refreshPose()                    # needed otherwise proxies will not refresh
+        self.human.realtimeSkinning = False
         self.playbackSlider.setValue(self.currentframe)
         self.frameLbl.setTextFormat(["Frame",": %s"], self.currentframe)
 
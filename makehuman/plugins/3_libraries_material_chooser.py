@@ -107,6 +107,10 @@ class MaterialTaskView(gui3d.TaskView, filecache.MetadataCacher):
         name, tags, description = metadata
         return tags
 
+    def getNameFromMetadata(self, metadata):
+        name, tags, description = metadata
+        return name
+
     def getSearchPaths(self):
         return self.materials
 
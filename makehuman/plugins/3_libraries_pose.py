@@ -140,6 +140,9 @@ class PoseLibraryTaskView(gui3d.TaskView, filecache.MetadataCacher):
     def getTagsFromMetadata(self, metadata):
         return metadata[0]
 
+    def getNameFromMetadata(self, metadata):
+        return metadata[1]
+
     def getSearchPaths(self):
         return self.paths
 
@@ -256,6 +256,10 @@ class SkeletonLibrary(gui3d.TaskView, filecache.MetadataCacher):
         name, desc, tags = metadata
         return tags
 
+    def getNameFromMetadata(self, metadata):
+        name, desc, tags = metadata
+        return name
+
     def getSearchPaths(self):
         return self.paths
 
@@ -193,6 +193,12 @@ class SettingsTaskView(gui3d.TaskView):
         self.noShaders = startupBox.addWidget(SettingCheckbox("No shaders", 'noShaders', hdpiPostAction))
         self.noSampleBuffers = startupBox.addWidget(SettingCheckbox("No sample buffers", 'noSampleBuffers', hdpiPostAction))
 
+        animationBox = self.addLeftWidget(gui.GroupBox('Animation'))
+
+        def updateParallelSkinning(selected):
+            gui3d.app.selectedHuman.parallelSkinning = selected
+        self.parallelSkinning = animationBox.addWidget(SettingCheckbox("Skin meshes in parallel", 'parallelSkinning', updateParallelSkinning))
+
         resetBox = self.addLeftWidget(gui.GroupBox('Restore settings'))
         self.resetButton = resetBox.addWidget(gui.Button("Restore to defaults"))
 
@@ -229,7 +235,7 @@ class SettingsTaskView(gui3d.TaskView):
 
         self.checkboxes.extend([self.realtimeUpdates, self.realtimeNormalUpdates,
             self.realtimeFitting, self.cameraAutoZoom, self.sliderImages,
-            self.useNameTags, self.preload, self.saveScreenSize])
+            self.useNameTags, self.preload, self.saveScreenSize, self.parallelSkinning])
 
         themes = []
         self.themesBox = self.addRightWidget(gui.GroupBox('Theme'))
@@ -45,6 +45,9 @@ class ObjConfig(ExportConfig):
         self.useRelPaths = True
         self.useNormals = False
         self.hiddenGeom = False
+        # Number of processes that format the OBJ data in parallel, the data is
+        # formatted in the exporting process if it is lower than 2
+        self.formatProcesses = 0
 
 
 class ExporterOBJ(Exporter):
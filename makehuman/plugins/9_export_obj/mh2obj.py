@@ -38,6 +38,8 @@ Exports proxy mesh to obj
 
 import wavefront
 import os
+import multiprocessing
+import concurrent.futures
 from progress import Progress
 import numpy as np
 
@@ -70,6 +72,13 @@ def exportObj(filepath, config=None):
             m.updateIndexBuffer()
 
     progress(0.3, 0.99, "Writing Objects")
-    wavefront.writeObjFile(filepath, meshes, True, config, filterMaskedFaces=not config.hiddenGeom)
+    formatProcesses = getattr(config, 'formatProcesses', 0)
+    if formatProcesses > 1:
+        # Spawn, so the processes do not inherit the state of the application
+        context = multiprocessing.get_context('spawn')
+        with concurrent.futures.ProcessPoolExecutor(formatProcesses, mp_context=context) as pool:
+            wavefront.writeObjFile(filepath, meshes, True, config, filterMaskedFaces=not config.hiddenGeom, pool=pool)
+    else:
+        wavefront.writeObjFile(filepath, meshes, True, config, filterMaskedFaces=not config.hiddenGeom)
 
     progress(1.0, None, "OBJ Export finished. Output file: %s" % filepath)
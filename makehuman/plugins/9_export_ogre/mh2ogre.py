@@ -44,6 +44,7 @@ A description of this format can be found here: https://bitbucket.org/sinbad/ogr
 __docformat__ = 'restructuredtext'
 
 import os
+import numpy as np
 from progress import Progress
 import transformations
 import log
@@ -176,21 +177,16 @@ def writeMeshFile(human, filepath, objects, config):
             # filtered out, and remap to multiple vertices if mesh is subdivided
             weights = mesh.getVertexWeights(weights)
 
-            # Remap vertex weights to the unwelded vertices of the object (mesh.coord to mesh.r_coord)
-            originalToUnweldedMap = mesh.inverse_vmap
-
             lines.append('            <boneassignments>')
             boneNames = [ bone.name for bone in human.getSkeleton().getBones() ]
             for (boneName, (verts,ws)) in list(weights.data.items()):
                 bIdx = boneNames.index(boneName)
-                for i, vIdx in enumerate(verts):
-                    w = ws[i]
-                    try:
-                        lines.extend( ['                <vertexboneassignment vertexindex="%s" boneindex="%s" weight="%s" />' % (r_vIdx, bIdx, w)
-                                        for r_vIdx in originalToUnweldedMap[vIdx]] )
-                    except:
-                        # unused coord
-                        pass
+                # Remap vertex weights to the unwelded vertices of the object (mesh.coord to mesh.r_coord)
+                # unused coords have no unwelded vertices and are skipped
+                r_verts, counts = mesh.getUnweldedVerts(verts)
+                r_ws = np.repeat(np.asarray(ws), counts)
+                lines.extend( ['                <vertexboneassignment vertexindex="%s" boneindex="%s" weight="%s" />' % (r_vIdx, bIdx, w)
+                                for r_vIdx, w in zip(r_verts, r_ws)] )
             lines.append('            </boneassignments>')
 
         progress.step()
@@ -54,6 +54,36 @@ from progress import Progress
 
 # TODO perhaps add scale option
 
+# Binary STL triangle record
+STL_RECORD_DTYPE = np.dtype([('normal', '<f4', (3,)),
+                             ('vertices', '<f4', (3, 3)),
+                             ('attributes', '<u2')])
+
+ASCII_FACET_FORMAT = ('facet normal %f %f %f\n' +
+                      '\touter loop\n' +
+                      '\t\tvertex %f %f %f\n' +
+                      '\t\tvertex %f %f %f\n' +
+                      '\t\tvertex %f %f %f\n' +
+                      '\tendloop\n' +
+                      '\tendfacet\n')
+
+
+def getTriangles(mesh, coord):
+    """
+    Triangulate the faces of mesh. Quads are split in the triangles (0, 1, 2)
+    and (2, 3, 0), which both get the normal of the quad.
+    Returns the triangle normals, of shape (n, 3), and the triangle vertex
+    coordinates, of shape (n, 3, 3).
+    """
+    if mesh.vertsPerFaceForExport == 3:
+        fvert = mesh.fvert[:,:3]
+        fnorm = mesh.fnorm
+    else:
+        fvert = mesh.fvert[:,[0, 1, 2, 2, 3, 0]].reshape((-1, 3))
+        fnorm = np.repeat(mesh.fnorm, 2, axis=0)
+    return fnorm, coord[fvert]
+
+
 def exportStlAscii(filepath, config, exportJoints = False):
     """
     This function exports MakeHuman mesh to stereolithography ascii format.
@@ -86,52 +116,22 @@ def exportStlAscii(filepath, config, exportJoints = False):
         progress(0.3, 0.99, "Writing Objects")
         objprog = Progress(len(meshes))
 
-        def chunked_enumerate(offs, chunk_size, list_):
-            return zip(range(offs, offs + chunk_size), list_[offs:offs + chunk_size])
-
         for mesh in meshes:
             coord = config.scale*mesh.coord + config.offset
+            fnorm, tris = getTriangles(mesh, coord)
+            facets = np.hstack([fnorm, tris.reshape((-1, 9))])
+
             offs = 0
-            chunk_size = 2000   # The higher the chunk size, the faster, but setting this too high can run into memory errors on some machines
-            meshprog = Progress(math.ceil( float(len(mesh.fvert)) / chunk_size ))
-
-            if mesh.vertsPerFaceForExport == 3:
-                while(offs < len(mesh.fvert)):
-                    fp.write("".join( [(
-                        'facet normal %f %f %f\n' % tuple(mesh.fnorm[fn]) +
-                        '\touter loop\n' +
-                        '\t\tvertex %f %f %f\n' % tuple(coord[fv[0]]) +
-                        '\t\tvertex %f %f %f\n' % tuple(coord[fv[1]]) +
-                        '\t\tvertex %f %f %f\n' % tuple(coord[fv[2]]) +
-                        '\tendloop\n' +
-                        '\tendfacet\n'
-                        ) for fn,fv in chunked_enumerate(offs, chunk_size, mesh.fvert)] ))
-                    fp.flush()
-                    os.fsync(fp.fileno())
-                    offs += chunk_size
-                    meshprog.step()
-            else:
-                while(offs < len(mesh.fvert)):
-                    fp.write("".join( [(
-                        'facet normal %f %f %f\n' % tuple(mesh.fnorm[fn]) +
-                        '\touter loop\n' +
-                        '\t\tvertex %f %f %f\n' % tuple(coord[fv[0]]) +
-                        '\t\tvertex %f %f %f\n' % tuple(coord[fv[1]]) +
-                        '\t\tvertex %f %f %f\n' % tuple(coord[fv[2]]) +
-                        '\tendloop\n' +
-                        '\tendfacet\n' +
-                        'facet normal %f %f %f\n' % tuple(mesh.fnorm[fn]) +
-                        '\touter loop\n' +
-                        '\t\tvertex %f %f %f\n' % tuple(coord[fv[2]]) +
-                        '\t\tvertex %f %f %f\n' % tuple(coord[fv[3]]) +
-                        '\t\tvertex %f %f %f\n' % tuple(coord[fv[0]]) +
-                        '\tendloop\n' +
-                        '\tendfacet\n'
-                        ) for fn,fv in chunked_enumerate(offs, chunk_size, mesh.fvert)] ))
-                    fp.flush()
-                    os.fsync(fp.fileno())
-                    offs += chunk_size
-                    meshprog.step()
+            chunk_size = 4000   # The higher the chunk size, the faster, but setting this too high can run into memory errors on some machines
+            meshprog = Progress(math.ceil( float(len(facets)) / chunk_size ))
+
+            while(offs < len(facets)):
+                chunk = facets[offs:offs + chunk_size]
+                fp.write((ASCII_FACET_FORMAT * len(chunk)) % tuple(chunk.ravel().tolist()))
+                fp.flush()
+                os.fsync(fp.fileno())
+                offs += chunk_size
+                meshprog.step()
 
             meshprog.finish()
             objprog.step()
@@ -167,29 +167,16 @@ def exportStlBinary(filepath, config, exportJoints = False):
         objprog = Progress(len(meshes))
         for mesh in meshes:
             coord = config.scale * mesh.coord + config.offset
+            fnorm, tris = getTriangles(mesh, coord)
 
-            for fn,fv in enumerate(mesh.fvert):
-                fno = mesh.fnorm[fn]
-                co = coord[fv]
-
-                fp.write(struct.pack(b'<fff', fno[0], fno[1], fno[2]))
-                fp.write(struct.pack(b'<fff', co[0][0], co[0][1], co[0][2]))
-                fp.write(struct.pack(b'<fff', co[1][0], co[1][1], co[1][2]))
-                fp.write(struct.pack(b'<fff', co[2][0], co[2][1], co[2][2]))
-                fp.write(struct.pack(b'<H', 0))
-                count += 1
-
-                if mesh.vertsPerFaceForExport != 3:
-                    fp.write(struct.pack(b'<fff', fno[0], fno[1], fno[2]))
-                    fp.write(struct.pack(b'<fff', co[2][0], co[2][1], co[2][2]))
-                    fp.write(struct.pack(b'<fff', co[3][0], co[3][1], co[3][2]))
-                    fp.write(struct.pack(b'<fff', co[0][0], co[0][1], co[0][2]))
-                    fp.write(struct.pack(b'<H', 0))
-                    count += 1
+            records = np.zeros(len(tris), dtype=STL_RECORD_DTYPE)
+            records['normal'] = fnorm
+            records['vertices'] = tris
+            fp.write(records.tobytes())
+            count += len(records)
 
             objprog.step()
 
         fp.seek(80)
         fp.write(struct.pack('<I', count))
     progress(1, None, "STL export finished. Exported file: %s", filepath)
-
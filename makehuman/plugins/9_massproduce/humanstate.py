@@ -21,20 +21,39 @@ pp = pprint.PrettyPrinter(indent=4)
 
 class HumanState():
 
-    def __init__(self, settings = None):
+    def __init__(self, settings = None, seed = None, baseState = None):
+        """Capture the current state of the human, or start from baseState
+        if specified, and randomize it according to settings."""
 
         self.settings = settings
+        # All randomization goes through this generator, so that a state can
+        # be reproduced from its seed
+        self.rng = random.Random(seed)
         self.human = G.app.selectedHuman
         self.macroModifierValues = dict()
-        self.appliedTargets = dict(self.human.targetsDetailStack)
+        self.detailModifierValues = dict()
 
-        self.skin = material.Material().copyFrom(self.human.material)
-        self.hair = mhapi.assets.getEquippedHair()
-        self.eyebrows = mhapi.assets.getEquippedEyebrows()
-        self.eyelashes = mhapi.assets.getEquippedEyelashes()
-        self.clothes = mhapi.assets.getEquippedClothes()
+        if baseState is None:
+            self.appliedTargets = dict(self.human.targetsDetailStack)
 
-        self._fillMacroModifierValues()
+            self.skin = material.Material().copyFrom(self.human.material)
+            self.hair = mhapi.assets.getEquippedHair()
+            self.eyebrows = mhapi.assets.getEquippedEyebrows()
+            self.eyelashes = mhapi.assets.getEquippedEyelashes()
+            self.clothes = mhapi.assets.getEquippedClothes()
+
+            self._fillMacroModifierValues()
+        else:
+            # Never modified, only copied when applied
+            self.appliedTargets = baseState.appliedTargets
+
+            self.skin = baseState.skin
+            self.hair = baseState.hair
+            self.eyebrows = baseState.eyebrows
+            self.eyelashes = baseState.eyelashes
+            self.clothes = list(baseState.clothes)
+
+            self.macroModifierValues.update(baseState.macroModifierValues)
 
         self.modifierInfo = ModifierInfo()
 
@@ -71,18 +90,18 @@ class HumanState():
         for n in modifierList:
             valuesHash[n] = 0.0
         num = len(modifierList)
-        pickedVal = random.randrange(num)
+        pickedVal = self.rng.randrange(num)
         pickedName = modifierList[pickedVal]
         valuesHash[pickedName] = 1.0
 
     def _pickOneFromArray(self, values):
         num = len(values)
-        pickedVal = random.randrange(num)
+        pickedVal = self.rng.randrange(num)
         return values[pickedVal]
 
     def _dichotomous(self, valuesHash, modifierList):
         for n in modifierList:
-            valuesHash[n] = float(random.randrange(2))
+            valuesHash[n] = float(self.rng.randrange(2))
 
     def _randomizeModifierGroup(self, modifierGroup, debug=False):
         if debug:
@@ -116,15 +135,14 @@ class HumanState():
                 if newval < 0.0:
                     newval = 0.0
 
-            modifier.setValue(newval)
+            self.detailModifierValues[modifier.fullName] = newval
 
             if debug:
                 print("SETTING " + str(modifier) + " to " + str(newval))
 
             if mi["leftright"]:
                 sname = modifier.getSymmetricOpposite()
-                smod = self.human.getModifier(sname)
-                smod.setValue(newval)
+                self.detailModifierValues[sname] = newval
 
 
     def _randomizeDetails(self):
@@ -172,9 +190,9 @@ class HumanState():
         if self.settings.getValue("macro", "gender"):
             key = MACROGROUPS["gender"][0]
             if self.settings.getValue("macro", "genderabsolute"):
-                self.macroModifierValues[key] = float(random.randrange(2))
+                self.macroModifierValues[key] = float(self.rng.randrange(2))
             else:
-                self.macroModifierValues[key] = random.random()
+                self.macroModifierValues[key] = self.rng.random()
 
     def _getCurrentEthnicity(self):
         for ethn in MACROGROUPS["ethnicity"]:
@@ -210,7 +228,7 @@ class HumanState():
             if skin[ethnicity]:
                 matchingSkins.append(skin["fullPath"])
 
-        pick = random.randrange(len(matchingSkins))
+        pick = self.rng.randrange(len(matchingSkins))
         self.skin = material.fromFile(matchingSkins[pick])
 
     def _randomizeSkin(self):
@@ -229,7 +247,7 @@ class HumanState():
             if allowed:
                 allowedHair.append(hairName)
 
-        pick = random.randrange(len(allowedHair))
+        pick = self.rng.randrange(len(allowedHair))
         return self.settings.getValue("allowedHair",allowedHair[pick],"fullPath")
 
     def _randomizeHair(self):
@@ -246,7 +264,7 @@ class HumanState():
             if allowed:
                 allowedEyebrows.append(eyebrowsName)
 
-        pick = random.randrange(len(allowedEyebrows))
+        pick = self.rng.randrange(len(allowedEyebrows))
         return self.settings.getValue("allowedEyebrows",allowedEyebrows[pick],"fullPath")
 
     def _randomizeEyebrows(self):
@@ -264,7 +282,7 @@ class HumanState():
             if allowed:
                 allowedEyelashes.append(eyelashesName)
 
-        pick = random.randrange(len(allowedEyelashes))
+        pick = self.rng.randrange(len(allowedEyelashes))
         return self.settings.getValue("allowedEyelashes",allowedEyelashes[pick],"fullPath")
 
     def _randomizeEyelashes(self):
@@ -342,7 +360,8 @@ class HumanState():
 
         self._applyMacroModifiers()
         if assumeBodyReset:
-            self.human.targetsDetailStack = self.appliedTargets
+            self.human.targetsDetailStack = dict(self.appliedTargets)
+        self._applyDetailModifiers()
         self.human.material = self.skin
         mhapi.assets.equipHair(self.hair)
         mhapi.assets.equipEyebrows(self.eyebrows)
@@ -352,6 +371,37 @@ class HumanState():
 
         self.equipClothes()
 
+    def applyTransition(self, previousState):
+        """Apply this state to the human, which has previousState applied.
+        Only what differs between both states is changed: the modifiers are
+        set on top of the initial targets, after which applyAllTargets only
+        evaluates the targets whose weight changed, and only the skin and
+        proxies that differ are swapped."""
+
+        self.human.targetsDetailStack = dict(self.appliedTargets)
+        self._applyMacroModifiers()
+        self._applyDetailModifiers()
+
+        if self.skin.filename != previousState.skin.filename:
+            self.human.material = self.skin
+        if self.hair != previousState.hair:
+            mhapi.assets.equipHair(self.hair)
+        if self.eyebrows != previousState.eyebrows:
+            mhapi.assets.equipEyebrows(self.eyebrows)
+        if self.eyelashes != previousState.eyelashes:
+            mhapi.assets.equipEyelashes(self.eyelashes)
+
+        # Remove clothes before fitting, add new clothes after
+        for c in previousState.clothes:
+            if not c in self.clothes:
+                mhapi.assets.unequipClothes(c)
+
+        self.human.applyAllTargets()
+
+        for c in self.clothes:
+            if not c in previousState.clothes:
+                mhapi.assets.equipClothes(c)
+
     def _applyMacroModifiers(self):
         for group in MACROGROUPS.keys():
             for n in MACROGROUPS[group]:
@@ -359,15 +409,33 @@ class HumanState():
                 v = self.macroModifierValues[n]
                 mod.setValue(v)
 
+    def _applyDetailModifiers(self):
+        for n in self.detailModifierValues:
+            self.human.getModifier(n).setValue(self.detailModifierValues[n])
+
+    def getSpec(self):
+        """Describe this state as plain data, which can be sent to the
+        production worker processes (see massproducer.ProductionWorker)"""
+        modifiers = dict(self.macroModifierValues)
+        modifiers.update(self.detailModifierValues)
+        spec = dict()
+        spec["modifiers"] = modifiers
+        spec["skinMaterial"] = self.skin.filename
+        spec["hair"] = self.hair
+        spec["eyebrows"] = self.eyebrows
+        spec["eyelashes"] = self.eyelashes
+        spec["clothes"] = list(self.clothes)
+        return spec
+
     def getRandomValue(self, minValue, maxValue):
         size = maxValue - minValue
-        val = random.random() * size
+        val = self.rng.random() * size
         return minValue + val
 
     def getNormalRandomValue(self, minValue, maxValue, middleValue, sigmaFactor=0.2):
         rangeWidth = float(abs(maxValue - minValue))
         sigma = sigmaFactor * rangeWidth
-        randomVal = random.gauss(middleValue, sigma)
+        randomVal = self.rng.gauss(middleValue, sigma)
         if randomVal < minValue:
             randomVal = minValue + abs(randomVal - minValue)
         elif randomVal > maxValue:
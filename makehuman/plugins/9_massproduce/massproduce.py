@@ -2,8 +2,11 @@
 # -*- coding: utf-8 -*-
 
 import random
+import multiprocessing
 import gui3d
 import gui
+import massproducer
+import headless
 from core import G
 from progress import Progress
 from .randomizeaction import RandomizeAction
@@ -23,6 +26,9 @@ pp = pprint.PrettyPrinter(indent=4)
 DEFAULT_TABLE_HEIGHT=250
 DEFAULT_LABEL_COLUMN_WIDTH=300
 
+# Formats that the worker processes can export, with their file extension
+PARALLEL_FORMATS = {"MHM": "mhm", "OBJ": "obj", "DAE": "dae", "FBX": "fbx"}
+
 class MassProduceTaskView(gui3d.TaskView):
 
     def __init__(self, category):
@@ -743,6 +749,12 @@ class MassProduceTaskView(gui3d.TaskView):
         self.producePanel.addWidget(mhapi.ui.createLabel("Number of characters"))
         r.addUI("output", "numfiles", self.producePanel.addWidget(mhapi.ui.createTextEdit("5")))
         self.producePanel.addWidget(mhapi.ui.createLabel(""))
+        self.producePanel.addWidget(mhapi.ui.createLabel("Random seed (empty for random)"))
+        r.addUI("output", "seed", self.producePanel.addWidget(mhapi.ui.createTextEdit("")))
+        self.producePanel.addWidget(mhapi.ui.createLabel(""))
+        self.producePanel.addWidget(mhapi.ui.createLabel("Worker processes"))
+        r.addUI("output", "processes", self.producePanel.addWidget(mhapi.ui.createTextEdit(str(multiprocessing.cpu_count()))))
+        self.producePanel.addWidget(mhapi.ui.createLabel(""))
         self.produceButton = self.producePanel.addWidget(mhapi.ui.createButton("Produce"))
 
         @self.produceButton.mhEvent
@@ -819,18 +831,38 @@ class MassProduceTaskView(gui3d.TaskView):
 
         i = int(self.randomizationSettings.getValue("output","numfiles"))
         base = self.randomizationSettings.getValue("output","fnbase")
+        format = self.randomizationSettings.getValue("output","fileformat")
+        processes = int(self.randomizationSettings.getValue("output","processes") or 1)
+
+        # Every character gets its own seed, derived from the seed of the batch,
+        # so that a batch can be reproduced regardless of how it is produced
+        seed = self.randomizationSettings.getValue("output","seed").strip()
+        if not seed:
+            seed = str(random.randrange(2**31))
+        self.log.info("Producing characters with seed " + seed)
+
+        if processes > 1 and format in PARALLEL_FORMATS:
+            exportOptions = self._getExportOptions(format)
+            if exportOptions is not None:
+                self._produceInWorkers(i, base, format, seed, processes, exportOptions)
+                return
+            self.log.warning("The export settings of " + format + " cannot be used in worker processes, producing characters in one process")
 
         max = i
 
         prog = Progress()
 
+        # Characters are applied as a transition from the previous one, the
+        # human is not reset in between
+        currentState = self.initialState
+
         while i > 0:
             prg = float(max - i + 1) / float(max)
             prgStr = str( max - i + 1) + " / " + str(max)
             prog(prg, desc="Randomizing " + prgStr)
-            self.nextState = HumanState(self.randomizationSettings)
-            self.nextState.applyState(False)
-            format = self.randomizationSettings.getValue("output","fileformat")
+            self.nextState = HumanState(self.randomizationSettings, seed + "/" + str(i), self.initialState)
+            self.nextState.applyTransition(currentState)
+            currentState = self.nextState
             name = base + str(i).rjust(4,"0")
 
             prog(prg, desc="Exporting " + prgStr)
@@ -853,12 +885,82 @@ class MassProduceTaskView(gui3d.TaskView):
             prog(prg, desc="Evaluating")
 
             i = i - 1
-            self.initialState.applyState(True)
-            self.human.applyAllTargets()
 
+        self.initialState.applyTransition(currentState)
+
+        self._showDoneMessage("Done!")
+
+    def _getExportOptions(self, format):
+        # Options for the headless exporter of the workers, taken from the
+        # settings of the exporter in the export tab, as used by mhapi.exports.
+        # Returns None if the settings cannot be reproduced by the workers.
+        if format == "MHM":
+            return dict()
+        if format == "OBJ":
+            exporter = mhapi.exports.getOBJExporter()
+        elif format == "DAE":
+            exporter = mhapi.exports.getDAEExporter()
+        elif format == "FBX":
+            exporter = mhapi.exports.getFBXExporter()
+        else:
+            return None
+        if exporter is None:
+            return None
+
+        cfg = exporter.getConfig()
+        if cfg.unit not in headless.EXPORT_SCALES:
+            return None
+        options = {"scale": cfg.unit, "feetOnGround": cfg.feetOnGround, "hiddenGeom": cfg.hiddenGeom}
+        for name, value in vars(cfg).items():
+            if name in ["scale", "unit", "feetOnGround", "hiddenGeom", "human"]:
+                continue
+            if value is not None and not isinstance(value, (bool, int, float, str)):
+                return None
+            options[name] = value
+        return options
+
+    def _produceInWorkers(self, numfiles, base, format, seed, processes, exportOptions):
+        # The workers start from the current model, and only apply what differs
+        # between the characters
+        baseModel = os.path.join(mh.getPath("cache"), "massproduce_base.mhm")
+        self.human.save(baseModel)
+
+        if format == "MHM":
+            path = mhapi.locations.getUserHomePath("models")
+        else:
+            path = mh.getPath("exports")
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        specs = []
+        i = numfiles
+        while i > 0:
+            spec = HumanState(self.randomizationSettings, seed + "/" + str(i), self.initialState).getSpec()
+            spec["path"] = os.path.join(path, base + str(i).rjust(4,"0") + "." + PARALLEL_FORMATS[format])
+            specs.append(spec)
+            i = i - 1
+
+        prog = Progress()
+        failed = []
+
+        def onResult(result, completed, total):
+            if not result.succeeded:
+                failed.append(os.path.basename(result.path))
+            prog(float(completed) / float(total), desc="Produced " + str(completed) + " / " + str(total))
+
+        producer = massproducer.MassProducer(baseModel, processes, exportOptions)
+        for result in producer.produce(specs, onResult):
+            pass
+
+        if failed:
+            self._showDoneMessage("Done, but failed to produce " + ", ".join(failed) + ". See the log for details.")
+        else:
+            self._showDoneMessage("Done!")
+
+    def _showDoneMessage(self, text):
         self.msg = QMessageBox()
         self.msg.setIcon(QMessageBox.Information)
-        self.msg.setText("Done!")
+        self.msg.setText(text)
         self.msg.setWindowTitle("Produce")
         self.msg.setStandardButtons(QMessageBox.Ok)
         self.msg.show()
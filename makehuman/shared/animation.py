@@ -39,6 +39,9 @@ Data handlers for skeletal animation.
 # TODO perhaps do not adapt camera to posed position, always use rest coordinates
 
 import math
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait
 import numpy as np
 import log
 import makehuman
@@ -51,7 +54,9 @@ INTERPOLATION = {
 }
 
 # TODO allow saving AnimationTrack to binary file
-# TODO allow saving VertexBoneWeights to binary file
+
+# Number of frames of which the skinning matrices are calculated at once when baking
+BAKE_CHUNK_SIZE = 256
 
 class AnimationTrack(object):
     """Baseclass for all animations and poses that can be applied to a
@@ -130,24 +135,21 @@ class AnimationTrack(object):
         from progress import Progress
 
         log.debug('Updating baked animation %s (%s frames)', self.name, self.nFrames)
-        progress = Progress(self.nFrames)
+        nChunks = int(math.ceil(float(self.nFrames) / BAKE_CHUNK_SIZE))
+        progress = Progress(nChunks)
 
         bones = skel.getBones()
         if len(bones) != self.nBones:
             raise RuntimeError("Error baking animation %s: number of bones in animation data differs from bone count of skeleton %s" % (self.name, skel.name))
 
-        old_pose = skel.getPose()
         self._data_baked = np.zeros((self.dataLen, 3, 4))
 
-        for f_idx in range(self.nFrames):
-            i = f_idx * self.nBones
-            skel.setPose(self._data[i:i+self.nBones])
-            for b_idx in range(self.nBones):
-                idx = i + b_idx
-                self._data_baked[idx,:,:] = bones[b_idx].matPoseVerts[:3,:4]
-            progress.step("Baking animation frame %s", f_idx+1)
-
-        skel.setPose(old_pose)
+        # Bake a chunk of frames at once, this limits memory use for long animations
+        for c_idx in range(nChunks):
+            start = c_idx * BAKE_CHUNK_SIZE * self.nBones
+            end = min(start + BAKE_CHUNK_SIZE * self.nBones, self.dataLen)
+            self._data_baked[start:end] = skel.getSkinningMatrices(self._data[start:end])
+            progress.step("Baking animation frame %s", end // self.nBones)
 
     def scale(self, scale):
         """
@@ -491,6 +493,13 @@ def joinAnimations(anim1, anim2):
 
     return AnimationTrack(name, poseData, nFrames, framerate)
 
+def getBinaryWeightsPath(filename):
+    """
+    Path of the compiled binary version of a vertex weights file.
+    """
+    return os.path.splitext(filename)[0] + '.mhwb'
+
+
 class VertexBoneWeights(object):
     """
     Weighted vertex to bone assignments.
@@ -520,7 +529,41 @@ class VertexBoneWeights(object):
     @staticmethod
     def fromFile(filename, vertexCount=None, rootBone="root"):
         """
-        Load vertex to bone weights from file
+        Load vertex to bone weights from file.
+        If a compiled binary version of the file exists that is not older than
+        the file, it is loaded instead. Otherwise it is written after loading,
+        if the file is located in the user data path.
+        """
+        import getpath
+        binpath = getBinaryWeightsPath(filename)
+        try:
+            if not os.path.isfile(binpath):
+                log.message('compiled vertex weights file missing: %s', binpath)
+                raise RuntimeError('compiled vertex weights file missing: %s' % binpath)
+            if os.path.isfile(filename) and os.path.getmtime(filename) > os.path.getmtime(binpath):
+                log.message('compiled vertex weights file out of date: %s', binpath)
+                raise RuntimeError('compiled vertex weights file out of date: %s' % binpath)
+            return VertexBoneWeights.fromBinaryFile(binpath, vertexCount, rootBone)
+        except Exception as e:
+            # A damaged compiled file is simply compiled again
+            showTrace = not isinstance(e, (RuntimeError, zipfile.BadZipFile, EOFError))
+            log.warning("Problem loading binary vertex weights: %s", e, exc_info=showTrace)
+
+        result = VertexBoneWeights.fromJsonFile(filename, vertexCount, rootBone)
+        if getpath.isSubPath(binpath, getpath.getPath()):
+            # Only write compiled vertex weights to user data path
+            try:
+                result.toBinaryFile(binpath)
+            except Exception:
+                log.notice('unable to save compiled vertex weights: %s', binpath, exc_info=True)
+        else:
+            log.debug('Not writing compiled vertex weights to system paths (%s).', binpath)
+        return result
+
+    @staticmethod
+    def fromJsonFile(filename, vertexCount=None, rootBone="root"):
+        """
+        Load vertex to bone weights from (json) file
         """
         from collections import OrderedDict
         import json
@@ -533,6 +576,77 @@ class VertexBoneWeights(object):
         result.description = weightsData.get('description', result.description)
         return result
 
+    @staticmethod
+    def fromBinaryFile(filename, vertexCount=None, rootBone="root"):
+        """
+        Load vertex to bone weights from a compiled binary (npz) file, written
+        by toBinaryFile().
+        The stored weights are built already, for a specific root bone and
+        vertex count. A RuntimeError is raised if these differ from the
+        requested ones.
+        """
+        from collections import OrderedDict
+        npzfile = np.load(filename)
+        if str(npzfile['rootBone']) != rootBone:
+            raise RuntimeError('compiled vertex weights file %s was built for root bone %s' % (filename, npzfile['rootBone']))
+        storedCount = int(npzfile['vertexCount'])
+        if vertexCount is not None and vertexCount != storedCount:
+            raise RuntimeError('compiled vertex weights file %s was built for %s vertices' % (filename, storedCount))
+
+        verts = npzfile['verts']
+        weights = npzfile['weights']
+        ends = np.cumsum(npzfile['counts'])
+        data = OrderedDict()
+        begin = 0
+        for bname, end in zip(npzfile['bones'].tolist(), ends):
+            data[bname] = (verts[begin:end], weights[begin:end])
+            begin = end
+
+        log.message("Loaded vertex weights %s from file %s", str(npzfile['name']) or 'unnamed', filename)
+        result = VertexBoneWeights(data, storedCount, rootBone)
+        if 'lic_str' in npzfile and 'lic_idx' in npzfile:
+            result.license.fromNumpyString(npzfile['lic_str'], npzfile['lic_idx'])
+        result.name = str(npzfile['name'])
+        result.version = str(npzfile['version'])
+        result.description = str(npzfile['description'])
+        return result
+
+    def toBinaryFile(self, filename):
+        """
+        Save vertex to bone weights to a compiled binary (npz) file, which is
+        considerably faster to load than the json format.
+        """
+        bones = list(self.data.keys())
+        groups = list(self.data.values())
+        licStr, licIdx = self.license.toNumpyString()
+
+        vars_ = dict(
+            bones = np.array(bones, dtype=str),
+            counts = np.array([len(v_idxs) for v_idxs, _ in groups], dtype=np.uint32),
+            verts = np.concatenate([np.asarray(v_idxs, dtype=np.uint32) for v_idxs, _ in groups] + [np.zeros(0, dtype=np.uint32)]),
+            weights = np.concatenate([np.asarray(wghts, dtype=np.float32) for _, wghts in groups] + [np.zeros(0, dtype=np.float32)]),
+            vertexCount = np.array(self.vertexCount, dtype=np.uint32),
+            rootBone = np.array(self.rootBone, dtype=str),
+            name = np.array(self.name, dtype=str),
+            version = np.array(str(self.version), dtype=str),
+            description = np.array(self.description, dtype=str),
+            lic_str = licStr,
+            lic_idx = licIdx
+            )
+
+        # Write to a temporary file that replaces the compiled file when
+        # complete, so that other processes never load a partially written file
+        tmppath = '%s.%d.tmp' % (filename, os.getpid())
+        try:
+            with open(tmppath, 'wb') as f:
+                np.savez_compressed(f, **vars_)
+            os.replace(tmppath, filename)
+        except:
+            if os.path.isfile(tmppath):
+                os.remove(tmppath)
+            raise
+        os.utime(filename, None)  # Ensure modification time is updated
+
     def toFile(self, filename):
         """
         Save vertex to bone weights to a file.
@@ -631,6 +745,7 @@ class VertexBoneWeights(object):
         from (json) data file.
         The format of vertexWeightsDict is expected to be: 
             { "bone_name": [(v_idx, v_weight), ...], ... }
+        (a (n, 2) array per bone works as well).
 
         The output format is of the form:
             { "bone_name": ([v_idx, ...], [v_weight, ...]), ... }
@@ -643,71 +758,70 @@ class VertexBoneWeights(object):
         if len(vertexWeightsDict) > 0 and \
            len(vertexWeightsDict[first_entry]) == 2 and \
            isinstance(vertexWeightsDict[first_entry], tuple) and \
-           isinstance(vertexWeightsDict[first_entry][1], np.ndarray) and \
-           isinstance(vertexWeightsDict[first_entry][2], np.ndarray):
+           isinstance(vertexWeightsDict[first_entry][0], np.ndarray) and \
+           isinstance(vertexWeightsDict[first_entry][1], np.ndarray):
             # Input dict is already in the expected format, presume it does not
             # need to be built again
             if vertexCount is not None:
                 self._vertexCount = vertexCount
             else:
-                self._vertexCount = max([vn for vg in list(vertexWeightsDict.values()) for vn in vg[0]])+1
+                self._vertexCount = max([vg[0].max() for vg in list(vertexWeightsDict.values()) if len(vg[0])] + [-1])+1
             return vertexWeightsDict
 
+        # Flatten to (vertex, bone, weight) triplets
+        bnames = []
+        groups = []
+        for bname, vgroup in list(vertexWeightsDict.items()):
+            if len(vgroup) == 0:
+                continue
+            bnames.append(bname)
+            groups.append(np.asarray(vgroup, dtype=np.float64).reshape((-1, 2)))
+        pairs = np.concatenate(groups) if groups else np.zeros((0, 2), dtype=np.float64)
+        verts = pairs[:,0].astype(np.intp)
+        weights = pairs[:,1]
+        b_idxs = np.repeat(np.arange(len(bnames)), [len(g) for g in groups])
+
         if vertexCount is not None:
             vcount = vertexCount
         else:
-            vcount = max([vn for vg in list(vertexWeightsDict.values()) for vn,_ in vg])+1
+            vcount = verts.max()+1
         self._vertexCount = vcount
 
-        # Normalize weights and put them in np format
-        wtot = np.zeros(vcount, np.float32)
-        for vgroup in list(vertexWeightsDict.values()):
-            for item in vgroup:
-                vn,w = item
-                # Calculate total weight per vertex
-                wtot[vn] += w
+        # Normalize weights by the total weight per vertex
+        wtot = np.bincount(verts, weights, minlength=vcount)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weights = weights / wtot[verts]
+
+        # Merge doubles, this also sorts the weights of each bone by vertex index
+        nKeys = max(vcount, len(wtot))
+        keys, inverse = np.unique(b_idxs * nKeys + verts, return_inverse=True)
+        weights = np.bincount(inverse.ravel(), weights, minlength=len(keys)).astype(np.float32)
+        b_idxs = keys // nKeys
+        verts = (keys % nKeys).astype(np.uint32)
+
+        # Filter out weights under the threshold
+        i_s = weights > WEIGHT_THRESHOLD
+        b_idxs = b_idxs[i_s]
+        verts = verts[i_s]
+        weights = weights[i_s]
 
         from collections import OrderedDict
         boneWeights = OrderedDict()
-        for bname,vgroup in list(vertexWeightsDict.items()):
-            if len(vgroup) == 0:
-                continue
-            weights = []
-            verts = []
-            v_lookup = {}
-            n = 0
-            for vn,w in vgroup:
-                if vn in v_lookup:
-                    # Merge doubles
-                    v_idx = v_lookup[vn]
-                    weights[v_idx] += w/wtot[vn]
-                else:
-                    v_lookup[vn] = len(verts)
-                    verts.append(vn)
-                    weights.append(w/wtot[vn])
-            verts = np.asarray(verts, dtype=np.uint32)
-            weights = np.asarray(weights, np.float32)
-            # Sort by vertex index
-            i_s = np.argsort(verts)
-            verts = verts[i_s]
-            weights = weights[i_s]
-            # Filter out weights under the threshold
-            i_s = np.argwhere(weights > WEIGHT_THRESHOLD)[:,0]
-            verts = verts[i_s]
-            weights = weights[i_s]
-            boneWeights[bname] = (verts, weights)
+        ends = np.cumsum(np.bincount(b_idxs, minlength=len(bnames)))
+        begin = 0
+        for bname, end in zip(bnames, ends):
+            boneWeights[bname] = (verts[begin:end], weights[begin:end])
+            begin = end
 
         # Assign unweighted vertices to root bone with weight 1
         if rootBone not in list(boneWeights.keys()):
-            vs = []
-            ws = []
+            vs = np.zeros(0, dtype=np.uint32)
+            ws = np.zeros(0, dtype=np.float32)
         else:
             vs,ws = boneWeights[rootBone]
-            vs = list(vs)
-            ws = list(ws)
         rw_i = np.argwhere(wtot == 0)[:,0]
-        vs.extend(rw_i)
-        ws.extend(np.ones(len(rw_i), dtype=np.float32))
+        vs = np.concatenate([vs, rw_i]).astype(np.uint32)
+        ws = np.concatenate([ws, np.ones(len(rw_i), dtype=np.float32)]).astype(np.float32)
         if len(rw_i) > 0:
             if len(rw_i) < 100:
                 # To avoid spamming the log, only print vertex indices if there's less than 100
@@ -715,7 +829,7 @@ class VertexBoneWeights(object):
             else:
                 log.debug("Adding trivial bone weights to root bone %s for %s unweighted vertices.", rootBone, len(rw_i))
         if len(vs) > 0:
-            boneWeights[rootBone] = (np.asarray(vs, dtype=np.uint32), np.asarray(ws, dtype=np.float32))
+            boneWeights[rootBone] = (vs, ws)
 
         return boneWeights
 
@@ -723,96 +837,88 @@ class VertexBoneWeights(object):
         """
         Compile vertex weights data to a more performant per-vertex format.
         """
-        if vertexCount is None:
-            vertexCount = 0
-            for bname, mapping in list(vertBoneMapping.items()):
-                verts,weights = mapping
-                vertexCount = max(max(verts), vertexCount)
-            if vertexCount:
-                vertexCount += 1
-
-        # TODO use simple array columns instead of structured arrays (they are array of structs, not struct of arrays)
-        if nWeights == 3:
-            dtype = [('b_idx1', np.uint32), ('b_idx2', np.uint32), ('b_idx3', np.uint32), 
-                     ('wght1', np.float32), ('wght2', np.float32), ('wght3', np.float32)]
-        elif nWeights == 4:
-            dtype = [('b_idx1', np.uint32), ('b_idx2', np.uint32), ('b_idx3', np.uint32), ('b_idx4', np.uint32),
-                     ('wght1', np.float32), ('wght2', np.float32), ('wght3', np.float32), ('wght4', np.float32)]
-        elif nWeights == 6:
-            dtype = [('b_idx1', np.uint32), ('b_idx2', np.uint32), ('b_idx3', np.uint32), 
-                     ('b_idx4', np.uint32), ('b_idx5', np.uint32), ('b_idx6', np.uint32), 
-                     ('wght1', np.float32), ('wght2', np.float32), ('wght3', np.float32), 
-                     ('wght4', np.float32), ('wght5', np.float32), ('wght6', np.float32)]
-        elif nWeights == 5:
-            dtype = [('b_idx1', np.uint32), ('b_idx2', np.uint32), ('b_idx3', np.uint32),
-                     ('b_idx4', np.uint32), ('b_idx5', np.uint32),
-                     ('wght1', np.float32), ('wght2', np.float32), ('wght3', np.float32),
-                     ('wght4', np.float32), ('wght5', np.float32)]
-        elif nWeights == 13:
-            dtype = [('b_idx1', np.uint32), ('b_idx2', np.uint32), ('b_idx3', np.uint32), 
-                     ('b_idx4', np.uint32), ('b_idx5', np.uint32), ('b_idx6', np.uint32), 
-                     ('b_idx7', np.uint32), ('b_idx8', np.uint32), ('b_idx9', np.uint32), 
-                     ('b_idx10', np.uint32), ('b_idx11', np.uint32), ('b_idx12', np.uint32), 
-                     ('b_idx13', np.uint32),
-                     ('wght1', np.float32), ('wght2', np.float32), ('wght3', np.float32), 
-                     ('wght4', np.float32), ('wght5', np.float32), ('wght6', np.float32), 
-                     ('wght7', np.float32), ('wght8', np.float32), ('wght9', np.float32), 
-                     ('wght10', np.float32), ('wght11', np.float32), ('wght12', np.float32), 
-                     ('wght13', np.float32)]
-        elif nWeights == 2:
-            dtype = [('b_idx1', np.uint32), ('b_idx2', np.uint32), 
-                     ('wght1', np.float32), ('wght2', np.float32)]
-        else:
-            dtype = [('b_idx1', np.uint32), ('wght1', np.float32)]
-        compiled_vertweights = np.zeros(vertexCount, dtype=dtype)
-
-        # Convert weights from indexed by bone to indexed by vertex index
-        _ws = dict()
         b_lookup = dict([(b.name,b_idx) for b_idx,b in enumerate(skel.getBones())])
+
+        # Flatten weights indexed by bone to (vertex, bone, weight) triplets
+        # TODO doubles (the same bone occurring twice for a vertex, eg. after
+        # remapping to another rig with merged bones) are not merged, for now
+        # assume there are none
+        verts = []
+        b_idxs = []
+        weights = []
         for bname, mapping in list(vertBoneMapping.items()):
-            try:
-                b_idx = b_lookup[bname]
-                verts,weights = mapping
-                for v_idx, wght in zip(verts, weights):
-                    if v_idx not in _ws:
-                        _ws[v_idx] = []
-
-                    # TODO not needed for now (no remapping yet), and perhaps doubles should be removed upon merge, not when compiling
-                    # also in case of proxy remapping doubles need to be prevented
-                    '''
-                    b_idxs = [bidx for (_,bidx) in _ws[v_idx]]
-                    if b_idx in b_idxs:
-                        # Merge doubles (this needs to happen even if the _build_vertex_weights_data()
-                        # step already performs double removal, in the case where
-                        # weights were remapped to another rig and bones merged)
-                        _i = b_idxs.index(b_idx)
-                        _ws[v_idx][_i] = (_ws[v_idx][_i][0] + wght, b_idx)
-                    else:
-                        _ws[v_idx].append( (wght, b_idx) )
-                    '''
-                    _ws[v_idx].append( (wght, b_idx) )  # For now, assume there are no doubles
-            except KeyError as e:
-                log.warning("Bone %s not found in skeleton: %s" % (bname, e))
-        for v_idx in _ws:
-            # Sort by weight and keep only nWeights most significant weights
-            if len(_ws[v_idx]) > nWeights:
-                #log.debug("Vertex %s has too many weights (%s): %s" % (v_idx, len(_ws[v_idx]), str(sorted(_ws[v_idx], reverse=True))))
-                _ws[v_idx] = sorted(_ws[v_idx], reverse=True)[:nWeights]
-                # Re-normalize weights
-                weightvals = np.asarray( [e[0] for e in _ws[v_idx]], dtype=np.float32)
-                weightvals /= np.sum(weightvals)
-                for i in range(nWeights):
-                    _ws[v_idx][i] = (weightvals[i], _ws[v_idx][i][1])
-            else:
-                _ws[v_idx] = sorted(_ws[v_idx], reverse=True)
+            if bname not in b_lookup:
+                log.warning("Bone %s not found in skeleton" % bname)
+                continue
+            v_idxs, wghts = mapping
+            verts.append(np.asarray(v_idxs, dtype=np.intp))
+            weights.append(np.asarray(wghts, dtype=np.float32))
+            b_idxs.append(np.full(len(v_idxs), b_lookup[bname], dtype=np.uint32))
+        verts = np.concatenate(verts + [np.zeros(0, dtype=np.intp)])
+        weights = np.concatenate(weights + [np.zeros(0, dtype=np.float32)])
+        b_idxs = np.concatenate(b_idxs + [np.zeros(0, dtype=np.uint32)])
 
-        for v_idx, wghts in list(_ws.items()):
-            for i, (w, bidx) in enumerate(wghts):
-                compiled_vertweights[v_idx]['wght%s' % (i+1)] = w
-                compiled_vertweights[v_idx]['b_idx%s' % (i+1)] = bidx
+        if vertexCount is None:
+            vertexCount = verts.max()+1 if len(verts) else 0
+
+        compiled_vertweights = CompiledVertexWeights(vertexCount, nWeights)
+
+        # Sort by vertex, then by decreasing weight (and bone index for equal
+        # weights), and keep only the nWeights most significant weights
+        order = np.lexsort((-b_idxs.astype(np.int64), -weights, verts))
+        verts = verts[order]
+        weights = weights[order]
+        b_idxs = b_idxs[order]
+        counts = np.bincount(verts, minlength=vertexCount)
+        starts = np.cumsum(counts) - counts
+        rank = np.arange(len(verts)) - starts[verts]
+        keep = rank < nWeights
+        verts = verts[keep]
+        weights = weights[keep]
+        b_idxs = b_idxs[keep]
+        rank = rank[keep]
+
+        # Re-normalize weights of vertices that had too many weights
+        overfull = (counts > nWeights)[verts]
+        if overfull.any():
+            wtot = np.bincount(verts, weights, minlength=vertexCount).astype(np.float32)
+            weights[overfull] /= wtot[verts[overfull]]
+
+        compiled_vertweights.wght[verts, rank] = weights
+        compiled_vertweights.b_idx[verts, rank] = b_idxs
 
         return compiled_vertweights
 
+class CompiledVertexWeights(object):
+    """
+    Per-vertex compiled vertex to bone weights, for fast skinning.
+    Stored as structure of arrays: b_idx and wght are both of shape
+    (vertexCount, nWeights), holding for each vertex the indices of the bones
+    it is bound to and the respective weights, sorted by decreasing weight.
+    Unused slots have weight 0.
+    """
+    def __init__(self, vertexCount, nWeights, b_idx=None, wght=None):
+        if b_idx is None:
+            b_idx = np.zeros((vertexCount, nWeights), dtype=np.uint32)
+        if wght is None:
+            wght = np.zeros((vertexCount, nWeights), dtype=np.float32)
+        self.b_idx = b_idx
+        self.wght = wght
+
+    @property
+    def nWeights(self):
+        return self.b_idx.shape[1]
+
+    def __len__(self):
+        return len(self.b_idx)
+
+    def __getitem__(self, indices):
+        """
+        Compiled weights of a subset of the vertices.
+        """
+        b_idx = self.b_idx[indices]
+        return type(self)(len(b_idx), self.nWeights, b_idx, self.wght[indices])
+
 class AnimatedMesh(object):
     """
     Manages skeletal animation for a mesh or multiple meshes.
@@ -826,6 +932,8 @@ class AnimatedMesh(object):
         self.__meshes = []
         self.__vertexToBoneMaps = []
         self.__originalMeshCoords = []
+        self.__posedMeshCoords = []     # Reused output buffers for skinning
+        self.__restMeshNormals = []     # Rest pose vertex normals, calculated when needed for realtime skinning
         self.addBoundMesh(mesh, vertexToBoneMapping)
 
         self._posed = True
@@ -835,6 +943,8 @@ class AnimatedMesh(object):
 
         self.__inPlace = False  # Animate in place (ignore translation component of animation)
         self.onlyAnimateVisible = False  # Only animate visible meshes (note: enabling this can have undesired consequences!)
+        self.parallelSkinning = False  # Skin bound meshes in parallel, using a thread pool
+        self.realtimeSkinning = False  # Skin baked animations directly into the render buffers and skin normals instead of recalculating them (for animation playback)
 
     def setBaseSkeleton(self, skel):
         self.__skeleton = skel
@@ -915,6 +1025,8 @@ class AnimatedMesh(object):
         originalMeshCoords[:,:3] = mesh.coord[:,:3]
         originalMeshCoords[:,3] = 1.0
         self.__originalMeshCoords.append(originalMeshCoords)
+        self.__posedMeshCoords.append(np.zeros((mesh.getVertexCount(),3), np.float32))
+        self.__restMeshNormals.append(None)
         self.__vertexToBoneMaps.append(vertexToBoneMapping)
         self.__meshes.append(mesh)
 
@@ -933,6 +1045,8 @@ class AnimatedMesh(object):
                 pass    # Don't fail if the mesh was already detached/destroyed
             del self.__meshes[rIdx]
             del self.__originalMeshCoords[rIdx]
+            del self.__posedMeshCoords[rIdx]
+            del self.__restMeshNormals[rIdx]
             del self.__vertexToBoneMaps[rIdx]
         except:
             log.warning('Cannot remove bound mesh %s, no such mesh bound.', name)
@@ -1047,6 +1161,7 @@ class AnimatedMesh(object):
             poseState = self.getPoseState()
 
             # Else we pass poseVerts matrices immediately from animation track for performance improvement (cached or baked)
+            meshIdxs = []
             for idx,mesh in enumerate(self.__meshes):
                 # TODO make onlyAnimateVisible work by excluding some meshes from the filter that should always be animated
                 if self.onlyAnimateVisible and not mesh.visibility:
@@ -1056,23 +1171,37 @@ class AnimatedMesh(object):
                     log.warning('No weights assigned to bound mesh %s, skip posing it.', mesh.name)
                     continue
 
-                try:
-                    if not self.__currentAnim.isBaked():
-                        # Old slow way of skinning
-                        self.getBaseSkeleton().setPose(poseState)
-                        posedCoords = self.getBaseSkeleton().skinMesh(self.__originalMeshCoords[idx], self.__vertexToBoneMaps[idx].data)
-                    else:
-                        if not self.__vertexToBoneMaps[idx].isCompiled(6):
-                            log.debug("Compiling vertex bone weights for %s", mesh.name)
-                            self.__vertexToBoneMaps[idx].compileData(self.getBaseSkeleton(), 6)
-
-                        # New fast skinnig approach
-                        posedCoords = skinMesh(self.__originalMeshCoords[idx], self.__vertexToBoneMaps[idx].compiled(6), poseState)
-                except Exception as e:
-                    log.error("Error skinning mesh %s", mesh.name, exc_info=True)
-                    raise e
-                # TODO you could avoid an array copy by passing the mesh.coord list directly and modifying it in place
-                self._updateMeshVerts(mesh, posedCoords[:,:3])
+                if self.__currentAnim.isBaked() and not self.__vertexToBoneMaps[idx].isCompiled(6):
+                    log.debug("Compiling vertex bone weights for %s", mesh.name)
+                    self.__vertexToBoneMaps[idx].compileData(self.getBaseSkeleton(), 6)
+
+                meshIdxs.append(idx)
+
+            realtime = self.realtimeSkinning and self.__currentAnim.isBaked()
+            if realtime:
+                # Skinning writes to the render buffers directly, no mesh update needed
+                # (whether tangents are required is determined here, as this queries the shader)
+                jobArgs = [(idx, poseState, requiresVertexTangents(self.__meshes[idx])) for idx in meshIdxs]
+                skin = self._skinBoundMeshRealtime
+            else:
+                jobArgs = [(idx, poseState) for idx in meshIdxs]
+                skin = self._skinBoundMesh
+
+            if self.parallelSkinning and self.__currentAnim.isBaked() and len(meshIdxs) > 1:
+                # Skinning with baked animations does not touch shared state,
+                # so each mesh can be skinned in a separate thread
+                pool = getSkinningPool()
+                jobs = [pool.submit(skin, *args) for args in jobArgs]
+                wait(jobs)
+                for idx, job in zip(meshIdxs, jobs):
+                    job.result()
+                    if not realtime:
+                        self.__meshes[idx].update()
+            else:
+                for idx, args in zip(meshIdxs, jobArgs):
+                    skin(*args)
+                    if not realtime:
+                        self.__meshes[idx].update()
 
             # Adapt the bones of the skeleton to match current skinned pose (slower, should only be used for static poses)
             if syncSkeleton and self.__currentAnim.isBaked():
@@ -1083,14 +1212,83 @@ class AnimatedMesh(object):
             for idx,mesh in enumerate(self.__meshes):
                 self._updateMeshVerts(mesh, self.__originalMeshCoords[idx])
 
+    def _skinBoundMesh(self, idx, poseState):
+        """
+        Skin the bound mesh with specified index and recalculate its normals.
+        Does not update the mesh its render buffers, as this can be invoked
+        from a worker thread.
+        """
+        mesh = self.__meshes[idx]
+        try:
+            if not self.__currentAnim.isBaked():
+                # Old slow way of skinning
+                self.getBaseSkeleton().setPose(poseState)
+                posedCoords = self.getBaseSkeleton().skinMesh(self.__originalMeshCoords[idx], self.__vertexToBoneMaps[idx].data)
+            else:
+                # New fast skinnig approach
+                posedCoords = skinMesh(self.__originalMeshCoords[idx], self.__vertexToBoneMaps[idx].compiled(6), poseState, out=self.__posedMeshCoords[idx])
+        except Exception as e:
+            log.error("Error skinning mesh %s", mesh.name, exc_info=True)
+            raise e
+        # TODO you could avoid an array copy by passing the mesh.coord list directly and modifying it in place
+        self._setMeshVerts(mesh, posedCoords[:,:3])
+
+    def _skinBoundMeshRealtime(self, idx, poseState, tangents=False):
+        """
+        Fast variant of _skinBoundMesh for playback of baked animations.
+        Vertices are skinned into the mesh coordinates and copied to the render
+        buffers (r_coord) through the vmap. Normals are skinned with the same
+        blend matrices instead of being recalculated from the faces, tangents
+        are only recalculated if tangents is True.
+        """
+        mesh = self.__meshes[idx]
+        weights = self.__vertexToBoneMaps[idx].compiled(6)
+        try:
+            skinMesh(self.__originalMeshCoords[idx], weights, poseState, out=mesh.coord)
+            norms = skinMesh(self._getRestNormals(idx), weights, poseState, out=mesh.vnorm)
+        except Exception as e:
+            log.error("Error skinning mesh %s", mesh.name, exc_info=True)
+            raise e
+        norms /= np.sqrt(np.sum(norms ** 2, axis=-1))[:,None]
+        mesh.invalidateNormals()    # Skinned normals are approximations
+
+        if mesh.vmap is not None and len(mesh.vmap) > 0:
+            np.take(mesh.coord, mesh.vmap, axis=0, out=mesh.r_coord)
+            np.take(mesh.vnorm, mesh.vmap, axis=0, out=mesh.r_vnorm)
+
+        if tangents:
+            mesh.calcVertexTangents()
+            mesh.sync_tangents()
+
+    def _getRestNormals(self, idx):
+        """
+        Vertex normals of the bound mesh with specified index in rest pose,
+        calculated from its original coordinates like Object3D.calcNormals()
+        does.
+        """
+        if self.__restMeshNormals[idx] is None:
+            mesh = self.__meshes[idx]
+            coord = self.__originalMeshCoords[idx][:,:3]
+            fvert = coord[mesh.fvert]
+            fnorm = np.cross(fvert[:,0] - fvert[:,1], fvert[:,1] - fvert[:,2])
+            norms = fnorm[mesh.vface]
+            norms *= np.arange(mesh.MAX_FACES)[None,:,None] < mesh.nfaces[:,None,None]
+            norms = np.sum(norms, axis=1)
+            norms /= np.sqrt(np.sum(norms ** 2, axis=-1))[:,None]
+            self.__restMeshNormals[idx] = norms
+        return self.__restMeshNormals[idx]
+
+    def _setMeshVerts(self, mesh, verts):
+        mesh.changeCoords(verts[:,:3])
+        mesh.calcNormals()  # TODO this is too slow for animation
+
     def _updateMeshVerts(self, mesh, verts):
         # TODO this is way too slow for realtime animation, but good for posing. For animation, update the r_ verts directly, as well as the r_vnorm members
         # TODO use this mapping to directly update the opengl data for animation
         # Remap vertex weights to the unwelded vertices of the object (mesh.coord to mesh.r_coord)
-        #originalToUnweldedMap = mesh.inverse_vmap
+        # (mesh.inverse_vmap, or mesh.getUnweldedVerts() for a set of vertices)
 
-        mesh.changeCoords(verts[:,:3])
-        mesh.calcNormals()  # TODO this is too slow for animation
+        self._setMeshVerts(mesh, verts)
         mesh.update()
 
     def refreshStaticMeshes(self, refresh_pose=True):
@@ -1101,12 +1299,21 @@ class AnimatedMesh(object):
         """
         for mIdx, mesh in enumerate(self.__meshes):
             self.__originalMeshCoords[mIdx][:,:3] = mesh.coord[:,:3]
+            self.__restMeshNormals[mIdx] = None
         if refresh_pose:
             self.refreshPose(updateIfInRest=False)
 
-    def _updateOriginalMeshCoords(self, name, coord):
+    def _updateOriginalMeshCoords(self, name, coord, indices=None):
+        """
+        Update the rest coordinates of a bound mesh, of all vertices or only
+        of the specified vertex indices.
+        """
         rIdx = self._getBoundMeshIndex(name)
-        self.__originalMeshCoords[rIdx][:,:3] = coord[:,:3]
+        if indices is None:
+            self.__originalMeshCoords[rIdx][:,:3] = coord[:,:3]
+        else:
+            self.__originalMeshCoords[rIdx][indices,:3] = coord[indices,:3]
+        self.__restMeshNormals[rIdx] = None
 
     def refreshPose(self, updateIfInRest=False, syncSkeleton=True):
         if not self.getBaseSkeleton():
@@ -1118,7 +1325,33 @@ class AnimatedMesh(object):
             # pose state is restored to rest
             self.getBaseSkeleton().setToRestPose()
 
-def skinMesh(coords, compiledVertWeights, poseData):
+def requiresVertexTangents(mesh):
+    """
+    Whether the shader the specified mesh is rendered with uses vertex tangents.
+    """
+    if not mesh.calculateTangents or not mesh.has_uv:
+        return False
+    if mesh.object3d is None:
+        return False
+    shaderObj = mesh.object3d.shaderObj
+    return shaderObj is not None and shaderObj.requiresVertexTangent()
+
+_skinningPool = None
+
+def getSkinningPool():
+    """
+    Persistent thread pool used for skinning multiple bound meshes in
+    parallel. The numpy operations involved in skinning release the GIL.
+    """
+    global _skinningPool
+    if _skinningPool is None:
+        _skinningPool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='skinning')
+    return _skinningPool
+
+# Number of vertices skinned per block, keeps the temporaries in skinMesh small
+SKINNING_BLOCK_SIZE = 4096
+
+def skinMesh(coords, compiledVertWeights, poseData, out=None):
     """
     More efficient way of linear blend skinning or smooth skinning.
     As proposed in http://graphics.ucsd.edu/courses/cse169_w05/3-Skin.htm we use
@@ -1133,6 +1366,13 @@ def skinMesh(coords, compiledVertWeights, poseData):
     rotations only (for directions such as normals, tangents and targets).
     If coords is nx3 size, this method will perform faster as only 3x3 matrix
     multiplies are performed, otherwise 3x4 matrices are multiplied.
+
+    Vertices are processed in blocks of SKINNING_BLOCK_SIZE, for each block the
+    pose matrices of all weights are gathered at once, blended with a single
+    matrix multiply and applied to the vertices. This works for any number of
+    weights per vertex.
+    The result, of shape (nverts, 3), is written to out if specified, which
+    allows reusing an output buffer.
     """
     # TODO allow skinning only the visible (not statically hidden) vertices, for performance reasons (eg if an alt. topology is set, do we animate both basemesh and topology?)
 
@@ -1144,65 +1384,22 @@ def skinMesh(coords, compiledVertWeights, poseData):
         # Translations do not affect vertices (faster as this requires only 3x3 matrix multiplies)
         c = 3
 
+    nVerts = len(coords)
+    if out is None:
+        out = np.empty((nVerts, 3), dtype=np.result_type(coords.dtype, np.float32))
+
+    # Flattened 3xc pose matrices, one row per bone
+    P = np.ascontiguousarray(poseData[:,:3,:c], dtype=np.float32).reshape((-1, 3*c))
     W = compiledVertWeights
-    P = poseData
-    if len(compiledVertWeights.dtype) == 4*2:
-        # nWeights = 4
-        accum = W['wght1'][:,None,None] * P[W['b_idx1']][:,:3,:c] + \
-                W['wght2'][:,None,None] * P[W['b_idx2']][:,:3,:c] + \
-                W['wght3'][:,None,None] * P[W['b_idx3']][:,:3,:c] + \
-                W['wght4'][:,None,None] * P[W['b_idx4']][:,:3,:c]
-    elif len(compiledVertWeights.dtype) == 2:
-        # nWeights = 1
-        accum = W['wght1'][:,None,None] * P[W['b_idx1']][:,:3,:c]
-    elif len(compiledVertWeights.dtype) == 6*2:
-        # nWeights = 13
-        accum = W['wght1'][:,None,None] * P[W['b_idx1']][:,:3,:c] + \
-                W['wght2'][:,None,None] * P[W['b_idx2']][:,:3,:c] + \
-                W['wght3'][:,None,None] * P[W['b_idx3']][:,:3,:c] + \
-                W['wght4'][:,None,None] * P[W['b_idx4']][:,:3,:c] + \
-                W['wght5'][:,None,None] * P[W['b_idx5']][:,:3,:c] + \
-                W['wght6'][:,None,None] * P[W['b_idx6']][:,:3,:c]
-    elif len(compiledVertWeights.dtype) == 5*2:
-        # nWeights = 5
-        accum = W['wght1'][:,None,None] * P[W['b_idx1']][:,:3,:c] + \
-                W['wght2'][:,None,None] * P[W['b_idx2']][:,:3,:c] + \
-                W['wght3'][:,None,None] * P[W['b_idx3']][:,:3,:c] + \
-                W['wght4'][:,None,None] * P[W['b_idx4']][:,:3,:c] + \
-                W['wght5'][:,None,None] * P[W['b_idx5']][:,:3,:c]
-    elif len(compiledVertWeights.dtype) == 13*2:
-        # nWeights = 13
-        accum = W['wght1'][:,None,None] * P[W['b_idx1']][:,:3,:c] + \
-                W['wght2'][:,None,None] * P[W['b_idx2']][:,:3,:c] + \
-                W['wght3'][:,None,None] * P[W['b_idx3']][:,:3,:c] + \
-                W['wght4'][:,None,None] * P[W['b_idx4']][:,:3,:c] + \
-                W['wght5'][:,None,None] * P[W['b_idx5']][:,:3,:c] + \
-                W['wght6'][:,None,None] * P[W['b_idx6']][:,:3,:c] + \
-                W['wght7'][:,None,None] * P[W['b_idx7']][:,:3,:c] + \
-                W['wght8'][:,None,None] * P[W['b_idx8']][:,:3,:c] + \
-                W['wght9'][:,None,None] * P[W['b_idx9']][:,:3,:c] + \
-                W['wght10'][:,None,None] * P[W['b_idx10']][:,:3,:c] + \
-                W['wght11'][:,None,None] * P[W['b_idx11']][:,:3,:c] + \
-                W['wght12'][:,None,None] * P[W['b_idx12']][:,:3,:c] + \
-                W['wght13'][:,None,None] * P[W['b_idx13']][:,:3,:c]
-    elif len(compiledVertWeights.dtype) == 2*2:
-        # nWeights = 2
-        accum = W['wght1'][:,None,None] * P[W['b_idx1']][:,:3,:c] + \
-                W['wght2'][:,None,None] * P[W['b_idx2']][:,:3,:c]
-    else:
-        # nWeights = 3
-        accum = W['wght1'][:,None,None] * P[W['b_idx1']][:,:3,:c] + \
-                W['wght2'][:,None,None] * P[W['b_idx2']][:,:3,:c] + \
-                W['wght3'][:,None,None] * P[W['b_idx3']][:,:3,:c]
-
-    # Note: np.sum(M * vs, axis=-1) is a matrix multiplication of mat M with
-    # a series of vertices vs
-    # Good resource: http://jameshensman.wordpress.com/2010/06/14/multiple-matrix-multiplication-in-numpy
-    #return np.sum(accum[:,:3,:4] * coords[:,None,:], axis=-1)
-
-    # Using einstein summation for matrix * vertex multiply, appears to be
-    # slightly faster
-    return np.einsum('ijk,ikl -> ij', accum[:,:3,:c], coords[:,:c,None])
+
+    for start in range(0, nVerts, SKINNING_BLOCK_SIZE):
+        end = min(start + SKINNING_BLOCK_SIZE, nVerts)
+        # Blended matrices: (n, 1, k) weights times (n, k, 3*c) gathered matrices
+        accum = np.matmul(W.wght[start:end,None,:], P[W.b_idx[start:end]])
+        accum = accum.reshape((end - start, 3, c))
+        out[start:end] = np.matmul(accum, coords[start:end,:c,None])[...,0]
+
+    return out
 
 def emptyTrack(nFrames, nBones=1):
     """
@@ -49,6 +49,59 @@ from math import pi
 D = pi/180
 
 
+def eulerMatrices(ai, aj, ak, axes='sxyz'):
+    """
+    Batched version of transformations.euler_matrix: returns the 3x3 rotation
+    matrices for arrays of Euler angles (one per frame) at once, as an
+    (n, 3, 3) array.
+    """
+    try:
+        firstaxis, parity, repetition, frame = tm._AXES2TUPLE[axes]
+    except (AttributeError, KeyError):
+        tm._TUPLE2AXES[axes]  # validation
+        firstaxis, parity, repetition, frame = axes
+
+    i = firstaxis
+    j = tm._NEXT_AXIS[i+parity]
+    k = tm._NEXT_AXIS[i-parity+1]
+
+    ai = np.asarray(ai, dtype=np.float64)
+    aj = np.asarray(aj, dtype=np.float64)
+    ak = np.asarray(ak, dtype=np.float64)
+    if frame:
+        ai, ak = ak, ai
+    if parity:
+        ai, aj, ak = -ai, -aj, -ak
+
+    si, sj, sk = np.sin(ai), np.sin(aj), np.sin(ak)
+    ci, cj, ck = np.cos(ai), np.cos(aj), np.cos(ak)
+    cc, cs = ci*ck, ci*sk
+    sc, ss = si*ck, si*sk
+
+    M = np.empty((len(ai), 3, 3), dtype=np.float64)
+    if repetition:
+        M[:, i, i] = cj
+        M[:, i, j] = sj*si
+        M[:, i, k] = sj*ci
+        M[:, j, i] = sj*sk
+        M[:, j, j] = -cj*ss+cc
+        M[:, j, k] = -cj*cs-sc
+        M[:, k, i] = -sj*ck
+        M[:, k, j] = cj*sc+cs
+        M[:, k, k] = cj*cc-ss
+    else:
+        M[:, i, i] = cj*ck
+        M[:, i, j] = sj*sc-cs
+        M[:, i, k] = sj*cc+ss
+        M[:, j, i] = cj*sk
+        M[:, j, j] = sj*ss+cc
+        M[:, j, k] = sj*cs-sc
+        M[:, k, i] = -sj
+        M[:, k, j] = cj*si
+        M[:, k, k] = cj*ci
+    return M
+
+
 class BVH():
     """
     A BVH skeleton. We assume a single root joint.
@@ -317,12 +370,15 @@ class BVH():
             words = self.__expectKeyword('Frame', fp) # Time:
             self.frameTime = float(words[2])
 
-            for i in range(self.frameCount):
-                line = fp.readline()
-                words = line.split()
-                data = [float(word) for word in words]
-                for joint in self.getJointsBVHOrder():
-                    data = self.__processChannelData(joint, data)
+            # Parse the complete motion block at once, one row per frame
+            nChannels = sum([len(joint.channels) for joint in self.getJointsBVHOrder()])
+            data = np.fromstring(fp.read(), dtype=np.float64, sep=' ')
+            nFrames = min(self.frameCount, len(data) // nChannels) if nChannels else self.frameCount
+            data = data[:nFrames * nChannels].reshape((nFrames, nChannels))
+
+            chanIdx = 0
+            for joint in self.getJointsBVHOrder():
+                chanIdx = self.__processChannelData(joint, data, chanIdx)
 
         self.__cacheGetJoints()
 
@@ -566,16 +622,17 @@ class BVH():
             else:
                 raise RuntimeError('Expected %s found %s' % ('JOINT, End Site or }', words[0]))
 
-    def __processChannelData(self, joint, data):
+    def __processChannelData(self, joint, data, chanIdx):
         """
-        Distribute animation channel data for one frame or motion sample, 
-        loaded from a BVH file, among the joints of the skeleton structure.
+        Distribute animation channel data for all frames, loaded from a BVH
+        file as a (frames x channels) array, among the joints of the skeleton
+        structure. The columns starting at chanIdx belong to this joint.
+        Returns the column index of the channels of the next joint.
         """
         nChannels = len(joint.channels)
-        joint.frames.extend(data[:nChannels])
-        data = data[nChannels:]
+        joint.frames = data[:, chanIdx:chanIdx + nChannels].astype(np.float32).ravel()
 
-        return data
+        return chanIdx + nChannels
 
     def __calcPosition(self, joint, offset):
         """
@@ -726,15 +783,7 @@ class BVHJoint():
             # TODO allow partial rotation channels too?
             pass
         elif len(rotAngles) >= 3:
-            for frameIdx in range(nFrames):
-                self.matrixPoses[frameIdx,:3,:3] = tm.euler_matrix(rotAngles[2][frameIdx], rotAngles[1][frameIdx], rotAngles[0][frameIdx], axes=rotOrder)[:3,:3]
-
-            # TODO eliminate loop with numpy?
-            '''
-            for rotAngle in rotAngles:  
-                self.matrixPoses[:] = tm.euler_matrix(rotAngle[2], rotAngle[1], rotAngle[0], axes=rotOrder))
-            # unfortunately tm.euler_matrix is not a np ufunc
-            '''
+            self.matrixPoses[:,:3,:3] = eulerMatrices(rotAngles[2], rotAngles[1], rotAngles[0], axes=rotOrder)
 
         # Add translations to pose matrices
         # Allow partial transformation channels too
@@ -116,6 +116,8 @@ class Proxy:
 
         self.weightsCache = None
         self.cacheSkel = None
+        self._cacheHumanWeights = None
+        self._reverseMapping = None
 
     @property
     def material_file(self):
@@ -188,6 +190,7 @@ class Proxy:
         self.weights = np.asarray([v._weights for v in refVerts], dtype=np.float32)
         self.ref_vIdxs = np.asarray([v._verts for v in refVerts], dtype=np.uint32)
         self.offsets = np.asarray([v._offset for v in refVerts], dtype=np.float32)
+        self._reverseMapping = None
 
 
     def _reloadReverseMapping(self):
@@ -195,17 +198,43 @@ class Proxy:
         Reconstruct reverse vertex (and weights) mapping
         """
         self.vertWeights = {}
+        self._reverseMapping = None
         for pxy_vIdx in range(self.ref_vIdxs.shape[0]):
             _addProxyVertWeight(self.vertWeights, self.ref_vIdxs[pxy_vIdx, 0], pxy_vIdx, self.weights[pxy_vIdx, 0])
             _addProxyVertWeight(self.vertWeights, self.ref_vIdxs[pxy_vIdx, 1], pxy_vIdx, self.weights[pxy_vIdx, 1])
             _addProxyVertWeight(self.vertWeights, self.ref_vIdxs[pxy_vIdx, 2], pxy_vIdx, self.weights[pxy_vIdx, 2])
 
 
+    def _getReverseMapping(self):
+        """
+        Reverse of the proxy mapping (the sparse transpose of ref_vIdxs and
+        weights), in compressed row layout: the proxy verts referencing human
+        vertex v, and the weights with which they do so, are
+        p_vIdxs[offsets[v]:offsets[v+1]] and p_wghts[offsets[v]:offsets[v+1]].
+        Returns (offsets, p_vIdxs, p_wghts).
+        """
+        if self._reverseMapping is None:
+            h_vIdxs = self.ref_vIdxs.ravel().astype(np.intp)
+            order = np.argsort(h_vIdxs, kind='stable')
+            p_vIdxs = order // self.ref_vIdxs.shape[1]
+            p_wghts = self.weights.ravel()[order]
+            counts = np.bincount(h_vIdxs, minlength=len(self.deleteVerts))
+            offsets = np.zeros(len(counts) + 1, dtype=np.intp)
+            np.cumsum(counts, out=offsets[1:])
+            self._reverseMapping = (offsets, p_vIdxs, p_wghts)
+        return self._reverseMapping
+
     def getCoords(self, fit_to_posed=False):
         if fit_to_posed:
             hcoord = self.human.meshData.coord
         else:
             hcoord = self.human.getRestposeCoordinates()
+
+        # Proxies attached to the human are fitted together, in one pass
+        fitting = self.human.getProxyFitting()
+        if self in fitting:
+            return fitting.getCoords(self, hcoord)
+
         matrix = self.tmatrix.getMatrix(hcoord)
 
         ref_vIdxs = self.ref_vIdxs
@@ -280,50 +309,60 @@ class Proxy:
         # Remap weights through proxy mapping
         WEIGHT_THRESHOLD = 1e-4  # Threshold for including bone weight
 
+        # The remapped weights only depend on the human weights, so they can be
+        # reused as long as the same weights (for the same skeleton) are
+        # remapped. When allowCache is set, an identical skeleton suffices.
         recalculate = True
-        weights = OrderedDict()
-
-        if not allowCache:
-            pass
-            #print("Caching not allowed")
-        else:
-            if self.weightsCache is None:
-                pass
-                #print("There is no cache")
-            else:
-                if not skel is None:
-                    if skel == self.cacheSkel:
-                        recalculate = False
-                    else:
-                        log.debug("The skeleton is different")
+        if self.weightsCache is not None and skel is self.cacheSkel:
+            if humanWeights is self._cacheHumanWeights:
+                recalculate = False
+            elif allowCache and skel is not None:
+                recalculate = False
 
         if recalculate:
             log.debug("remapping weights for proxy " + self.name)
             start = time.perf_counter()
-            for bname, (indxs, wghts) in list(humanWeights.data.items()):
-                vgroup = []
-                empty = True
-                for (v,wt) in zip(indxs, wghts):
-                    try:
-                        vlist = self.vertWeights[v]
-                    except KeyError:
-                        vlist = []
-                    for (pv, w) in vlist:
-                        pw = w*wt
-                        if (pw > WEIGHT_THRESHOLD):
-                            vgroup.append((pv, pw))
-                            empty = False
-                if not empty:
-                    weights[bname] = vgroup
+
+            # Flatten the human weights to (vertex, bone, weight) triplets
+            bnames = list(humanWeights.data.keys())
+            groups = list(humanWeights.data.values())
+            h_vIdxs = np.concatenate([np.asarray(indxs, dtype=np.intp) for indxs, _ in groups] + [np.zeros(0, dtype=np.intp)])
+            h_wghts = np.concatenate([np.asarray(wghts, dtype=np.float32) for _, wghts in groups] + [np.zeros(0, dtype=np.float32)])
+            h_bIdxs = np.repeat(np.arange(len(groups)), [len(indxs) for indxs, _ in groups])
+
+            # Multiply with the (proxy vertex, weight) entries referencing each
+            # human vertex
+            offsets, p_vIdxs, p_wghts = self._getReverseMapping()
+            inRange = h_vIdxs < len(offsets) - 1
+            h_vIdxs, h_wghts, h_bIdxs = h_vIdxs[inRange], h_wghts[inRange], h_bIdxs[inRange]
+            counts = offsets[h_vIdxs + 1] - offsets[h_vIdxs]
+            src = np.repeat(np.arange(len(h_vIdxs)), counts)
+            ends = np.cumsum(counts)
+            pos = np.arange(len(src)) - np.repeat(ends - counts - offsets[h_vIdxs], counts)
+            pw = p_wghts[pos] * h_wghts[src]
+
+            keep = pw > WEIGHT_THRESHOLD
+            pw = pw[keep]
+            pv = p_vIdxs[pos[keep]]
+            bIdxs = h_bIdxs[src[keep]]
+
+            # Group by bone
+            order = np.argsort(bIdxs, kind='stable')
+            ends = np.cumsum(np.bincount(bIdxs, minlength=len(bnames)))
+            pv = pv[order].tolist()
+            pw = pw[order].tolist()
+            weights = OrderedDict()
+            begin = 0
+            for bname, end in zip(bnames, ends):
+                if end > begin:
+                    weights[bname] = list(zip(pv[begin:end], pw[begin:end]))
+                begin = end
             stop = time.perf_counter()
 
             hw = humanWeights.create(weights)
-            if allowCache:
-                self.weightsCache = hw
-                self.cacheSkel = skel
-            else:
-                self.weightsCache = None
-                self.cacheSkel = None
+            self.weightsCache = hw
+            self.cacheSkel = skel
+            self._cacheHumanWeights = humanWeights
 
             log.debug("remapping weights for %s took %.5f seconds", self.name, stop - start)
         else:
@@ -897,6 +936,44 @@ class TMatrix:
             self.shearData[idx] = bbdata
 
 
+    def getAxisData(self):
+        """
+        The offset transformation is a scaling along the x, y and z axis, the
+        scale factor of each axis being the distance between two reference
+        vertices of the human, along that axis, divided by a denominator.
+        Returns the (vidx1, vidx2, denominator, absolute, fixed) arrays, each
+        with one entry per axis, that ProxyFitting uses to evaluate the
+        matrices of many proxies at once. Absolute indicates that the absolute
+        distance is used (scale), fixed marks axes that are not scaled.
+        """
+        vidxs = np.zeros((3, 2), dtype=np.uint32)
+        den = np.ones(3, dtype=np.float32)
+        absolute = np.zeros(3, dtype=bool)
+        fixed = np.ones(3, dtype=bool)
+
+        if self.scaleData:
+            data = self.scaleData
+            absolute[:] = True
+        else:
+            data = self.shearData or self.lShearData or self.rShearData
+        if not data:
+            return vidxs[:,0], vidxs[:,1], den, absolute, fixed
+
+        for n in range(3):
+            if data[n] is None:
+                continue
+            if self.scaleData:
+                (vn1, vn2, den[n]) = data[n]
+            else:
+                # Shear data maps the box with extents x1, x2 to the box spanned
+                # by the reference verts, which for an axis aligned box comes
+                # down to a scale
+                (vn1, vn2, x1, x2) = data[n]
+                den[n] = x2 - x1
+            vidxs[n] = (vn1, vn2)
+            fixed[n] = False
+        return vidxs[:,0], vidxs[:,1], den, absolute, fixed
+
     def getMatrix(self, hcoord):
         if self.scaleData:
             matrix = np.identity(3, float)
@@ -943,6 +1020,101 @@ class TMatrix:
         return mat[:3,:3]
 
 
+class ProxyFitting(object):
+    """
+    Fits the meshes of a set of proxies to the human in one pass.
+    The reference vertices, weights and offsets of all proxies are packed
+    into single arrays, the offset transformation matrices of all proxies are
+    evaluated at once, and the fitted coordinates of each proxy are written
+    to a slice of one shared coordinate buffer.
+    """
+
+    def __init__(self, proxies):
+        self.proxies = list(proxies)
+        self._slices = {}
+
+        counts = [len(pxy.ref_vIdxs) for pxy in self.proxies]
+        offset = 0
+        for pxy, count in zip(self.proxies, counts):
+            self._slices[id(pxy)] = slice(offset, offset + count)
+            offset += count
+
+        if self.proxies:
+            self.ref_vIdxs = np.concatenate([pxy.ref_vIdxs for pxy in self.proxies])
+            self.weights = np.concatenate([pxy.weights for pxy in self.proxies])
+            self.offsets = np.concatenate([pxy.offsets for pxy in self.proxies])
+        else:
+            self.ref_vIdxs = np.zeros((0, 3), dtype=np.uint32)
+            self.weights = np.zeros((0, 3), dtype=np.float32)
+            self.offsets = np.zeros((0, 3), dtype=np.float32)
+        self.counts = np.asarray(counts, dtype=np.intp)
+
+        # Transposed copies of the mapping, for fast per-column gathering
+        self._refIdxs = np.ascontiguousarray(self.ref_vIdxs.T, dtype=np.intp)
+        self._refWeights = np.ascontiguousarray(self.weights.T)[:,:,None]
+
+        # Offset transformation of each proxy, per axis
+        axisData = [pxy.tmatrix.getAxisData() for pxy in self.proxies]
+        def _stack(i, dtype):
+            return np.array([d[i] for d in axisData], dtype=dtype).reshape((-1, 3))
+        self._axisVidx1 = _stack(0, np.uint32)
+        self._axisVidx2 = _stack(1, np.uint32)
+        self._axisDen = _stack(2, np.float32)
+        self._axisAbsolute = _stack(3, bool)
+        self._axisFixed = _stack(4, bool)
+
+        self.coord = np.zeros((offset, 3), dtype=np.float32)
+        self._buffer = None
+        self._source = None
+
+    def __contains__(self, pxy):
+        return id(pxy) in self._slices
+
+    def getScales(self, hcoord):
+        """
+        Offset transformation matrices of all proxies. These are diagonal,
+        so they are returned as an array of (x, y, z) scales per proxy.
+        """
+        axes = np.arange(3)
+        dist = hcoord[self._axisVidx2, axes] - hcoord[self._axisVidx1, axes]
+        dist[self._axisAbsolute] = np.abs(dist[self._axisAbsolute])
+        dist[self._axisFixed] = 1.0
+        return dist / self._axisDen
+
+    def fit(self, hcoord):
+        """
+        Fit all proxies to the specified human coordinates. Returns the
+        coordinate buffer with the fitted vertices of all proxies.
+        """
+        coord = self.coord
+        if self._buffer is None or self._buffer.dtype != hcoord.dtype:
+            self._buffer = np.zeros(coord.shape, dtype=hcoord.dtype)
+        tmp = self._buffer
+
+        for i in range(3):
+            np.take(hcoord, self._refIdxs[i], axis=0, out=tmp)
+            tmp *= self._refWeights[i]
+            if i == 0:
+                coord[...] = tmp
+            else:
+                coord += tmp
+        coord += self.offsets * np.repeat(self.getScales(hcoord), self.counts, axis=0)
+
+        self._source = np.array(hcoord, copy=True)
+        return coord
+
+    def getCoords(self, pxy, hcoord):
+        """
+        Fitted coordinates of the specified proxy, as a view into the shared
+        coordinate buffer. All proxies are refitted when the human coordinates
+        differ from those of the previous fit.
+        """
+        if self._source is None or self._source.shape != hcoord.shape or \
+           not np.array_equal(self._source, hcoord):
+            self.fit(hcoord)
+        return self.coord[self._slices[id(pxy)]]
+
+
 def vertsToNumpy(verts):
     result = np.asarray(verts)
     return np.asarray([result[:,0], result[:,1], result[:,2]], dtype=np.float32)
@@ -75,6 +75,7 @@ class Skeleton(object):
 
         self.bones = {}     # Bone lookup list by name
         self.boneslist = None  # Breadth-first ordered list of all bones
+        self._poseArrays = None  # Rest and pose matrices of all bones, see __allocatePoseArrays
         self.roots = []     # Root bones of this skeleton, a skeleton can have multiple root bones.
 
         self.joint_pos_idxs = {}  # Lookup by joint name referencing vertex indices on the human, to determine joint position
@@ -511,6 +512,7 @@ class Skeleton(object):
         self.bones[name] = bone
         if not parentName:
             self.roots.append(bone)
+        self.boneslist = None
         return bone
 
     def build(self, ref_skel=None):
@@ -526,8 +528,9 @@ class Skeleton(object):
         """
         Update skeleton pose matrices after setting a new pose.
         """
-        for bone in self.getBones():
-            bone.update()
+        self.getBones()
+        self._matPoseGlobal[...] = self._calcGlobalPose(self._matPose)
+        self._matPoseVerts[...] = np.matmul(self._matPoseGlobal, self._invRestGlobal())
 
     def updateJoints(self, humanMesh, ref_skel=None):
         """
@@ -555,13 +558,8 @@ class Skeleton(object):
 
         returns     np.array((nBones, 4, 4), dtype=float32)
         """
-        nBones = self.getBoneCount()
-        poseMats = np.zeros((nBones,4,4),dtype=np.float32)
-
-        for bIdx, bone in enumerate(self.getBones()):    # TODO eliminate loop?
-            poseMats[bIdx] = bone.matPose
-
-        return poseMats
+        self.getBones()
+        return self._matPose.copy()
 
     def setPose(self, poseMats):
         """
@@ -572,35 +570,95 @@ class Skeleton(object):
 
         poseMats    np.array((nBones, 4, 4), dtype=float32)
         """
-        for bIdx, bone in enumerate(self.getBones()):
-            bone.matPose = np.identity(4, dtype=np.float32)
+        self.getBones()
+        invRest = self._invRestGlobal()
+        poseMats = np.asarray(poseMats)
+        self._matPose[...] = self._calcLocalPose(poseMats[None], self._matRestGlobal, invRest)[0]
+        self.update()
 
-            # Calculate rotations
-            bone.matPose[:3,:3] = poseMats[bIdx,:3,:3]
-            invRest = la.inv(bone.matRestGlobal)
-            bone.matPose = np.dot(np.dot(invRest, bone.matPose), bone.matRestGlobal)
+    def _invRestGlobal(self):
+        """
+        Inverse global rest matrices of all bones.
+        """
+        try:
+            return la.inv(self._matRestGlobal)
+        except la.LinAlgError:
+            result = np.zeros_like(self._matRestGlobal)
+            for bone in self.getBones():
+                try:
+                    result[bone.index] = la.inv(bone.matRestGlobal)
+                except la.LinAlgError:
+                    log.debug("Cannot calculate pose verts matrix for bone %s %s %s", bone.name, bone.getRestHeadPos(), bone.getRestTailPos())
+                    log.debug("Non-singular rest matrix %s", bone.matRestGlobal)
+                    result[bone.index] = np.identity(4)
+            return result
 
-            # Add translations from original
-            if poseMats.shape[2] == 4:
-                # Note: we generally only have translations on the root bone
-                trans = poseMats[bIdx,:3,3]
-                trans = np.dot(invRest[:3,:3], trans.T)  # Describe translation in bone-local axis directions
-                bone.matPose[:3,3] = trans.T
-            else:
-                # No translation
-                bone.matPose[:3,3] = [0, 0, 0]
-        # TODO avoid this loop, eg by storing a pre-allocated poseMats np array in skeleton and keeping a reference to a sub-array in each bone. It would allow batch processing of all pose matrices in one np call
-        self.update()
+    def _calcLocalPose(self, poseMats, matRestGlobal, invRest):
+        """
+        Convert poses (array of shape (nPoses, nBones, 3|4, 4)) from global
+        coordinates to pose matrices relative to the local rest axis of each
+        bone (see setPose()).
+        """
+        matPose = np.zeros(poseMats.shape[:2] + (4, 4), dtype=np.result_type(poseMats, invRest))
+        matPose[...,:3,:3] = poseMats[...,:3,:3]
+        matPose[...,3,3] = 1
+        matPose = np.matmul(np.matmul(invRest, matPose), matRestGlobal)
+        if poseMats.shape[-1] == 4:
+            # Describe translation in bone-local axis directions
+            # Note: we generally only have translations on the root bone
+            matPose[...,:3,3] = np.einsum('bij,fbj->fbi', invRest[:,:3,:3], poseMats[...,:3,3])
+        else:
+            # No translation
+            matPose[...,:3,3] = 0
+        return matPose
+
+    def _calcGlobalPose(self, matPose):
+        """
+        Calculate global pose matrices from local pose matrices (array of shape
+        (..., nBones, 4, 4)), propagating transformations from parent to child
+        bones one hierarchy level at a time (see Bone.update()).
+        """
+        matPoseGlobal = np.matmul(self._matRestRelative, matPose)
+        for idxs in self._levelIdxs:
+            parents = self._parentIdxs[idxs]
+            matPoseGlobal[...,idxs,:,:] = np.matmul(matPoseGlobal[...,parents,:,:], matPoseGlobal[...,idxs,:,:])
+        return matPoseGlobal
+
+    def getSkinningMatrices(self, poseMats):
+        """
+        Calculate the skinning matrices (the matPoseVerts matrices of all bones)
+        for a series of poses at once, without changing the pose of this
+        skeleton. This gives the same result as calling setPose() for each
+        pose and collecting the matPoseVerts of all bones, but evaluates all
+        poses with batched array operations.
+
+        poseMats    np.array((nPoses*nBones, 3, 4) or (nPoses*nBones, 4, 4))
+                    pose matrices, per pose one matrix per bone with bones in
+                    breadth-first order (same as setPose())
+
+        returns     np.array((nPoses*nBones, 3, 4), dtype=float64)
+        """
+        nBones = len(self.getBones())
+        poseMats = np.asarray(poseMats, dtype=np.float64).reshape((-1, nBones) + poseMats.shape[1:])
+        nPoses = len(poseMats)
+
+        matRestGlobal = self._matRestGlobal.astype(np.float64)
+        invRest = la.inv(matRestGlobal)
+
+        matPose = self._calcLocalPose(poseMats, matRestGlobal, invRest)
+        matPoseGlobal = self._calcGlobalPose(matPose)
+        matPoseVerts = np.matmul(matPoseGlobal, invRest)
+        return matPoseVerts[:,:,:3,:4].reshape((nPoses * nBones, 3, 4))
 
     def isInRestPose(self):
-        for bone in self.getBones():
-            if not bone.isInRestPose():
-                return False
-        return True
+        self.getBones()
+        # Same tolerance as animation.isRest()
+        return np.allclose(self._matPose, animation.IDENT_4, atol=1e-05)
 
     def setToRestPose(self):
-        for bone in self.getBones():
-            bone.setToRestPose()
+        self.getBones()
+        self._matPose[...] = np.identity(4, dtype=np.float32)
+        self.update()
 
     def skinMesh(self, meshCoords, vertBoneMapping):
         """
@@ -645,6 +703,36 @@ class Skeleton(object):
             result.append(bone)
             queue.extend(bone.children)
         self.boneslist = result
+        self.__allocatePoseArrays()
+
+    def __allocatePoseArrays(self):
+        """
+        Allocate contiguous (nBones, 4, 4) arrays with the rest and pose
+        matrices of all bones, in breadth-first order. The matrices of each
+        bone become views into these arrays, which allows updating the pose
+        of all bones at once.
+        """
+        bones = self.boneslist
+        nBones = len(bones)
+
+        self._poseArrays = dict()
+        for name in Bone.MATRICES:
+            self._poseArrays[name] = np.tile(np.identity(4, dtype=np.float32), (nBones, 1, 1))
+        for bone in bones:
+            bone._attach(self._poseArrays)
+
+        self._matRestGlobal = self._poseArrays['matRestGlobal']
+        self._matRestRelative = self._poseArrays['matRestRelative']
+        self._matPose = self._poseArrays['matPose']
+        self._matPoseGlobal = self._poseArrays['matPoseGlobal']
+        self._matPoseVerts = self._poseArrays['matPoseVerts']
+
+        # Parent index per bone, and the bone indices per hierarchy level
+        # (except the root level), for propagating transformations to children
+        self._parentIdxs = np.array([bone.parent.index if bone.parent else -1 for bone in bones], dtype=np.intp)
+        levels = np.array([bone.level for bone in bones], dtype=np.intp)
+        maxLevel = levels.max() if nBones else 0
+        self._levelIdxs = [np.flatnonzero(levels == level) for level in range(1, maxLevel + 1)]
 
     def getJointNames(self):
         """
@@ -695,8 +783,34 @@ class Skeleton(object):
         # TODO compare two skeletons (structure only)
 
 
+def _boneMatrix(name):
+    """
+    Property for one of the matrices of a bone. Once the bone is part of the
+    breadth-first bone list of its skeleton, the matrix is a view into the
+    pose arrays of the skeleton, and assignments are copied into it.
+    """
+    def getter(self):
+        return self._matrices[name]
+
+    def setter(self, value):
+        if self._attached:
+            self._matrices[name][...] = value
+        else:
+            self._matrices[name] = value
+
+    return property(getter, setter)
+
+
 class Bone(object):
 
+    MATRICES = ['matRestGlobal', 'matRestRelative', 'matPose', 'matPoseGlobal', 'matPoseVerts']
+
+    matRestGlobal = _boneMatrix('matRestGlobal')
+    matRestRelative = _boneMatrix('matRestRelative')
+    matPose = _boneMatrix('matPose')
+    matPoseGlobal = _boneMatrix('matPoseGlobal')
+    matPoseVerts = _boneMatrix('matPoseVerts')
+
     def __init__(self, skel, name, parentName, headJoint, tailJoint, roll=0, reference_bones=None, weight_reference_bones=None):
         """
         Construct a new bone for specified skeleton.
@@ -706,6 +820,9 @@ class Bone(object):
         self.name = name
         self.skeleton = skel
 
+        self._matrices = dict()
+        self._attached = False
+
         self.headJoint = headJoint
         self.tailJoint = tailJoint
 
@@ -759,6 +876,18 @@ class Bone(object):
         self.matPoseGlobal = None
         self.matPoseVerts = None
 
+    def _attach(self, poseArrays):
+        """
+        Store the matrices of this bone in the pose arrays of its skeleton,
+        from now on they are views into those arrays.
+        """
+        for name, array in poseArrays.items():
+            value = self._matrices.get(name)
+            if value is not None:
+                array[self.index] = value
+            self._matrices[name] = array[self.index]
+        self._attached = True
+
     @property
     def planes(self):
         return self.skeleton.planes
@@ -49,92 +49,86 @@ def loadObjFile(path, obj = None):
     Parse and load a Wavefront OBJ file as mesh.
     Parser does not support normals, and assumes all objects should be smooth
     shaded. Use duplicate vertices for achieving hard edges.
+
+    The file is read at once, its lines are sorted by type, and the vertex,
+    UV and face lines are each converted to arrays in bulk.
     """
     if obj is None:
         name = os.path.splitext( os.path.basename(path) )[0]
         obj = module3d.Object3D(name)
 
     with open(path, 'r', encoding="utf-8") as objFile:
+        lines = objFile.read().splitlines()
 
-        fg = None
-        mtl = None
-
-        verts = []
-        uvs = []
-        fverts = []
-        fuvs = []
-        groups = []
-        has_uv = False
-        materials = {}
-        faceGroups = {}
-
-        for objData in objFile:
+    fg = None
 
-            lineData = objData.split()
-            if len(lineData) > 0:
+    vLines = []
+    uvLines = []
+    fLines = []
+    groups = []
+    faceGroups = {}
 
-                command = lineData[0]
+    for objData in lines:
+        command = objData[:2]
 
-                # Vertex coordinate
-                if command == 'v':
-                    verts.append((float(lineData[1]), float(lineData[2]), float(lineData[3])))
+        # Vertex coordinate
+        if command == 'v ':
+            vLines.append(objData)
 
-                # Vertex texture (UV) coordinate
-                elif command == 'vt':
-                    uvs.append((float(lineData[1]), float(lineData[2])))
+        # Vertex texture (UV) coordinate
+        elif command == 'vt':
+            uvLines.append(objData)
 
-                # Face definition (reference to vertex attributes)
-                elif command == 'f':
-                    if not fg:
-                        if 0 not in faceGroups:
-                            faceGroups[0] = obj.createFaceGroup('default-dummy-group')
-                        fg = faceGroups[0]
+        # Face definition (reference to vertex attributes)
+        elif command == 'f ':
+            if not fg:
+                if 0 not in faceGroups:
+                    faceGroups[0] = obj.createFaceGroup('default-dummy-group')
+                fg = faceGroups[0]
+            fLines.append(objData)
+            groups.append(fg.idx)
 
-                    uvIndices = []
-                    vIndices = []
-                    for faceData in lineData[1:]:
-                        vInfo = faceData.split('/')
-                        vIdx = int(vInfo[0]) - 1  # -1 because obj is 1 based list
-                        vIndices.append(vIdx)
+        else:
+            lineData = objData.split()
+            if len(lineData) == 0:
+                continue
+            command = lineData[0]
 
-                        # If there are other data (uv, normals, etc)
-                        if len(vInfo) > 1 and vInfo[1] != '':
-                            uvIndex = int(vInfo[1]) - 1  # -1 because obj is 1 based list
-                            uvIndices.append(uvIndex)
+            if command == 'v':
+                vLines.append(objData)
 
-                    if len(vIndices) == 3:
-                        vIndices.append(vIndices[0])
-                    fverts.append(tuple(vIndices))
+            elif command == 'vt':
+                uvLines.append(objData)
 
-                    if len(uvIndices) > 0:
-                        if len(uvIndices) == 3:
-                            uvIndices.append(uvIndices[0])
-                        has_uv = True
-                    if len(uvIndices) < 4:
-                        uvIndices = [0, 0, 0, 0]
-                    fuvs.append(tuple(uvIndices))
+            elif command == 'f':
+                if not fg:
+                    if 0 not in faceGroups:
+                        faceGroups[0] = obj.createFaceGroup('default-dummy-group')
+                    fg = faceGroups[0]
+                fLines.append(objData)
+                groups.append(fg.idx)
 
-                    groups.append(fg.idx)
+            elif command == 'g':
+                fgName = lineData[1]
+                if fgName not in faceGroups:
+                    faceGroups[fgName] = obj.createFaceGroup(fgName)
+                fg =  faceGroups[fgName]
 
-                elif command == 'g':
-                    fgName = lineData[1]
-                    if fgName not in faceGroups:
-                        faceGroups[fgName] = obj.createFaceGroup(fgName)
-                    fg =  faceGroups[fgName]
+            elif command == 'usemtl':
+                pass # ignore materials
 
-                elif command == 'usemtl':
-                    pass # ignore materials
+            elif command == 'o':
 
-                elif command == 'o':
+                obj.name = lineData[1]
 
-                    obj.name = lineData[1]
+    verts = _parseFloatLines(vLines, 3)
+    uvs = _parseFloatLines(uvLines, 2)
+    fverts, fuvs, has_uv = _parseFaceLines(fLines)
 
     # Sanity check for loose vertices
-    strayVerts = []
-    referencedVerts = set([ v for fvert in fverts for v in fvert ])
-    for vIdx in range(len(verts)):
-        if vIdx not in referencedVerts:
-            strayVerts.append(vIdx)
+    referencedVerts = np.zeros(len(verts), dtype=bool)
+    referencedVerts[fverts.ravel()] = True
+    strayVerts = np.argwhere(~referencedVerts)[:,0].tolist()
     if len(strayVerts) > 0:
         import log
         msg = "Error loading OBJ file %s: Contains loose vertices, not connected to a face (%s)"
@@ -150,8 +144,116 @@ def loadObjFile(path, obj = None):
 
     return obj
 
+def _parseFloatLines(lines, nValues):
+    """
+    Convert lines of the form "<command> <float> <float> ..." to a
+    (len(lines), nValues) array, keeping the first nValues values of each line.
+    """
+    if not lines:
+        return np.zeros(0, dtype=np.float64)
+    data = np.fromstring(" ".join([line.split(None, 1)[1] for line in lines]), dtype=np.float64, sep=' ')
+    if len(data) == nValues * len(lines):
+        return data.reshape((-1, nValues))
+    # Lines with a varying number of values
+    return np.asarray([line.split()[1:nValues+1] for line in lines], dtype=np.float64)
+
+def _parseFaceLines(lines):
+    """
+    Convert face lines ("f v/vt/vn ...") to (n, 4) arrays of vertex and UV
+    indices (0 based). The fourth index of a triangle repeats its first one.
+    Faces without UV indices get UV indices 0 if other faces do have them.
+    Returns fverts, fuvs and whether any face has UV indices.
+    """
+    if not lines:
+        return np.zeros((0, 4), dtype=np.int64), np.zeros((0, 4), dtype=np.int64), False
+
+    tokens = [line.split()[1:] for line in lines]
+    nPerFace = np.asarray([len(t) for t in tokens])
+    tokens = [token for faceTokens in tokens for token in faceTokens]
+    text = " ".join(tokens)
+
+    # All vertices of all faces use the same v, v/vt, v/vt/vn or v//vn layout
+    nSlashes = tokens[0].count('/')
+    noUVs = '//' in tokens[0]
+    fastPath = nPerFace.min() >= 3 and nPerFace.max() <= 4 and \
+               text.count('/') == nSlashes * len(tokens) and \
+               text.count('//') == (len(tokens) if noUVs else 0)
+    if fastPath:
+        data = np.fromstring(text.replace('/', ' '), dtype=np.int64, sep=' ')
+        fastPath = len(data) == (nSlashes + 1 - noUVs) * len(tokens)
+
+    if fastPath:
+        data = data.reshape((len(tokens), -1)) - 1  # -1 because obj is 1 based list
+        vIndices = data[:,0]
+        uvIndices = data[:,1] if nSlashes > 0 and not noUVs else None
+    else:
+        vIndices = []
+        uvIndices = []
+        faceHasUVs = []
+        for token in tokens:
+            vInfo = token.split('/')
+            vIndices.append(int(vInfo[0]) - 1)
+            # If there are other data (uv, normals, etc)
+            hasUV = len(vInfo) > 1 and vInfo[1] != ''
+            uvIndices.append(int(vInfo[1]) - 1 if hasUV else 0)
+            faceHasUVs.append(hasUV)
+        vIndices = np.asarray(vIndices, dtype=np.int64)
+        uvIndices = np.asarray(uvIndices, dtype=np.int64)
+        faceHasUVs = np.asarray(faceHasUVs, dtype=bool)
+
+    # Scatter the per-vertex indices to (n, 4) face arrays, triangles repeat
+    # their first vertex
+    starts = np.cumsum(nPerFace) - nPerFace
+    corner = np.minimum(np.arange(4)[None,:], nPerFace[:,None] - 1)
+    corner[nPerFace == 3, 3] = 0
+    tokenIdxs = starts[:,None] + corner
+    fverts = vIndices[tokenIdxs]
+    if uvIndices is None:
+        return fverts, np.zeros(fverts.shape, dtype=np.int64), False
+
+    fuvs = uvIndices[tokenIdxs]
+    if not fastPath:
+        # Faces that (partly) lack UV indices get UV indices 0
+        nUVs = np.add.reduceat(faceHasUVs.astype(np.int64), starts)
+        fuvs[nUVs < 3] = 0
+        if not faceHasUVs.any():
+            return fverts, fuvs, False
+    return fverts, fuvs, True
+
+# Number of lines formatted at once when writing OBJ files
+WRITE_BLOCK_SIZE = 16384
+
+def _formatBlock(fmt, data):
+    """
+    Format all rows of a 2D array with the per-row format string fmt, using a
+    single string formatting operation.
+    """
+    return (fmt * len(data)) % tuple(data.ravel().tolist())
+
+def _writeBlocks(fp, fmt, data, pool=None):
+    """
+    Write the rows of a 2D array, formatted with fmt, to fp in blocks of
+    WRITE_BLOCK_SIZE lines. The blocks are formatted by the executor pool if
+    one is given, and written in order as they become available.
+    """
+    blocks = [data[i:i+WRITE_BLOCK_SIZE] for i in range(0, len(data), WRITE_BLOCK_SIZE)]
+    if pool is None:
+        for block in blocks:
+            fp.write(_formatBlock(fmt, block))
+    else:
+        for text in pool.map(_formatBlock, [fmt] * len(blocks), blocks):
+            fp.write(text)
 
-def writeObjFile(path, meshes, writeMTL=True, config=None, filterMaskedFaces=True):
+def writeObjFile(path, meshes, writeMTL=True, config=None, filterMaskedFaces=True, pool=None):
+    """
+    Write meshes to a Wavefront OBJ file (and an accompanying MTL file if
+    writeMTL is True).
+    Vertex, normal, UV and face lines are formatted in blocks. If pool, a
+    concurrent.futures executor, is specified, the blocks are formatted by it
+    in parallel. String formatting holds the GIL, so use a
+    ProcessPoolExecutor for a speedup on large meshes; a thread pool only
+    overlaps formatting with writing.
+    """
     if not isinstance(meshes, list):
         meshes = [meshes]
 
@@ -185,17 +287,17 @@ def writeObjFile(path, meshes, writeMTL=True, config=None, filterMaskedFaces=Tru
 
     # Vertices
     for mesh in meshes:
-        fp.write("".join( ["v %.4f %.4f %.4f\n" % tuple(co + offset) for co in mesh.coord] ))
+        _writeBlocks(fp, "v %.4f %.4f %.4f\n", mesh.coord + offset, pool)
 
     # Vertex normals
     if config is None or config.useNormals:
         for mesh in meshes:
-            fp.write("".join( ["vn %.4f %.4f %.4f\n" % tuple(no) for no in mesh.vnorm] ))
+            _writeBlocks(fp, "vn %.4f %.4f %.4f\n", mesh.vnorm, pool)
 
     # UV vertices
     for mesh in meshes:
         if mesh.has_uv:
-            fp.write("".join( ["vt %.6f %.6f\n" % tuple(uv) for uv in mesh.texco] ))
+            _writeBlocks(fp, "vt %.6f %.6f\n", mesh.texco, pool)
 
     # Faces
     nVerts = 1
@@ -206,34 +308,25 @@ def writeObjFile(path, meshes, writeMTL=True, config=None, filterMaskedFaces=Tru
         fp.write("usemtl %s\n" % mesh.material.name)
         fp.write("g %s\n" % mesh.name)
 
+        fvert = mesh.fvert[mesh.face_mask][:,:nPerFace].astype(np.int64) + nVerts
+        if mesh.has_uv:
+            fuvs = mesh.fuvs[mesh.face_mask][:,:nPerFace].astype(np.int64) + nTexVerts
+
         if config is None or config.useNormals:
             if mesh.has_uv:
-                for fn,fv in enumerate(mesh.fvert):
-                    if not mesh.face_mask[fn]:
-                        continue
-                    fuv = mesh.fuvs[fn]
-                    line = [" %d/%d/%d" % (fv[n]+nVerts, fuv[n]+nTexVerts, fv[n]+nVerts) for n in range(nPerFace)]
-                    fp.write("f" + "".join(line) + "\n")
+                faces = np.dstack([fvert, fuvs, fvert])
+                fmt = "f" + " %d/%d/%d" * nPerFace + "\n"
             else:
-                for fn,fv in enumerate(mesh.fvert):
-                    if not mesh.face_mask[fn]:
-                        continue
-                    line = [" %d//%d" % (fv[n]+nVerts, fv[n]+nVerts) for n in range(nPerFace)]
-                    fp.write("f" + "".join(line) + "\n")
+                faces = np.dstack([fvert, fvert])
+                fmt = "f" + " %d//%d" * nPerFace + "\n"
         else:
             if mesh.has_uv:
-                for fn,fv in enumerate(mesh.fvert):
-                    if not mesh.face_mask[fn]:
-                        continue
-                    fuv = mesh.fuvs[fn]
-                    line = [" %d/%d" % (fv[n]+nVerts, fuv[n]+nTexVerts) for n in range(nPerFace)]
-                    fp.write("f" + "".join(line) + "\n")
+                faces = np.dstack([fvert, fuvs])
+                fmt = "f" + " %d/%d" * nPerFace + "\n"
             else:
-                for fn,fv in enumerate(mesh.fvert):
-                    if not mesh.face_mask[fn]:
-                        continue
-                    line = [" %d" % (fv[n]+nVerts) for n in range(nPerFace)]
-                    fp.write("f" + "".join(line) + "\n")
+                faces = fvert
+                fmt = "f" + " %d" * nPerFace + "\n"
+        _writeBlocks(fp, fmt, faces.reshape((len(fvert), -1)), pool)
 
         nVerts += len(mesh.coord)
         nTexVerts += len(mesh.texco)